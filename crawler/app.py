@@ -1,6 +1,7 @@
 """API Flask mejorada con IA generativa y aprendizaje."""
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import sys
 import os
 from typing import Dict, Any
@@ -17,12 +18,17 @@ if current_dir not in sys.path:
 
 # Importar Crawler mejorado
 try:
-    from core_enhanced import EnhancedCrawler
+    from core_enhanced import EnhancedCrawler, FakeAIProvider
     
     use_cache = os.getenv('USE_CACHE', 'true').lower() == 'true'
-    use_ai = os.getenv('ANTHROPIC_API_KEY') or os.getenv('OPENAI_API_KEY')
-    
-    crawler_instance = EnhancedCrawler(use_cache=use_cache, use_ai=bool(use_ai))
+    use_fake_ai = os.getenv('AI_PROVIDER', '').lower() == 'fake'
+    use_ai = os.getenv('ANTHROPIC_API_KEY') or os.getenv('OPENAI_API_KEY') or use_fake_ai
+    
+    crawler_instance = EnhancedCrawler(
+        use_cache=use_cache,
+        use_ai=bool(use_ai),
+        ai_provider=FakeAIProvider() if use_fake_ai else None
+    )
     print("✓ Crawler mejorado inicializado")
     print(f"  - Caché: {'Activado' if use_cache else 'Desactivado'}")
     print(f"  - IA: {crawler_instance.ai_provider.provider if use_ai else 'Desactivada'}")
@@ -113,6 +119,60 @@ def handle_crawler_request():
         }), 500
 
 
+@app.route('/api/crawler/stream', methods=['POST'])
+def handle_crawler_stream():
+    """
+    Endpoint de streaming: POST /api/crawler/stream (Server-Sent Events)
+    
+    Body: {
+        "prompt": "tu consulta aquí"
+    }
+    
+    Eventos:
+        analysis: {"query": "...", "intent": "...", "keywords": [...], "sources": [...], ...}
+        delta:    {"text": "..."}                       # uno por fragmento generado
+        done:     {"prompt": "...", "response": {...}}  # incluye confidence y learning_stats
+        error:    {"error": "...", "details": "..."}
+    """
+    
+    if initialization_error or not crawler_instance:
+        return jsonify({
+            "error": "El servicio Crawler no está disponible",
+            "details": initialization_error
+        }), 500
+    
+    try:
+        data: Dict[str, Any] = request.get_json()
+    except Exception:
+        return jsonify({
+            "error": "Formato JSON inválido"
+        }), 400
+    
+    prompt = data.get('prompt', '').strip()
+    
+    if not prompt:
+        return jsonify({
+            "error": "El campo 'prompt' es obligatorio"
+        }), 400
+    
+    print(f"[→] Procesando (stream): '{prompt[:60]}...'")
+    
+    def events():
+        try:
+            for event, payload in crawler_instance.stream(prompt):
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"[✗] Error durante streaming:\n{traceback.format_exc()}", file=sys.stderr)
+            error = {"error": "Error interno del servidor", "details": str(e)}
+            yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/feedback', methods=['POST'])
 def handle_feedback():
     """
@@ -194,6 +254,13 @@ def get_stats():
             "ai_provider": "claude",
             "cache_enabled": true,
             "version": "3.0.0"
+        },
+        "cache_stats": {
+            "memory_hits": 40,
+            "memory_misses": 20,
+            "disk_hits": 5,
+            "disk_misses": 15,
+            "hit_rate": 0.75
         }
     }
     """
@@ -212,8 +279,24 @@ def get_stats():
             "version": "3.0.0"
         }
         
+        cache = crawler_instance.fetcher.cache
+        
         return jsonify({
             "learning_stats": stats,
+            "cache_stats": cache.get_stats() if cache else None,
+            "answer_cache_stats": (
+                crawler_instance.ai_provider.answer_cache.get_stats()
+                if crawler_instance.ai_provider and crawler_instance.ai_provider.answer_cache
+                else None
+            ),
+            "coalescing_stats": crawler_instance.inflight.stats,
+            "dedup_stats": crawler_instance.dedup.stats,
+            "transport_stats": crawler_instance.fetcher.transport.get_stats(),
+            "engine_stats": {
+                name: health.snapshot()
+                for name, health in crawler_instance.fetcher.engine_health.items()
+            },
+            "provider_stats": crawler_instance.fetcher.providers.get_stats(),
             "system_info": system_info
         }), 200
     
@@ -266,6 +349,7 @@ def home():
         ],
         "endpoints": {
             "POST /api/crawler": "Procesar consulta con IA",
+            "POST /api/crawler/stream": "Procesar consulta con respuesta en streaming (SSE)",
             "POST /api/feedback": "Enviar feedback para aprendizaje",
             "GET /api/stats": "Obtener estadísticas de aprendizaje",
             "GET /api/health": "Health check",
@@ -300,6 +384,7 @@ def not_found(error):
         "available_endpoints": [
             "/",
             "/api/crawler",
+            "/api/crawler/stream",
             "/api/feedback",
             "/api/stats",
             "/api/health"
@@ -334,6 +419,7 @@ if __name__ == '__main__':
     print(f"🌐 URL: http://127.0.0.1:{os.getenv('FLASK_PORT', '5000')}")
     print(f"📋 Endpoints disponibles:")
     print(f"   - POST /api/crawler (consultas)")
+    print(f"   - POST /api/crawler/stream (consultas en streaming)")
     print(f"   - POST /api/feedback (feedback)")
     print(f"   - GET /api/stats (estadísticas)")
     print(f"   - GET /api/health (health check)")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark de los backends de extracción HTML sobre páginas guardadas.
+
+Uso:
+    python bench_parsers.py [directorio_con_html] [repeticiones]
+
+Si el directorio no contiene ficheros .html se generan páginas sintéticas.
+"""
+import sys
+import time
+from pathlib import Path
+
+from config import DATA_DIR
+from extraction import PARSER_BACKENDS, available_backends
+
+
+DEFAULT_CORPUS_DIR = DATA_DIR / 'html_corpus'
+
+
+def load_pages(directory: Path) -> list:
+    """Carga las páginas .html del directorio (o genera sintéticas)."""
+    pages = []
+    if directory.is_dir():
+        for path in sorted(directory.glob('*.html')):
+            pages.append((path.name, path.read_text(encoding='utf-8', errors='replace')))
+    
+    if not pages:
+        print(f"⚠️  Sin páginas en {directory}, usando páginas sintéticas\n")
+        for size in (50, 200, 1000):
+            body = ''.join(
+                f"<p>Párrafo {i} con texto suficiente para superar el filtro de validez.</p>"
+                f"<ul><li>Elemento de lista número {i} con contenido descriptivo</li></ul>"
+                f"<script>var x = {i};</script>"
+                for i in range(size)
+            )
+            html = (f"<html><head><style>p {{}}</style></head><body><nav>Menú</nav>"
+                    f"<div class='main-content'>{body}<dl><dt>Término</dt>"
+                    f"<dd>Definición del término de ejemplo</dd></dl></div></body></html>")
+            pages.append((f"sintetica_{size}.html", html))
+    
+    return pages
+
+
+def bench(backend, html: str, repeat: int) -> tuple:
+    """Devuelve (mejor tiempo en ms, nº de fragmentos)."""
+    best = float('inf')
+    fragments = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fragments = backend.extract(html, max_fragments=25)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(fragments)
+
+
+def main():
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CORPUS_DIR
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    backends = {name: PARSER_BACKENDS[name][0]() for name in available_backends()}
+    pages = load_pages(directory)
+    
+    print(f"Backends instalados: {', '.join(backends)}")
+    print(f"Páginas: {len(pages)} · repeticiones: {repeat}\n")
+    
+    header = f"{'página':<30} {'KB':>7}  " + "  ".join(f"{name:>14}" for name in backends)
+    print(header)
+    print("-" * len(header))
+    
+    totals = {name: 0.0 for name in backends}
+    for page_name, html in pages:
+        cells = []
+        for name, backend in backends.items():
+            elapsed, count = bench(backend, html, repeat)
+            totals[name] += elapsed
+            cells.append(f"{elapsed:>8.2f}ms/{count:<3}")
+        print(f"{page_name[:30]:<30} {len(html) / 1024:>7.1f}  " + "  ".join(f"{c:>14}" for c in cells))
+    
+    print("-" * len(header))
+    print(f"{'TOTAL':<30} {'':>7}  " + "  ".join(f"{totals[name]:>12.2f}ms" for name in backends))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Benchmark del re-indexado: un solo proceso frente a un pool de procesos.
+
+Uso:
+    python bench_reindex.py [entradas] [procesos]
+
+Genera un registro de feedback sintético en un directorio temporal y
+reconstruye el conocimiento aprendido con `reindex.build_knowledge`. La
+referencia en serie usa un pool de un solo hilo, que prepara los tramos en
+el propio proceso.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+from config import REINDEX_CHUNK_BYTES
+from feedback import FeedbackStore
+from reindex import build_knowledge
+
+
+def make_log(path: Path, entries: int) -> FeedbackStore:
+    """Registro sintético con `entries` respuestas de varias oraciones."""
+    store = FeedbackStore(path, legacy_path=None)
+    for n in range(entries):
+        topic = f"tema{n % 500}"
+        text = '. '.join(f"El {topic} número {n}.{i} aparece en muchas pruebas del crawler"
+                         for i in range(6))
+        store.add(f"pregunta {n}", {'keywords': [topic], 'response_text': text}, n % 5 != 0)
+    store.close()
+    return store
+
+
+def bench(pool, store: FeedbackStore, workers: int) -> tuple:
+    """Devuelve (segundos, nº de hechos reconstruidos)."""
+    start = time.perf_counter()
+    learned, _ = build_knowledge(pool, store, store.size(), workers,
+                                 REINDEX_CHUNK_BYTES, time.time())
+    return time.perf_counter() - start, learned.fact_count
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_log(Path(tmp) / 'feedback.jsonl', entries)
+        print(f"Registro: {entries} entradas · {store.size() / 1024 / 1024:.1f} MB")
+        
+        with ThreadPool(1) as pool:
+            serial, facts = bench(pool, store, 1)
+        print(f"{'serie':<12} {serial:>8.2f}s  {facts} hechos")
+        
+        with multiprocessing.Pool(workers) as pool:
+            parallel, facts = bench(pool, store, workers)
+        print(f"{f'{workers} procesos':<12} {parallel:>8.2f}s  {facts} hechos  "
+              f"(x{serial / parallel:.2f})")
+
+
+if __name__ == '__main__':
+    main()
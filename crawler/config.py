@@ -5,16 +5,126 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / 'data'
 CACHE_DIR = DATA_DIR / 'cache'
+LEARNED_KNOWLEDGE_FILE = DATA_DIR / 'learned_knowledge.json'
+
+# Feedback del usuario (JSONL de solo anexado)
+FEEDBACK_FILE = DATA_DIR / 'feedback.jsonl'
+LEGACY_FEEDBACK_FILE = DATA_DIR / 'feedback.json'  # se migra una vez al arrancar
+FEEDBACK_FSYNC_EVERY = 32  # entradas entre fsync
+FEEDBACK_FSYNC_INTERVAL = 1.0  # segundos máximos sin fsync
+LEARNING_STATS_FILE = DATA_DIR / 'learning_stats.json'  # contadores persistidos
+LEARNING_STATS_PERSIST_INTERVAL = 5.0  # segundos mínimos entre escrituras
+
+# Aprendizaje en segundo plano
+LEARNING_BATCH_SIZE = 64  # entradas de feedback fusionadas por lote
+LEARNING_FLUSH_INTERVAL = 2.0  # segundos entre volcados de learned_knowledge.json
+LEARNING_QUEUE_MAX = 10000  # al llenarse se descarta (el feedback ya está en el registro)
+
+# Conocimiento aprendido acotado y puntuado
+LEARNED_MAX_TOPICS = 2000
+LEARNED_MAX_FACTS_PER_TOPIC = 20
+LEARNED_HALF_LIFE_DAYS = 30  # vida media de la puntuación de un hecho (0 desactiva)
+LEARNED_MIN_SCORE = 0.25  # por debajo el hecho se desaloja
+LEARNED_POSITIVE_WEIGHT = 1.0
+LEARNED_NEGATIVE_WEIGHT = 1.0
+
+# Re-indexado offline (reindex.py)
+INDEX_DIR = DATA_DIR / 'index'
+REINDEX_CHUNK_BYTES = 1 << 20  # bytes del registro de feedback por tarea de proceso
+REINDEX_CHUNK_SIZE = 2000  # hechos por tarea al calcular las estadísticas
+REINDEX_KEEP_VERSIONS = 5  # artefactos antiguos que se conservan
 
 # Configuración de caché
 CACHE_TTL_HOURS = 24
 USE_CACHE = True
+CACHE_DB_FILE = CACHE_DIR / 'cache.db'
+CACHE_MAX_ENTRIES = 5000
+CACHE_EVICTION_POLICY = 'lru'  # 'lru' o 'lfu'
+CACHE_EVICTION_CHECK_EVERY = 64  # escrituras entre comprobaciones del tamaño
+CACHE_LEGACY_INDEX = CACHE_DIR / 'index.json'  # caché JSON anterior (se migra una vez)
+CACHE_KEY_NORMALIZATION = 'keywords'  # 'raw', 'text' o 'keywords'
+CACHE_NEAR_DUPLICATE_THRESHOLD = 0.0  # Jaccard mínimo entre keywords (0 desactiva)
+
+# Caché en memoria (nivel 1, delante de la caché en disco)
+MEMORY_CACHE_TTL_SECONDS = 300
+MEMORY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+NEGATIVE_CACHE_TTL_SECONDS = 60  # 0 desactiva la caché negativa
+
+# Caché de respuestas generadas por la IA
+ANSWER_CACHE_DB_FILE = CACHE_DIR / 'answers.db'
+ANSWER_CACHE_TTL_HOURS = 6
+ANSWER_CACHE_STALE_HOURS = 18  # ventana stale-while-revalidate (0 la desactiva)
+ANSWER_CACHE_MAX_ENTRIES = 2000
+
+# Caché HTTP de páginas descargadas (por debajo de la caché de consultas)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_DB_FILE = CACHE_DIR / 'http.db'
+HTTP_CACHE_MAX_BYTES = 64 * 1024 * 1024  # tamaño comprimido total
+HTTP_CACHE_HEURISTIC_TTL_SECONDS = 300  # tope de la frescura heurística (requiere Last-Modified)
+
+# Modelos de IA generativa
+AI_MODELS = {
+    'claude': 'claude-sonnet-4-20250514',
+    'openai': 'gpt-4'
+}
 
 # Configuración de búsqueda
 MAX_SEARCH_RESULTS = 5
 DEFAULT_TIMEOUT = 10
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
 
+# Búsqueda concurrente en motores
+PARALLEL_SEARCH = True
+SEARCH_CONCURRENCY = 4  # consultas simultáneas esperadas (hilos de Flask y stream())
+SEARCH_DEADLINE = 12  # segundos totales por consulta
+
+# Descarga y extracción de páginas
+PAGE_MAX_BYTES = 512 * 1024
+PAGE_CHUNK_SIZE = 16 * 1024
+# 'auto', 'selectolax', 'lxml', 'bs4', 'htmlparser' o 'regex'. 'auto' usa
+# selectolax o lxml si están instalados y si no 'htmlparser', que extrae en
+# streaming y deja de descargar en cuanto el resultado no puede cambiar
+# (bs4, más lento y sin corte de la descarga, solo si se pide).
+HTML_PARSER_BACKEND = 'auto'
+
+# Transporte HTTP (pools por host, keep-alive y reintentos)
+HTTP_POOL_CONNECTIONS = 20  # hosts con pool propio en caché (requests)
+HTTP_POOL_MAXSIZE = 10  # conexiones por host por defecto
+HTTP_HOST_POOL_SIZES = {
+    'html.duckduckgo.com': 16,
+    'es.wikipedia.org': 16
+}
+HTTP_POOL_BLOCK = True  # esperar una conexión libre en vez de abrir otra y descartarla
+HTTP_MAX_CONNECTIONS = 100  # total del cliente async
+HTTP_KEEPALIVE_EXPIRY = 30  # segundos
+HTTP2 = True  # solo si está instalado httpx[http2]
+HTTP_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.3  # espera = factor * 2^(intento - 1)
+# Sin 429: reintentar enseguida no ayuda y el circuit breaker debe verlo.
+# Tampoco se reintentan timeouts de lectura ni se respeta Retry-After
+# (un hilo de búsqueda no debe dormir lo que diga el servidor).
+HTTP_RETRY_STATUSES = (500, 502, 503, 504)
+
+# Salud de los motores (circuit breaker y timeouts adaptativos)
+ENGINE_EWMA_ALPHA = 0.2  # peso de la última llamada en latencia y tasa de error
+ENGINE_FAILURE_THRESHOLD = 3  # fallos consecutivos que abren el circuito
+ENGINE_ERROR_RATE_THRESHOLD = 0.5  # tasa de error (EWMA) que abre el circuito
+ENGINE_MIN_CALLS = 5  # llamadas antes de evaluar la tasa de error
+ENGINE_COOLDOWN_SECONDS = 60  # tiempo con el circuito abierto antes de probar
+ENGINE_LATENCY_WINDOW = 50  # latencias recientes para el p95
+ENGINE_TIMEOUT_P95_FACTOR = 2.0  # timeout = p95 * factor
+ENGINE_TIMEOUT_MIN = 2.0  # segundos
+
+# Seguimiento de enlaces de resultados (DuckDuckGo)
+FOLLOW_RESULTS = True
+FOLLOW_TOP_K = 3  # páginas de resultado a visitar por consulta
+FOLLOW_WORKERS = FOLLOW_TOP_K * SEARCH_CONCURRENCY
+FOLLOW_MAX_PER_HOST = 2  # conexiones simultáneas por host
+FOLLOW_PAGE_MAX_BYTES = 256 * 1024
+FOLLOW_FRAGMENTS_PER_PAGE = 5
+FOLLOW_DEADLINE = 5  # segundos para toda la etapa
+FOLLOW_LINK_CLASS = 'result__a'  # clase de los enlaces de resultado
+
 # Stopwords en español
 STOPWORDS = {
     'de', 'la', 'el', 'los', 'las', 'y', 'o', 'a', 'en', 'por', 'para',
@@ -72,13 +182,57 @@ KNOWLEDGE_BASE = {
     ]
 }
 
-# Motores de búsqueda
+# Ranking de fragmentos
+RANKER = 'bm25'  # 'bm25' o 'heuristic'
+BM25_K1 = 1.5
+BM25_B = 0.75
+CORPUS_MAX_DOCUMENTS = 200000
+NEAR_DUPLICATE_DISTANCE = 3  # distancia de Hamming SimHash (máx. 3; -1 desactiva)
+
+# Motores de búsqueda: plantilla de URL, tipo de proveedor (search_providers.py)
+# y pistas para el enrutado (peso, coste relativo, latencia esperada en s)
 SEARCH_ENGINES = {
-    'duckduckgo': 'https://html.duckduckgo.com/html/?q={query}',
-    'wikipedia': 'https://en.wikipedia.org/w/api.php?action=query&list=search&srsearch={query}&format=json'
+    'duckduckgo': {
+        'url': 'https://html.duckduckgo.com/html/?q={query}',
+        'provider': 'duckduckgo',
+        'weight': 1.0, 'cost': 1.0, 'latency_hint': 1.5,
+        'capabilities': ['web']
+    },
+    'duckduckgo_news': {
+        'url': 'https://html.duckduckgo.com/html/?q={query}&df=w',  # última semana
+        'provider': 'duckduckgo',
+        'weight': 0.5, 'cost': 1.0, 'latency_hint': 1.5,
+        'capabilities': ['news']
+    },
+    'wikipedia': {
+        'url': 'https://es.wikipedia.org/w/api.php?action=query&list=search&srsearch={query}&format=json&utf8=1&srlimit=3',
+        'provider': 'wikipedia',
+        'weight': 1.0, 'cost': 0.5, 'latency_hint': 0.5,
+        'capabilities': ['encyclopedia']
+    }
+}
+
+# Afinidad de cada intención (TextProcessor) con las capacidades de los motores;
+# 0 excluye al motor para esa intención
+INTENT_ROUTING = {
+    'actualidad': {'news': 4.0, 'web': 1.0, 'encyclopedia': 0.2},
+    'explicación': {'encyclopedia': 2.0, 'web': 1.0, 'news': 0},
+    'causas': {'encyclopedia': 1.5, 'web': 1.0, 'news': 0},
+    'comparación': {'web': 1.5, 'encyclopedia': 1.0, 'news': 0},
+    'procedimiento': {'web': 2.0, 'encyclopedia': 0.5, 'news': 0},
+    'ejemplos': {'web': 1.5, 'encyclopedia': 1.0, 'news': 0},
+    'listado': {'encyclopedia': 1.5, 'web': 1.0, 'news': 0},
+    'consulta_general': {'web': 1.0, 'encyclopedia': 1.0, 'news': 0}
 }
+SEARCH_MAX_PROVIDERS = 3  # motores consultados por búsqueda
+# Un hilo por motor y consulta simultánea: las llamadas no esperan en cola
+SEARCH_WORKERS = SEARCH_MAX_PROVIDERS * SEARCH_CONCURRENCY
+PROVIDER_MIN_SAMPLES = 20  # consultas antes de juzgar la aportación de un motor
+PROVIDER_MIN_CONTRIBUTION = 0.1  # fracción mínima de consultas con fragmentos
+PROVIDER_PROBE_EVERY = 10  # cada N consultas de una intención se prueba un motor descartado
+PROVIDER_STATS_WINDOW = 200  # al llegar a N consultas se reducen a la mitad (olvido gradual)
 
-# Patrones HTML para extracción
+# Patrones HTML para extracción (apertura + "(.*?)" + cierre; ver extraction.extract_with_regex)
 HTML_PATTERNS = [
     r'<p[^>]*>(.*?)</p>',
     r'<li[^>]*>(.*?)</li>',
@@ -1,19 +1,40 @@
 """Lógica principal del Crawler con IA Generativa y Aprendizaje."""
+import asyncio
+import atexit
+import queue
 import re
+import threading
 import urllib.parse
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from collections import Counter
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from config import (
-    STOPWORDS, INTENT_PATTERNS, KNOWLEDGE_BASE, SEARCH_ENGINES,
-    HTML_PATTERNS, DEFAULT_TIMEOUT, USER_AGENT, MAX_SEARCH_RESULTS
+    STOPWORDS, INTENT_PATTERNS, SEARCH_ENGINES,
+    DEFAULT_TIMEOUT, MAX_SEARCH_RESULTS,
+    PARALLEL_SEARCH, SEARCH_WORKERS, SEARCH_DEADLINE, AI_MODELS, RANKER,
+    PAGE_MAX_BYTES, PAGE_CHUNK_SIZE, FOLLOW_RESULTS, FOLLOW_TOP_K,
+    FOLLOW_WORKERS, FOLLOW_MAX_PER_HOST, FOLLOW_PAGE_MAX_BYTES, FOLLOW_FRAGMENTS_PER_PAGE,
+    FOLLOW_DEADLINE, FOLLOW_LINK_CLASS, LEARNED_KNOWLEDGE_FILE, LEARNING_STATS_FILE,
+    LEARNING_STATS_PERSIST_INTERVAL, LEARNING_BATCH_SIZE, LEARNING_FLUSH_INTERVAL,
+    LEARNING_QUEUE_MAX
 )
 from utils import (
-    SmartCache, clean_html, is_valid_fragment, 
-    extract_keywords, calculate_confidence
+    SmartCache, TieredCache, AnswerCache, SingleFlight, clean_html, is_valid_fragment, 
+    KEY_NORMALIZERS, extract_keywords, calculate_confidence, cache_key_for, run_sync
 )
+from extraction import (
+    extract_links, extract_with_regex, get_parser_backend, strip_tags
+)
+from knowledge import KnowledgeIndex, LearnedKnowledge, apply_feedback
+from feedback import get_feedback_store, make_entry
+from transport import HttpTransport
+from health import EngineHealth, EngineSkipped, check_engine_response
+from search_providers import ProviderRegistry, SearchProvider
+from ranking import CorpusStats, NearDuplicateFilter, create_ranker
 
 # Dependencias
 try:
@@ -24,14 +45,14 @@ except ImportError:
     _HAS_REQUESTS = False
 
 try:
-    from bs4 import BeautifulSoup
-    _HAS_BS4 = True
+    import httpx
+    _HAS_HTTPX = True
 except ImportError:
-    BeautifulSoup = None
-    _HAS_BS4 = False
+    httpx = None
+    _HAS_HTTPX = False
 
 try:
-    from anthropic import Anthropic
+    from anthropic import Anthropic, AsyncAnthropic
     _HAS_ANTHROPIC = True
 except ImportError:
     _HAS_ANTHROPIC = False
@@ -46,9 +67,15 @@ except ImportError:
 class AIProvider:
     """Proveedor de IA generativa (Claude o OpenAI)."""
     
-    def __init__(self):
+    def __init__(self, answer_cache: Optional[AnswerCache] = None):
         self.provider = None
+        self.model = None
         self.client = None
+        self.async_client = None
+        self.answer_cache = answer_cache
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_tasks = set()
         self._initialize()
     
     def _initialize(self):
@@ -59,7 +86,9 @@ class AIProvider:
             if api_key:
                 try:
                     self.client = Anthropic(api_key=api_key)
+                    self.async_client = AsyncAnthropic(api_key=api_key)
                     self.provider = 'claude'
+                    self.model = AI_MODELS['claude']
                     return
                 except Exception:
                     pass
@@ -69,9 +98,10 @@ class AIProvider:
             api_key = os.getenv('OPENAI_API_KEY')
             if api_key:
                 try:
-                    openai.api_key = api_key
-                    self.client = openai
+                    self.client = openai.OpenAI(api_key=api_key)
+                    self.async_client = openai.AsyncOpenAI(api_key=api_key)
                     self.provider = 'openai'
+                    self.model = AI_MODELS['openai']
                     return
                 except Exception:
                     pass
@@ -81,17 +111,147 @@ class AIProvider:
         if not self.provider:
             return self._fallback_response(prompt, context)
         
-        # Construir prompt mejorado
+        cache_key = self._answer_key(prompt, context, max_tokens)
+        cached = self._cached_answer(cache_key, prompt, context, max_tokens)
+        if cached is not None:
+            return cached
+        
+        try:
+            return self._generate_and_cache(cache_key, prompt, context, max_tokens)
+        except Exception as e:
+            print(f"Error en IA: {e}")
+            return self._fallback_response(prompt, context)
+    
+    def stream(self, prompt: str, context: List[str], max_tokens: int = 1000) -> Iterator[str]:
+        """Genera la respuesta como una secuencia de fragmentos de texto."""
+        if not self.provider:
+            yield self._fallback_response(prompt, context)
+            return
+        
+        cache_key = self._answer_key(prompt, context, max_tokens)
+        cached = self._cached_answer(cache_key, prompt, context, max_tokens)
+        if cached is not None:
+            yield cached
+            return
+        
         enhanced_prompt = self._build_enhanced_prompt(prompt, context)
+        parts = []
         
         try:
-            if self.provider == 'claude':
-                return self._generate_claude(enhanced_prompt, max_tokens)
-            elif self.provider == 'openai':
-                return self._generate_openai(enhanced_prompt, max_tokens)
+            for delta in self._stream_provider(enhanced_prompt, max_tokens):
+                parts.append(delta)
+                yield delta
         except Exception as e:
             print(f"Error en IA: {e}")
+            if not parts:
+                yield self._fallback_response(prompt, context)
+            return
+        
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, ''.join(parts))
+    
+    async def agenerate(self, prompt: str, context: List[str], max_tokens: int = 1000) -> str:
+        """Versión asíncrona de `generate` con los clientes async del proveedor."""
+        if not self.provider:
             return self._fallback_response(prompt, context)
+        
+        if not self.async_client:
+            return await asyncio.to_thread(self.generate, prompt, context, max_tokens)
+        
+        cache_key = self._answer_key(prompt, context, max_tokens)
+        cached = self.answer_cache.get(cache_key) if self.answer_cache else None
+        if cached:
+            answer, stale = cached
+            if stale and self._claim_refresh(cache_key):
+                task = asyncio.ensure_future(
+                    self._arefresh_answer(cache_key, prompt, context, max_tokens)
+                )
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return answer
+        
+        try:
+            return await self._agenerate_and_cache(cache_key, prompt, context, max_tokens)
+        except Exception as e:
+            print(f"Error en IA: {e}")
+            return self._fallback_response(prompt, context)
+    
+    def _answer_key(self, prompt: str, context: List[str], max_tokens: int) -> str:
+        """Clave de la caché de respuestas (solo cuenta el contexto que se envía)."""
+        return AnswerCache.make_key(prompt, context[:10], self.provider, self.model, max_tokens)
+    
+    def _cached_answer(self, cache_key: str, prompt: str, context: List[str],
+                       max_tokens: int) -> Optional[str]:
+        """Respuesta cacheada; si está obsoleta la regenera en un hilo aparte."""
+        cached = self.answer_cache.get(cache_key) if self.answer_cache else None
+        if not cached:
+            return None
+        
+        answer, stale = cached
+        if stale and self._claim_refresh(cache_key):
+            threading.Thread(
+                target=self._refresh_answer,
+                args=(cache_key, prompt, context, max_tokens),
+                daemon=True
+            ).start()
+        return answer
+    
+    def _generate_and_cache(self, cache_key: str, prompt: str, context: List[str],
+                            max_tokens: int) -> str:
+        """Llama al proveedor y guarda la respuesta en caché."""
+        enhanced_prompt = self._build_enhanced_prompt(prompt, context)
+        
+        if self.provider == 'claude':
+            answer = self._generate_claude(enhanced_prompt, max_tokens)
+        else:
+            answer = self._generate_openai(enhanced_prompt, max_tokens)
+        
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, answer)
+        return answer
+    
+    async def _agenerate_and_cache(self, cache_key: str, prompt: str, context: List[str],
+                                   max_tokens: int) -> str:
+        """Llama al proveedor (async) y guarda la respuesta en caché."""
+        enhanced_prompt = self._build_enhanced_prompt(prompt, context)
+        
+        if self.provider == 'claude':
+            answer = await self._agenerate_claude(enhanced_prompt, max_tokens)
+        else:
+            answer = await self._agenerate_openai(enhanced_prompt, max_tokens)
+        
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, answer)
+        return answer
+    
+    def _claim_refresh(self, cache_key: str) -> bool:
+        """Reserva la regeneración de una clave (una sola a la vez)."""
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return False
+            self._refreshing.add(cache_key)
+            return True
+    
+    def _refresh_answer(self, cache_key: str, prompt: str, context: List[str], max_tokens: int):
+        """Regenera en segundo plano una respuesta obsoleta."""
+        try:
+            self._generate_and_cache(cache_key, prompt, context, max_tokens)
+        except Exception as e:
+            print(f"Error al revalidar respuesta: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+    
+    async def _arefresh_answer(self, cache_key: str, prompt: str, context: List[str],
+                               max_tokens: int):
+        """Regenera en segundo plano una respuesta obsoleta (async)."""
+        try:
+            await self._agenerate_and_cache(cache_key, prompt, context, max_tokens)
+        except Exception as e:
+            print(f"Error al revalidar respuesta: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
     
     def _build_enhanced_prompt(self, prompt: str, context: List[str]) -> str:
         """Construye prompt mejorado con contexto."""
@@ -116,7 +276,7 @@ RESPUESTA:"""
     def _generate_claude(self, prompt: str, max_tokens: int) -> str:
         """Genera con Claude."""
         response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
+            model=self.model,
             max_tokens=max_tokens,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -124,8 +284,46 @@ RESPUESTA:"""
     
     def _generate_openai(self, prompt: str, max_tokens: int) -> str:
         """Genera con OpenAI."""
-        response = self.client.ChatCompletion.create(
-            model="gpt-4",
+        response = self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+    
+    def _stream_provider(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """Deltas de texto de la API de streaming del proveedor."""
+        if self.provider == 'claude':
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}]
+            ) as stream:
+                yield from stream.text_stream
+        else:
+            for chunk in self.client.chat.completions.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            ):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+    
+    async def _agenerate_claude(self, prompt: str, max_tokens: int) -> str:
+        """Genera con Claude (async)."""
+        response = await self.async_client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text
+    
+    async def _agenerate_openai(self, prompt: str, max_tokens: int) -> str:
+        """Genera con OpenAI (async)."""
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
             max_tokens=max_tokens,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -143,21 +341,93 @@ RESPUESTA:"""
         return f"{intro}\n\n{body}{conclusion}"
 
 
+class FakeAIProvider(AIProvider):
+    """Proveedor local determinista, sin red, para pruebas y desarrollo.
+    
+    Responde con el contexto recibido, palabra a palabra en streaming y con
+    un retardo opcional entre deltas.
+    """
+    
+    def __init__(self, answer_cache: Optional[AnswerCache] = None, delay: float = 0.0):
+        self.delay = delay
+        super().__init__(answer_cache=answer_cache)
+    
+    def _initialize(self):
+        self.provider = 'fake'
+        self.model = 'fake'
+    
+    def _generate_and_cache(self, cache_key: str, prompt: str, context: List[str],
+                            max_tokens: int) -> str:
+        answer = ''.join(self._stream_provider(self._build_enhanced_prompt(prompt, context),
+                                               max_tokens))
+        if self.answer_cache:
+            self.answer_cache.set(cache_key, answer)
+        return answer
+    
+    def _stream_provider(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        section = prompt.split('CONTEXTO:', 1)[-1].split('PREGUNTA:', 1)[0]
+        context = [line[2:] for line in section.splitlines() if line.startswith('- ')]
+        text = ' '.join(context) or 'Sin contexto.'
+        
+        for i, word in enumerate(text.split()[:max_tokens]):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word if i == 0 else f' {word}'
+
+
 class EnhancedContentFetcher:
     """Fetcher mejorado con scraping avanzado."""
     
-    def __init__(self, use_cache: bool = True):
-        self.cache = SmartCache() if use_cache else None
+    def __init__(self, use_cache: bool = True, parallel: bool = PARALLEL_SEARCH,
+                 search_engines: Optional[Dict[str, Any]] = None,
+                 follow_results: bool = FOLLOW_RESULTS,
+                 transport: Optional[HttpTransport] = None):
+        self.cache = TieredCache(SmartCache()) if use_cache else None
         self.has_requests = _HAS_REQUESTS
-        self.has_bs4 = _HAS_BS4
-        self.session = requests.Session() if _HAS_REQUESTS else None
-        
-        if self.session:
-            self.session.headers.update({'User-Agent': USER_AGENT})
+        self.has_httpx = _HAS_HTTPX
+        self.parser_backend = get_parser_backend()
+        self.providers = ProviderRegistry(search_engines or SEARCH_ENGINES)
+        self.search_engines = {name: p.url for name, p in self.providers.providers.items()}
+        self.knowledge = KnowledgeIndex()
+        self.transport = transport or HttpTransport()
+        self.engine_health = {name: EngineHealth(name) for name in self.search_engines}
+        self._async_client = None
+        self._async_client_loop = None
+        self.inflight = SingleFlight()
+        
+        # Pool compartido para lanzar los motores en paralelo (un hilo por
+        # motor y consulta simultánea, ver `SEARCH_WORKERS`)
+        self.executor = ThreadPoolExecutor(
+            max_workers=SEARCH_WORKERS, thread_name_prefix='search'
+        ) if parallel else None
+        
+        # Seguimiento de enlaces de resultados (pool propio: se lanza desde
+        # dentro de un motor que ya ocupa un hilo de `executor`)
+        self.follow_results = follow_results
+        self.follow_executor = ThreadPoolExecutor(
+            max_workers=FOLLOW_WORKERS, thread_name_prefix='follow'
+        ) if follow_results else None
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._ahost_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_slots_lock = threading.Lock()
+    
+    @property
+    def session(self):
+        """Sesión HTTP del hilo actual (pools de conexiones compartidos)."""
+        return self.transport.session
     
     def search(self, query: str, keywords: List[str], 
-               max_results: int = MAX_SEARCH_RESULTS) -> Tuple[List[str], List[str]]:
-        """Búsqueda mejorada en múltiples fuentes."""
+               max_results: int = MAX_SEARCH_RESULTS,
+               intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Búsqueda mejorada en múltiples fuentes (motores elegidos según `intent`)."""
+        return self.inflight.do(
+            f"{cache_key_for(query)}|{max_results}|{intent}",
+            lambda: self._search(query, keywords, max_results, intent)
+        )
+    
+    def _search(self, query: str, keywords: List[str], 
+                max_results: int, intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Búsqueda sin deduplicar (ver `search`)."""
         
         # Cache check
         if self.cache:
@@ -176,209 +446,547 @@ class EnhancedContentFetcher:
         # 2. Búsqueda web mejorada
         if len(fragments) < max_results and self.has_requests:
             web_fragments, web_sources = self._enhanced_web_search(
-                query, keywords, max_results - len(fragments)
+                query, keywords, max_results - len(fragments), intent
             )
             fragments.extend(web_fragments)
             sources.extend(web_sources)
         
         # 3. Fallback
-        if not fragments:
+        used_fallback = not fragments
+        if used_fallback:
             fragments, sources = self._generate_fallback(query, keywords)
         
-        # Cache save
+        # Cache save (el contenido de respaldo solo como caché negativa)
         if self.cache:
-            self.cache.set(query, {'fragments': fragments, 'sources': sources})
+            self.cache.set(query, {'fragments': fragments, 'sources': sources},
+                           negative=used_fallback)
         
         return fragments[:max_results], sources[:max_results]
     
-    def _enhanced_web_search(self, query: str, keywords: List[str], 
-                            max_results: int) -> Tuple[List[str], List[str]]:
-        """Búsqueda web mejorada con múltiples estrategias."""
+    async def asearch(self, query: str, keywords: List[str], 
+                      max_results: int = MAX_SEARCH_RESULTS,
+                      intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Versión asíncrona de `search` sobre un cliente HTTP async."""
+        if not self.has_httpx:
+            return await asyncio.to_thread(self.search, query, keywords, max_results, intent)
+        
+        return await self.inflight.ado(
+            f"{cache_key_for(query)}|{max_results}|{intent}",
+            lambda: self._asearch(query, keywords, max_results, intent)
+        )
+    
+    async def _asearch(self, query: str, keywords: List[str], 
+                       max_results: int, intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Búsqueda asíncrona sin deduplicar (ver `asearch`).
+        
+        La caché en disco (SQLite) y la base de conocimiento, que puede
+        reconstruir sus índices tras un volcado del aprendizaje, se consultan
+        en hilos para no bloquear el bucle de eventos compartido.
+        """
+        
+        # Cache check
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, query)
+            if cached:
+                return cached.get('fragments', []), cached.get('sources', [])
+        
         fragments = []
         sources = []
         
+        # 1. Base de conocimiento local
+        kb_fragments, kb_sources = await asyncio.to_thread(self._search_knowledge_base, keywords)
+        fragments.extend(kb_fragments)
+        sources.extend(kb_sources)
+        
+        # 2. Búsqueda web asíncrona
+        if len(fragments) < max_results:
+            web_fragments, web_sources = await self._aenhanced_web_search(
+                query, keywords, max_results - len(fragments), intent
+            )
+            fragments.extend(web_fragments)
+            sources.extend(web_sources)
+        
+        # 3. Fallback
+        used_fallback = not fragments
+        if used_fallback:
+            fragments, sources = self._generate_fallback(query, keywords)
+        
+        # Cache save (el contenido de respaldo solo como caché negativa)
+        if self.cache:
+            await asyncio.to_thread(self.cache.set, query,
+                                    {'fragments': fragments, 'sources': sources},
+                                    negative=used_fallback)
+        
+        return fragments[:max_results], sources[:max_results]
+    
+    def _enhanced_web_search(self, query: str, keywords: List[str], 
+                            max_results: int, intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Búsqueda web mejorada con múltiples estrategias."""
         search_query = ' '.join(keywords[:5])
         
-        # Estrategia 1: DuckDuckGo HTML
-        ddg_fragments, ddg_sources = self._search_duckduckgo(search_query)
-        fragments.extend(ddg_fragments)
-        sources.extend(ddg_sources)
+        if self.executor:
+            return self._parallel_web_search(search_query, max_results, intent=intent)
         
-        # Estrategia 2: Wikipedia API
-        if len(fragments) < max_results:
-            wiki_fragments, wiki_sources = self._search_wikipedia(search_query)
-            fragments.extend(wiki_fragments)
-            sources.extend(wiki_sources)
+        fragments = []
+        sources = []
         
-        # Estrategia 3: Google (alternativa)
-        if len(fragments) < max_results:
-            google_fragments, google_sources = self._search_google_alternative(search_query)
-            fragments.extend(google_fragments)
-            sources.extend(google_sources)
+        # Proveedores en orden de preferencia para la intención
+        for provider in self._route(intent):
+            if len(fragments) >= max_results:
+                break
+            try:
+                provider_fragments, provider_sources = provider.search(self, search_query)
+            except Exception:
+                # Saltado por el circuito o caído: no cuenta como consulta sin aporte
+                continue
+            self.providers.record(provider.name, intent, len(provider_fragments))
+            fragments.extend(provider_fragments)
+            sources.extend(provider_sources)
         
         return fragments, sources
     
-    def _search_duckduckgo(self, query: str) -> Tuple[List[str], List[str]]:
-        """Búsqueda en DuckDuckGo."""
+    def _parallel_web_search(self, query: str, max_results: int,
+                             deadline: float = SEARCH_DEADLINE,
+                             intent: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Consulta todos los motores a la vez con un plazo global.
+        
+        Los resultados se fusionan según llegan y los motores rezagados se
+        descartan en cuanto hay `max_results` fragmentos o vence el plazo.
+        Cada llamada tiene como timeout lo que queda del plazo, así que un
+        rezagado no retiene su hilo mucho más allá.
+        """
         fragments = []
         sources = []
         
-        try:
-            url = f"https://html.duckduckgo.com/html/?q={urllib.parse.quote_plus(query)}"
-            response = self.session.get(url, timeout=DEFAULT_TIMEOUT)
+        end = time.monotonic() + deadline
+        providers = {
+            self.executor.submit(self._engine_call, provider, query, end): provider
+            for provider in self._route(intent)
+        }
+        pending = set(providers)
+        
+        while pending and len(fragments) < max_results:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
             
-            if response.status_code == 200:
-                extracted = self._extract_content(response.text, url)
-                fragments.extend(extracted['fragments'][:10])
-                sources.extend(['DuckDuckGo'] * len(extracted['fragments'][:10]))
-        except Exception:
-            pass
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    provider_fragments, provider_sources = future.result()
+                except Exception:
+                    continue
+                self.providers.record(providers[future].name, intent, len(provider_fragments))
+                fragments.extend(provider_fragments)
+                sources.extend(provider_sources)
+        
+        # Cancelar rezagados (los que ya están en curso terminan por su timeout)
+        for future in pending:
+            future.cancel()
         
         return fragments, sources
     
-    def _search_wikipedia(self, query: str) -> Tuple[List[str], List[str]]:
-        """Búsqueda en Wikipedia API."""
+    def _engine_call(self, provider: SearchProvider, query: str,
+                     end: float) -> Tuple[List[str], List[str]]:
+        """Llama a un motor sin pasarse del instante `end` del plazo global.
+        
+        Si la llamada sale de la cola con el plazo ya vencido no se lanza.
+        """
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            raise EngineSkipped(provider.name)
+        return provider.search(self, query, min(DEFAULT_TIMEOUT, remaining))
+    
+    async def _aenhanced_web_search(self, query: str, keywords: List[str], max_results: int,
+                                    intent: Optional[str] = None,
+                                    deadline: float = SEARCH_DEADLINE) -> Tuple[List[str], List[str]]:
+        """Búsqueda web asíncrona: todos los motores a la vez con plazo global."""
         fragments = []
         sources = []
         
+        search_query = ' '.join(keywords[:5])
+        timeout = min(DEFAULT_TIMEOUT, deadline)
+        providers = {
+            asyncio.ensure_future(provider.asearch(self, search_query, timeout)): provider
+            for provider in self._route(intent)
+        }
+        pending = set(providers)
+        end = time.monotonic() + deadline
+        
         try:
-            url = f"https://es.wikipedia.org/w/api.php"
-            params = {
-                'action': 'query',
-                'list': 'search',
-                'srsearch': query,
-                'format': 'json',
-                'utf8': 1,
-                'srlimit': 3
-            }
-            
-            response = self.session.get(url, params=params, timeout=DEFAULT_TIMEOUT)
-            data = response.json()
-            
-            if 'query' in data and 'search' in data['query']:
-                for result in data['query']['search'][:3]:
-                    snippet = re.sub(r'<[^>]+>', '', result.get('snippet', ''))
-                    if is_valid_fragment(snippet):
-                        fragments.append(snippet)
-                        sources.append(f"Wikipedia: {result.get('title', 'Artículo')}")
-        except Exception:
-            pass
+            while pending and len(fragments) < max_results:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    try:
+                        provider_fragments, provider_sources = task.result()
+                    except Exception:
+                        continue
+                    self.providers.record(providers[task].name, intent, len(provider_fragments))
+                    fragments.extend(provider_fragments)
+                    sources.extend(provider_sources)
+        finally:
+            # Cancelar rezagados
+            for task in pending:
+                task.cancel()
         
         return fragments, sources
     
-    def _search_google_alternative(self, query: str) -> Tuple[List[str], List[str]]:
-        """Búsqueda alternativa usando Google Custom Search o similar."""
-        # Aquí podrías integrar Google Custom Search API
-        # Por ahora retorna vacío
-        return [], []
+    def _route(self, intent: Optional[str]) -> List[SearchProvider]:
+        """Proveedores a consultar para una intención."""
+        return self.providers.route(intent, self.engine_health)
     
-    def _search_knowledge_base(self, keywords: List[str]) -> Tuple[List[str], List[str]]:
-        """Búsqueda en base de conocimiento con aprendizaje."""
+    def _get_async_client(self):
+        """Cliente HTTP async ligado al bucle de eventos en curso.
+        
+        Los semáforos por host también pertenecen al bucle: se recrean con
+        el cliente.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = self.transport.async_client()
+            self._async_client_loop = loop
+            self._ahost_slots = {}
+        return self._async_client
+    
+    def _search_duckduckgo(self, query: str, timeout: float = DEFAULT_TIMEOUT,
+                           engine: str = 'duckduckgo') -> Tuple[List[str], List[str]]:
+        """Búsqueda en DuckDuckGo (y visita de los primeros resultados).
+        
+        `timeout` acota también la visita de resultados, que no se alarga
+        más allá del tiempo que le quede a la llamada.
+        """
         fragments = []
         sources = []
+        links = []
+        end = time.monotonic() + timeout
+        
+        health = self.engine_health[engine]
+        if not health.allow():
+            raise EngineSkipped(engine)
+        
+        url = self._engine_url(engine, query)
+        with health.track() as call, self.transport.fetch(url, health.timeout(timeout)) as response:
+            if response.from_cache:
+                call.ignore()
+            check_engine_response(response)
+            fragments, links = self._fetch_page(
+                response, url, max_fragments=10, link_class=self._link_class()
+            )
+            sources = ['DuckDuckGo'] * len(fragments)
         
-        # Cargar conocimiento aprendido
-        learned_kb = self._load_learned_knowledge()
-        combined_kb = {**KNOWLEDGE_BASE, **learned_kb}
+        remaining = end - time.monotonic()
+        if links and remaining > 0:
+            page_fragments, page_sources = self._follow_results(
+                self._result_urls(url, links), min(FOLLOW_DEADLINE, remaining)
+            )
+            fragments.extend(page_fragments)
+            sources.extend(page_sources)
         
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
+        return fragments, sources
+    
+    async def _asearch_duckduckgo(self, query: str, timeout: float = DEFAULT_TIMEOUT,
+                                  engine: str = 'duckduckgo') -> Tuple[List[str], List[str]]:
+        """Búsqueda en DuckDuckGo (async, y visita de los primeros resultados).
+        
+        Como en `_search_duckduckgo`, `timeout` acota también la visita de
+        resultados.
+        """
+        fragments = []
+        sources = []
+        links = []
+        end = time.monotonic() + timeout
+        
+        health = self.engine_health[engine]
+        if not health.allow():
+            raise EngineSkipped(engine)
+        
+        url = self._engine_url(engine, query)
+        client = self._get_async_client()
+        with health.track() as call:
+            async with self.transport.afetch(client, url, health.timeout(timeout)) as response:
+                if response.from_cache:
+                    call.ignore()
+                check_engine_response(response)
+                fragments, links = await self._afetch_page(
+                    response, url, max_fragments=10, link_class=self._link_class()
+                )
+                sources = ['DuckDuckGo'] * len(fragments)
+        
+        remaining = end - time.monotonic()
+        if links and remaining > 0:
+            page_fragments, page_sources = await self._afollow_results(
+                self._result_urls(url, links), min(FOLLOW_DEADLINE, remaining)
+            )
+            fragments.extend(page_fragments)
+            sources.extend(page_sources)
+        
+        return fragments, sources
+    
+    def _fetch_page(self, response, url: str, max_fragments: int = 25,
+                    max_bytes: int = PAGE_MAX_BYTES,
+                    link_class: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Descarga (acotada en bytes) y extrae fragmentos y enlaces de una respuesta.
+        
+        Con un backend incremental se extrae mientras se descarga y se para en
+        cuanto basta; con uno de árbol se lee el cuerpo y se analiza entero.
+        """
+        chunks = response.iter_content(PAGE_CHUNK_SIZE)
+        
+        if self.parser_backend.streaming:
+            extractor = self.parser_backend.extractor(max_fragments, max_bytes, response.encoding,
+                                                      link_class, FOLLOW_TOP_K * 2)
+            for chunk in chunks:
+                if extractor.feed_bytes(chunk):
+                    break
+            return extractor.finish(), extractor.links
+        
+        body = bytearray()
+        for chunk in chunks:
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                break
+        return self._extract_page(bytes(body[:max_bytes]), response.encoding, url,
+                                  max_fragments, link_class)
+    
+    async def _afetch_page(self, response, url: str, max_fragments: int = 25,
+                           max_bytes: int = PAGE_MAX_BYTES,
+                           link_class: Optional[str] = None) -> Tuple[List[str], List[str]]:
+        """Versión async de `_fetch_page` sobre una respuesta httpx.
+        
+        El extractor incremental procesa cada trozo (acotado) en el bucle; el
+        análisis del documento completo con un backend de árbol va a un hilo.
+        """
+        if self.parser_backend.streaming:
+            extractor = self.parser_backend.extractor(max_fragments, max_bytes, response.encoding,
+                                                      link_class, FOLLOW_TOP_K * 2)
+            async for chunk in response.aiter_bytes(PAGE_CHUNK_SIZE):
+                if extractor.feed_bytes(chunk):
+                    break
+            return extractor.finish(), extractor.links
+        
+        body = bytearray()
+        async for chunk in response.aiter_bytes(PAGE_CHUNK_SIZE):
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                break
+        return await asyncio.to_thread(self._extract_page, bytes(body[:max_bytes]),
+                                       response.encoding, url, max_fragments, link_class)
+    
+    def _extract_page(self, body: bytes, encoding: Optional[str], url: str, max_fragments: int,
+                      link_class: Optional[str]) -> Tuple[List[str], List[str]]:
+        """Extracción sobre el documento completo (sin streaming)."""
+        html = body.decode(encoding or 'utf-8', errors='replace')
+        fragments = self._extract_content(html, url)['fragments'][:max_fragments]
+        links = extract_links(html, link_class, FOLLOW_TOP_K * 2) if link_class else []
+        return fragments, links
+    
+    def _link_class(self) -> Optional[str]:
+        """Clase de los enlaces a seguir (None si el seguimiento está desactivado)."""
+        return FOLLOW_LINK_CLASS if self.follow_results else None
+    
+    def _result_urls(self, page_url: str, links: List[str]) -> List[str]:
+        """URLs de destino de los enlaces de resultado, sin duplicados ni anuncios.
+        
+        DuckDuckGo envuelve los destinos en una redirección (`/l/?uddg=...`).
+        """
+        urls = []
+        for href in links:
+            absolute = urllib.parse.urljoin(page_url, href)
+            parsed = urllib.parse.urlparse(absolute)
+            target = urllib.parse.parse_qs(parsed.query).get('uddg')
+            if target:
+                absolute = target[0]
+            elif parsed.path.endswith('/y.js'):
+                continue  # Anuncio
             
-            # Búsqueda exacta
-            if keyword_lower in combined_kb:
-                fragments.extend(combined_kb[keyword_lower])
-                sources.extend(['Base de conocimiento'] * len(combined_kb[keyword_lower]))
+            if urllib.parse.urlparse(absolute).scheme in ('http', 'https') and absolute not in urls:
+                urls.append(absolute)
+        
+        return urls[:FOLLOW_TOP_K]
+    
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """Semáforo que limita las conexiones simultáneas a un host."""
+        host = urllib.parse.urlparse(url).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(FOLLOW_MAX_PER_HOST)
+            return self._host_slots[host]
+    
+    def _ahost_slot(self, url: str) -> asyncio.Semaphore:
+        """Versión async de `_host_slot` (semáforos del bucle en curso)."""
+        self._get_async_client()
+        host = urllib.parse.urlparse(url).netloc
+        if host not in self._ahost_slots:
+            self._ahost_slots[host] = asyncio.Semaphore(FOLLOW_MAX_PER_HOST)
+        return self._ahost_slots[host]
+    
+    def _follow_results(self, urls: List[str],
+                        deadline: float = FOLLOW_DEADLINE) -> Tuple[List[str], List[str]]:
+        """Visita en paralelo las páginas de resultado con un plazo global.
+        
+        Cada página se descarga con un presupuesto de bytes propio y sus
+        fragmentos se atribuyen a su URL. Las páginas que no terminan a
+        tiempo se descartan; el orden final respeta el ranking del buscador.
+        """
+        if not urls or not self.follow_executor:
+            return [], []
+        
+        end = time.monotonic() + deadline
+        futures = [self.follow_executor.submit(self._fetch_result_page, url, end) for url in urls]
+        done, pending = wait(futures, timeout=deadline)
+        for future in pending:
+            future.cancel()
+        
+        fragments = []
+        sources = []
+        for url, future in zip(urls, futures):
+            if future not in done or future.exception():
                 continue
+            page_fragments = future.result()
+            fragments.extend(page_fragments)
+            sources.extend([url] * len(page_fragments))
+        
+        return fragments, sources
+    
+    def _fetch_result_page(self, url: str, end: float) -> List[str]:
+        """Descarga una página de resultado respetando el límite por host."""
+        slot = self._host_slot(url)
+        if not slot.acquire(timeout=max(0.0, end - time.monotonic())):
+            return []
+        
+        try:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return []
             
-            # Búsqueda parcial
-            for topic, facts in combined_kb.items():
-                if keyword_lower in topic.lower():
-                    fragments.extend(facts)
-                    sources.extend([f'KB: {topic}'] * len(facts))
+            with self.transport.fetch(url, min(DEFAULT_TIMEOUT, remaining),
+                                      FOLLOW_PAGE_MAX_BYTES) as response:
+                if response.status_code != 200 or 'html' not in response.headers.get('content-type', ''):
+                    return []
+                fragments, _ = self._fetch_page(response, url, FOLLOW_FRAGMENTS_PER_PAGE,
+                                                FOLLOW_PAGE_MAX_BYTES)
+                return fragments
+        finally:
+            slot.release()
+    
+    async def _afollow_results(self, urls: List[str],
+                               deadline: float = FOLLOW_DEADLINE) -> Tuple[List[str], List[str]]:
+        """Versión async de `_follow_results`.
+        
+        Las descargas pendientes se cancelan (y se esperan) tanto al vencer
+        el plazo como si se cancela esta corrutina.
+        """
+        if not urls or not self.follow_results:
+            return [], []
+        
+        tasks = [asyncio.ensure_future(self._afetch_result_page(url)) for url in urls]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=deadline)
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        fragments = []
+        sources = []
+        for url, task in zip(urls, tasks):
+            if task not in done or task.exception():
+                continue
+            page_fragments = task.result()
+            fragments.extend(page_fragments)
+            sources.extend([url] * len(page_fragments))
         
         return fragments, sources
     
-    def _load_learned_knowledge(self) -> Dict[str, List[str]]:
-        """Carga conocimiento aprendido de feedback."""
-        learned_file = os.path.join(os.path.dirname(__file__), 'data', 'learned_knowledge.json')
+    async def _afetch_result_page(self, url: str) -> List[str]:
+        """Descarga una página de resultado (async) respetando el límite por host."""
+        async with self._ahost_slot(url):
+            async with self.transport.afetch(self._get_async_client(), url, DEFAULT_TIMEOUT,
+                                             FOLLOW_PAGE_MAX_BYTES) as response:
+                if response.status_code != 200 or 'html' not in response.headers.get('content-type', ''):
+                    return []
+                fragments, _ = await self._afetch_page(response, url, FOLLOW_FRAGMENTS_PER_PAGE,
+                                                       FOLLOW_PAGE_MAX_BYTES)
+                return fragments
+    
+    def _search_wikipedia(self, query: str, timeout: float = DEFAULT_TIMEOUT,
+                          engine: str = 'wikipedia') -> Tuple[List[str], List[str]]:
+        """Búsqueda en Wikipedia API."""
+        health = self.engine_health[engine]
+        if not health.allow():
+            raise EngineSkipped(engine)
+        
+        url = self._engine_url(engine, query)
+        with health.track() as call, self.transport.fetch(url, health.timeout(timeout)) as response:
+            if response.from_cache:
+                call.ignore()
+            check_engine_response(response)
+            return self._parse_wikipedia(response.json())
+    
+    async def _asearch_wikipedia(self, query: str, timeout: float = DEFAULT_TIMEOUT,
+                                 engine: str = 'wikipedia') -> Tuple[List[str], List[str]]:
+        """Búsqueda en Wikipedia API (async)."""
+        health = self.engine_health[engine]
+        if not health.allow():
+            raise EngineSkipped(engine)
+        
+        url = self._engine_url(engine, query)
+        client = self._get_async_client()
+        with health.track() as call:
+            async with self.transport.afetch(client, url, health.timeout(timeout)) as response:
+                if response.from_cache:
+                    call.ignore()
+                check_engine_response(response)
+                await response.aread()
+                return self._parse_wikipedia(response.json())
+    
+    def _parse_wikipedia(self, data: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """Extrae snippets válidos de la respuesta de la API de Wikipedia."""
+        fragments = []
+        sources = []
         
-        if os.path.exists(learned_file):
-            try:
-                with open(learned_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                pass
+        if 'query' in data and 'search' in data['query']:
+            for result in data['query']['search'][:3]:
+                snippet = strip_tags(result.get('snippet', ''))
+                if is_valid_fragment(snippet):
+                    fragments.append(snippet)
+                    sources.append(f"Wikipedia: {result.get('title', 'Artículo')}")
         
-        return {}
+        return fragments, sources
+    
+    def _engine_url(self, engine: str, query: str) -> str:
+        """Construye la URL de búsqueda de un motor a partir de la configuración."""
+        return self.search_engines[engine].format(query=urllib.parse.quote_plus(query))
+    
+    def _search_knowledge_base(self, keywords: List[str]) -> Tuple[List[str], List[str]]:
+        """Búsqueda en base de conocimiento con aprendizaje."""
+        return self.knowledge.search(keywords)
     
     def _extract_content(self, html: str, url: str) -> Dict[str, Any]:
         """Extracción mejorada de contenido."""
         if not html:
             return {'fragments': [], 'metadata': {}}
         
-        html = clean_html(html)
-        
-        if self.has_bs4:
-            return self._extract_with_bs4_enhanced(html, url)
-        else:
-            return self._extract_with_regex(html)
-    
-    def _extract_with_bs4_enhanced(self, html: str, url: str) -> Dict[str, Any]:
-        """Extracción mejorada con BeautifulSoup."""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Limpiar elementos no deseados
-            for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                tag.decompose()
-            
-            fragments = []
-            
-            # Priorizar contenido principal
-            main_content = soup.find(['main', 'article', 'div'], class_=re.compile(r'content|main|article'))
-            search_area = main_content if main_content else soup
-            
-            # Extraer párrafos
-            for p in search_area.find_all('p', limit=20):
-                text = p.get_text(strip=True)
-                if is_valid_fragment(text):
-                    fragments.append(text)
-            
-            # Extraer listas
-            for li in search_area.find_all('li', limit=15):
-                text = li.get_text(strip=True)
-                if is_valid_fragment(text):
-                    fragments.append(text)
-            
-            # Extraer definiciones
-            for dt in search_area.find_all('dt', limit=10):
-                dd = dt.find_next_sibling('dd')
-                if dd:
-                    text = f"{dt.get_text(strip=True)}: {dd.get_text(strip=True)}"
-                    if is_valid_fragment(text):
-                        fragments.append(text)
-            
             return {
-                'fragments': fragments[:25],
-                'metadata': {'url': url, 'method': 'bs4_enhanced'}
+                'fragments': self.parser_backend.extract(html, max_fragments=25),
+                'metadata': {'url': url, 'method': self.parser_backend.name}
             }
         except Exception:
-            return self._extract_with_regex(html)
+            return self._extract_with_regex(clean_html(html))
     
     def _extract_with_regex(self, html: str) -> Dict[str, Any]:
         """Extracción básica con regex."""
-        fragments = []
-        
-        for pattern in HTML_PATTERNS:
-            for match in re.finditer(pattern, html, flags=re.DOTALL | re.IGNORECASE):
-                text = re.sub(r'<[^>]+>', ' ', match.group(1))
-                text = re.sub(r'\s+', ' ', text).strip()
-                
-                if is_valid_fragment(text):
-                    fragments.append(text)
-        
         return {
-            'fragments': fragments[:20],
+            'fragments': extract_with_regex(html, max_fragments=20),
             'metadata': {'method': 'regex'}
         }
     
@@ -398,110 +1006,296 @@ class EnhancedContentFetcher:
 
 
 class LearningSystem:
-    """Sistema de aprendizaje continuo."""
+    """Sistema de aprendizaje continuo.
+    
+    El feedback se encola y un hilo de fondo lo fusiona por lotes en un
+    `LearnedKnowledge` en memoria: el positivo refuerza hechos y el negativo
+    los penaliza. `learned_knowledge.json` se vuelca periódicamente con un
+    reemplazo atómico. Si el fichero se sustituye desde fuera (p. ej. por
+    `reindex.py`), se adopta y se reaplica la cola del registro que no cubre.
+    """
     
     def __init__(self):
-        self.feedback_file = os.path.join(os.path.dirname(__file__), 'data', 'feedback.json')
-        self.learned_file = os.path.join(os.path.dirname(__file__), 'data', 'learned_knowledge.json')
+        self.feedback_store = get_feedback_store()
+        self.feedback_file = str(self.feedback_store.path)
+        self.learned_file = str(LEARNED_KNOWLEDGE_FILE)
+        self.stats_file = str(LEARNING_STATS_FILE)
         self._ensure_data_dir()
+        self._stats_lock = threading.Lock()
+        # Serializa los volcados: una copia antigua no pisa a una más nueva
+        self._persist_lock = threading.Lock()
+        self._stats = {
+            'total_feedback': 0,
+            'positive_feedback': 0,
+            'learned_topics': 0,
+            'learned_facts': 0
+        }
+        self._feedback_offset = 0
+        self._learned_sig = None
+        self._stats_dirty = False
+        self._last_persist = 0.0
+        self._learned = None
+        self._applied_offset = 0
+        self._replayed_offset = 0
+        self._learned_lock = threading.Lock()
+        self._learned_dirty = False
+        self._learned_saved = None
+        self._last_flush = time.monotonic()
+        self._learn_queue = queue.Queue(maxsize=LEARNING_QUEUE_MAX)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._reconcile_stats()
+        atexit.register(self.close)
     
     def _ensure_data_dir(self):
         """Asegura que exista el directorio de datos."""
-        os.makedirs(os.path.dirname(self.feedback_file), exist_ok=True)
+        os.makedirs(os.path.dirname(self.learned_file), exist_ok=True)
     
     def add_feedback(self, prompt: str, response: Dict[str, Any], useful: bool):
-        """Añade feedback del usuario."""
-        entry = {
-            'prompt': prompt,
-            'response': response,
-            'useful': bool(useful),
-            'timestamp': str(datetime.now())
-        }
-        
-        try:
-            if os.path.exists(self.feedback_file):
-                with open(self.feedback_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            else:
-                data = []
-        except Exception:
-            data = []
-        
-        data.append(entry)
+        """Añade feedback del usuario (anexado O(1) al registro)."""
+        entry = make_entry(prompt, response, useful)
+        offset = self.feedback_store.append(entry)
+        self._catch_up_feedback()
         
-        with open(self.feedback_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Aprender de feedback positivo
-        if useful:
-            self._learn_from_feedback(entry)
+        # Aprender del feedback (en segundo plano)
+        self._enqueue_learning(entry, offset)
     
-    def _learn_from_feedback(self, entry: Dict[str, Any]):
-        """Aprende de feedback positivo."""
+    def _enqueue_learning(self, entry: Dict[str, Any], offset: int):
+        self._ensure_worker()
         try:
-            # Cargar conocimiento aprendido
-            if os.path.exists(self.learned_file):
-                with open(self.learned_file, 'r', encoding='utf-8') as f:
-                    learned = json.load(f)
-            else:
-                learned = {}
-            
-            # Extraer keywords del prompt
-            keywords = entry['response'].get('keywords', [])
-            response_text = entry['response'].get('response_text', '')
-            
-            # Dividir respuesta en oraciones
-            sentences = re.split(r'[.!?]\s+', response_text)
-            valid_sentences = [s.strip() for s in sentences if len(s.strip()) > 30]
+            self._learn_queue.put_nowait((entry, offset))
+        except queue.Full:
+            # El feedback ya está en el registro; un re-indexado lo recupera.
+            print("Cola de aprendizaje llena: entrada descartada")
+    
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._learning_loop, name='learning-worker', daemon=True
+                    )
+                    self._worker.start()
+    
+    def _learning_loop(self):
+        """Hilo de fondo: agrupa el feedback encolado y lo fusiona."""
+        while True:
+            try:
+                first = self._learn_queue.get(timeout=LEARNING_FLUSH_INTERVAL)
+            except queue.Empty:
+                self._flush_learned()
+                continue
+            batch = [first]
+            while len(batch) < LEARNING_BATCH_SIZE:
+                try:
+                    batch.append(self._learn_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._learn_from_batch(batch)
+                if time.monotonic() - self._last_flush >= LEARNING_FLUSH_INTERVAL:
+                    self._flush_learned()
+            except Exception as e:
+                print(f"Error en aprendizaje: {e}")
+            finally:
+                for _ in batch:
+                    self._learn_queue.task_done()
+    
+    def _load_learned(self):
+        """Carga el conocimiento aprendido si cambió fuera de este proceso.
+        
+        Tras cargarlo se reaplica el registro de feedback desde
+        `meta.feedback_offset`, así que ni un artefacto de re-indexado ni un
+        volcado anterior a una caída pierden entradas. Los cambios propios
+        aún sin volcar se descartan: también están en esa cola del registro.
+        """
+        sig = self._file_signature(self.learned_file)
+        if self._learned is not None and sig == self._learned_sig:
+            return
+        learned = LearnedKnowledge.load(self.learned_file)
+        store = self.feedback_store
+        offset = learned.meta.get('feedback_offset')
+        replayed = False
+        # Sin offset (directorio nuevo o fichero antiguo) no se reaplica nada:
+        # todo lo que llegue por la cola está pendiente.
+        replayed_offset = 0
+        if (isinstance(offset, int) and 0 <= offset <= store.size()
+                and store.is_line_start(offset)):
+            now = time.time()
+            replayed_offset = offset
+            for entry, replayed_offset in store.scan(offset):
+                replayed |= apply_feedback(learned, entry, now)
+            if replayed:
+                learned.enforce_limits(now)
+        self._learned = learned
+        self._learned_sig = sig
+        self._applied_offset = self._replayed_offset = replayed_offset
+        self._learned_dirty = replayed
+        self._update_learned_stats()
+    
+    def _update_learned_stats(self):
+        with self._stats_lock:
+            self._stats['learned_topics'] = len(self._learned)
+            self._stats['learned_facts'] = self._learned.fact_count
+    
+    def _learn_from_batch(self, batch: List[Tuple[Dict[str, Any], int]]):
+        """Fusiona un lote de feedback en el conocimiento aprendido."""
+        with self._learned_lock:
+            self._load_learned()
+            learned = self._learned
+            now = time.time()
+            changed = False
             
-            # Añadir a conocimiento aprendido
-            for keyword in keywords[:3]:
-                keyword_lower = keyword.lower()
-                if keyword_lower not in learned:
-                    learned[keyword_lower] = []
-                
-                # Añadir oraciones relevantes
-                for sentence in valid_sentences[:3]:
-                    if sentence not in learned[keyword_lower]:
-                        learned[keyword_lower].append(sentence)
+            for entry, offset in batch:
+                # Las entradas ya reaplicadas desde el registro se saltan
+                if offset <= self._replayed_offset:
+                    continue
+                self._applied_offset = max(self._applied_offset, offset)
+                changed |= apply_feedback(learned, entry, now)
             
-            # Guardar
-            with open(self.learned_file, 'w', encoding='utf-8') as f:
-                json.dump(learned, f, ensure_ascii=False, indent=2)
-        
-        except Exception as e:
-            print(f"Error en aprendizaje: {e}")
+            if changed:
+                learned.enforce_limits(now)
+                self._learned_dirty = True
+            self._update_learned_stats()
+    
+    def _flush_learned(self):
+        """Vuelca el conocimiento aprendido con un reemplazo atómico."""
+        with self._learned_lock:
+            if not self._learned_dirty:
+                return
+            # Si otro proceso sustituyó el fichero, se adopta antes de volcar
+            self._load_learned()
+            self._learned.prune()
+            self._learned.meta['feedback_offset'] = self._applied_offset
+            try:
+                self._learned.save(self.learned_file)
+            except OSError as e:
+                print(f"Error guardando conocimiento aprendido: {e}")
+                return
+            self._learned_dirty = False
+            self._last_flush = time.monotonic()
+            self._learned_sig = self._file_signature(self.learned_file)
+            topics = len(self._learned)
+            facts = self._learned.fact_count
+        
+        self._update_learned_stats()
+        with self._stats_lock:
+            self._learned_saved = [topics, facts, self._learned_sig]
+            self._stats_dirty = True
+        self._maybe_persist_stats()
+    
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se procese la cola y vuelca lo aprendido.
+        
+        Devuelve False si vence `timeout` antes de vaciar la cola.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._learn_queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        self._flush_learned()
+        return True
+    
+    def close(self):
+        """Vacía la cola de aprendizaje y persiste los contadores."""
+        if self._worker is not None and self._worker.is_alive():
+            self.drain(timeout=LEARNING_FLUSH_INTERVAL * 5)
+        self.persist_stats()
     
     def get_learning_stats(self) -> Dict[str, Any]:
-        """Obtiene estadísticas de aprendizaje."""
-        stats = {
-            'total_feedback': 0,
-            'positive_feedback': 0,
-            'learned_topics': 0,
-            'learned_facts': 0
-        }
+        """Obtiene estadísticas de aprendizaje (contadores en memoria, O(1))."""
+        with self._stats_lock:
+            return dict(self._stats)
+    
+    @staticmethod
+    def _file_signature(path: str) -> Optional[List[int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+    
+    def _catch_up_feedback(self):
+        """Cuenta las entradas del registro posteriores al último offset.
+        
+        Tras una escritura propia suele ser solo esa línea; también recoge
+        lo que hayan anexado otros procesos.
+        """
+        with self._stats_lock:
+            for entry, offset in self.feedback_store.scan(self._feedback_offset):
+                self._stats['total_feedback'] += 1
+                if entry.get('useful'):
+                    self._stats['positive_feedback'] += 1
+                self._feedback_offset = offset
+                self._stats_dirty = True
+        self._maybe_persist_stats()
+    
+    def _count_learned(self):
+        learned = LearnedKnowledge.load(self.learned_file)
+        topics, facts = len(learned), learned.fact_count
+        self._stats['learned_topics'] = topics
+        self._stats['learned_facts'] = facts
+        self._learned_saved = [topics, facts, self._file_signature(self.learned_file)]
+    
+    def _reconcile_stats(self):
+        """Carga los contadores persistidos y los concilia con los ficheros.
+        
+        Del registro de feedback solo se lee la cola posterior al offset
+        guardado; si el offset no es válido se recuenta entero. El
+        conocimiento aprendido se recuenta solo si cambió su firma.
+        """
+        saved = {}
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            pass
         
-        # Feedback stats
-        if os.path.exists(self.feedback_file):
-            try:
-                with open(self.feedback_file, 'r', encoding='utf-8') as f:
-                    feedback = json.load(f)
-                    stats['total_feedback'] = len(feedback)
-                    stats['positive_feedback'] = sum(1 for f in feedback if f.get('useful'))
-            except Exception:
-                pass
+        with self._stats_lock:
+            offset = saved.get('feedback_offset', 0)
+            if (isinstance(offset, int) and 0 < offset <= self.feedback_store.size()
+                    and self.feedback_store.is_line_start(offset)):
+                self._feedback_offset = offset
+                self._stats['total_feedback'] = saved.get('total_feedback', 0)
+                self._stats['positive_feedback'] = saved.get('positive_feedback', 0)
+            
+            if saved.get('learned_sig') and saved['learned_sig'] == self._file_signature(self.learned_file):
+                self._stats['learned_topics'] = saved.get('learned_topics', 0)
+                self._stats['learned_facts'] = saved.get('learned_facts', 0)
+                self._learned_saved = [self._stats['learned_topics'],
+                                       self._stats['learned_facts'], saved['learned_sig']]
+            else:
+                self._count_learned()
+                self._stats_dirty = True
         
-        # Learned knowledge stats
-        if os.path.exists(self.learned_file):
+        self._catch_up_feedback()
+        self.persist_stats()
+    
+    def _maybe_persist_stats(self):
+        if time.monotonic() - self._last_persist >= LEARNING_STATS_PERSIST_INTERVAL:
+            self.persist_stats()
+    
+    def persist_stats(self):
+        """Guarda los contadores de forma atómica si han cambiado."""
+        with self._persist_lock:
+            with self._stats_lock:
+                if not self._stats_dirty:
+                    return
+                # Los contadores de conocimiento que se guardan son los del
+                # último volcado, para que casen con la firma del fichero.
+                data = dict(self._stats, feedback_offset=self._feedback_offset)
+                if self._learned_saved is not None:
+                    data['learned_topics'], data['learned_facts'], data['learned_sig'] = self._learned_saved
+                self._stats_dirty = False
+                self._last_persist = time.monotonic()
+            tmp = f"{self.stats_file}.{os.getpid()}.tmp"
             try:
-                with open(self.learned_file, 'r', encoding='utf-8') as f:
-                    learned = json.load(f)
-                    stats['learned_topics'] = len(learned)
-                    stats['learned_facts'] = sum(len(facts) for facts in learned.values())
-            except Exception:
-                pass
-        
-        return stats
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.stats_file)
+            except OSError as e:
+                print(f"Error guardando estadísticas de aprendizaje: {e}")
 
 
 class TextProcessor:
@@ -664,95 +1458,155 @@ class TextProcessor:
 class EnhancedCrawler:
     """Crawler mejorado con IA y aprendizaje."""
     
-    def __init__(self, use_cache: bool = True, use_ai: bool = True):
-        self.fetcher = EnhancedContentFetcher(use_cache=use_cache)
-        self.ai_provider = AIProvider() if use_ai else None
+    def __init__(self, use_cache: bool = True, use_ai: bool = True,
+                 fetcher: Optional[EnhancedContentFetcher] = None,
+                 ranker=None, ai_provider: Optional[AIProvider] = None):
+        self.fetcher = fetcher or EnhancedContentFetcher(use_cache=use_cache)
+        self.ai_provider = ai_provider or (AIProvider(
+            answer_cache=AnswerCache() if use_cache else None
+        ) if use_ai else None)
         self.learning = LearningSystem()
+        self.inflight = SingleFlight()
+        
+        # Estadísticas de corpus: KB + fragmentos ya cacheados
+        self.corpus = CorpusStats(self.fetcher.knowledge)
+        if self.fetcher.cache:
+            for data in self.fetcher.cache.disk.iter_data():
+                self.corpus.add_documents(data.get('fragments', []))
+        self.ranker = ranker or create_ranker(RANKER, self.corpus)
+        self.dedup = NearDuplicateFilter()
     
     def run(self, prompt: str) -> Dict[str, Any]:
-        """Ejecuta ciclo completo con IA."""
+        """Ejecuta ciclo completo con IA (envoltorio síncrono de `arun`)."""
+        return run_sync(self.arun(prompt))
+    
+    async def arun(self, prompt: str) -> Dict[str, Any]:
+        """Ejecuta ciclo completo con IA sin bloquear hilos en la E/S de red.
+        
+        Las consultas concurrentes con el mismo texto normalizado (mayúsculas,
+        acentos y puntuación) y la misma intención comparten una única
+        ejecución del pipeline; el conjunto de palabras clave no basta
+        ("¿Qué es Python?" y "¿Por qué Python?" coinciden en él).
+        """
+        processed = TextProcessor(prompt).get_processed()
+        key = f"{KEY_NORMALIZERS['text'](prompt)}|{processed.get('intent')}"
+        result = await self.inflight.ado(key, lambda: self._arun(prompt, processed))
+        
+        if result['prompt'] != prompt:
+            result = {'prompt': prompt, 'response': {**result['response'], 'query': prompt}}
+        
+        return result
+    
+    async def _arun(self, prompt: str, processed: Dict[str, Any]) -> Dict[str, Any]:
+        """Pipeline completo sin deduplicar (ver `arun`) sobre el prompt ya procesado."""
         
         # 1. Procesar prompt
-        processor = TextProcessor(prompt)
-        processed = processor.get_processed()
         keywords = processed.get('keywords', [])
         
         # 2. Buscar contenido
-        fragments, sources = self.fetcher.search(prompt, keywords)
+        fragments, sources = await self.fetcher.asearch(
+            prompt, keywords, intent=processed.get('intent')
+        )
         
-        # 3. Rankear y consolidar
-        ranked_facts = self._rank_and_consolidate(fragments, keywords)
+        # 3. Rankear y consolidar (CPU: fuera del bucle de eventos)
+        ranked_facts = await asyncio.to_thread(self._rank_fragments, fragments, keywords)
         
         # 4. Generar respuesta con IA o fallback
         if self.ai_provider and self.ai_provider.provider:
-            response_text = self.ai_provider.generate(prompt, ranked_facts)
+            response_text = await self.ai_provider.agenerate(prompt, ranked_facts)
         else:
             response_text = self._generate_fallback_response(prompt, ranked_facts)
         
         # 5. Construir respuesta completa
-        response = {
+        response = self._build_response(prompt, processed, sources, ranked_facts)
+        response['response_text'] = response_text
+        response['learning_stats'] = self.learning.get_learning_stats()
+        
+        return {
+            'prompt': prompt,
+            'response': response
+        }
+    
+    def stream(self, prompt: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Ejecuta el ciclo completo emitiendo eventos según avanza.
+        
+        Emite ('analysis', análisis y fuentes), después ('delta', {'text'})
+        por cada fragmento generado y por último ('done', respuesta completa
+        con confianza y estadísticas).
+        """
+        processed = TextProcessor(prompt).get_processed()
+        keywords = processed.get('keywords', [])
+        
+        fragments, sources = self.fetcher.search(prompt, keywords, intent=processed.get('intent'))
+        ranked_facts = self._rank_fragments(fragments, keywords)
+        
+        response = self._build_response(prompt, processed, sources, ranked_facts)
+        yield 'analysis', {k: v for k, v in response.items() if k != 'confidence'}
+        
+        if self.ai_provider and self.ai_provider.provider:
+            deltas = self.ai_provider.stream(prompt, ranked_facts)
+        else:
+            deltas = [self._generate_fallback_response(prompt, ranked_facts)]
+        
+        parts = []
+        for delta in deltas:
+            parts.append(delta)
+            yield 'delta', {'text': delta}
+        
+        response['response_text'] = ''.join(parts)
+        response['learning_stats'] = self.learning.get_learning_stats()
+        yield 'done', {'prompt': prompt, 'response': response}
+    
+    def _build_response(self, prompt: str, processed: Dict[str, Any], sources: List[str],
+                        ranked_facts: List[str]) -> Dict[str, Any]:
+        """Respuesta sin texto generado ni estadísticas de aprendizaje."""
+        keywords = processed.get('keywords', [])
+        
+        return {
             'query': prompt,
             'intent': processed.get('intent'),
             'topics': keywords[:5],
             'keywords': keywords,
             'complexity': processed.get('complexity'),
             'question_type': processed.get('question_type'),
-            'response_text': response_text,
+            'response_text': '',
             'sources': list(set(sources)),
             'confidence': calculate_confidence(ranked_facts, keywords),
             'style': processed.get('style'),
             'ai_provider': self.ai_provider.provider if self.ai_provider else 'fallback',
-            'learning_stats': self.learning.get_learning_stats()
-        }
-        
-        return {
-            'prompt': prompt,
-            'response': response
+            'learning_stats': {}
         }
     
     def add_feedback(self, prompt: str, response: Dict[str, Any], useful: bool):
         """Añade feedback para aprendizaje."""
         self.learning.add_feedback(prompt, response, useful)
     
+    def _rank_fragments(self, fragments: List[str], keywords: List[str]) -> List[str]:
+        """Añade los fragmentos al corpus y los rankea y consolida."""
+        self.corpus.add_documents(fragments)
+        return self._rank_and_consolidate(fragments, keywords)
+    
     def _rank_and_consolidate(self, fragments: List[str], keywords: List[str], 
                                limit: int = 10) -> List[str]:
         """Rankea y consolida fragmentos."""
         if not fragments:
             return []
         
-        scored = []
-        for fragment in fragments:
-            score = self._calculate_relevance(fragment, keywords)
-            scored.append((score, fragment))
-        
+        scores = self.ranker.score(fragments, keywords)
+        scored = list(zip(scores, fragments))
         scored.sort(key=lambda x: x[0], reverse=True)
         
         seen = set()
-        consolidated = []
+        unique = []
         for score, fragment in scored:
             if fragment not in seen:
                 seen.add(fragment)
-                consolidated.append(fragment)
-                if len(consolidated) >= limit:
-                    break
-        
-        return consolidated
-    
-    def _calculate_relevance(self, text: str, keywords: List[str]) -> float:
-        """Calcula relevancia."""
-        score = 0
-        text_lower = text.lower()
-        
-        for kw in keywords:
-            if kw.lower() in text_lower:
-                score += 3
+                unique.append(fragment)
         
-        score += sum(1 for ch in text if ch.isdigit()) * 0.1
-        
-        if 100 < len(text) < 500:
-            score += 2
+        # Casi duplicados (espacios, puntuación...) antes del corte
+        consolidated, _ = self.dedup.filter(unique)
         
-        return score
+        return consolidated[:limit]
     
     def _generate_fallback_response(self, prompt: str, facts: List[str]) -> str:
         """Genera respuesta sin IA."""
@@ -0,0 +1,547 @@
+"""Extracción de fragmentos de texto a partir de HTML."""
+import bisect
+import codecs
+import html as html_lib
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from config import PAGE_MAX_BYTES, HTML_PARSER_BACKEND, HTML_PATTERNS
+from utils import clean_html, filter_valid_fragments, is_valid_fragment
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+    _HAS_SELECTOLAX = True
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+        _HAS_SELECTOLAX = True
+    except ImportError:
+        SelectolaxParser = None
+        _HAS_SELECTOLAX = False
+
+try:
+    import lxml.html
+    _HAS_LXML = True
+except ImportError:
+    _HAS_LXML = False
+
+try:
+    from bs4 import BeautifulSoup
+    _HAS_BS4 = True
+except ImportError:
+    BeautifulSoup = None
+    _HAS_BS4 = False
+
+
+# Etiquetas cuyo contenido se descarta por completo
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript', 'template'}
+
+# Límites por etiqueta (mismos que la extracción con BeautifulSoup)
+TAG_LIMITS = {'p': 20, 'li': 15, 'dt': 10}
+
+_WHITESPACE = re.compile(r'\s+')
+_MAIN_CLASS = re.compile(r'content|main|article')
+_LIST_TAGS = ('ul', 'ol', 'dl', 'menu')
+# Etiquetas de bloque que cierran un <p> abierto (como en HTML5)
+_CLOSES_P = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'div', 'dl', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hgroup', 'hr', 'main', 'menu', 'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table', 'ul'
+})
+_TAG = re.compile(r'<[^>]+>')
+_ANCHOR = re.compile(r'<a\s[^>]*>', re.IGNORECASE)
+_ATTRIBUTE = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+_TAGS_AND_SPACE = re.compile(r'(?:<[^>]+>|\s)+')
+
+# Patrones de `HTML_PATTERNS` partidos en apertura y cierre: las aperturas se
+# fusionan en una única alternancia y el documento se recorre una sola vez.
+_PATTERN_PARTS = [pattern.split('(.*?)', 1) for pattern in HTML_PATTERNS]
+_OPENING = re.compile(
+    '|'.join(f'(?P<t{i}>{opening})' for i, (opening, _) in enumerate(_PATTERN_PARTS)),
+    re.IGNORECASE
+)
+_CLOSING = [re.compile(closing, re.IGNORECASE) for _, closing in _PATTERN_PARTS]
+
+
+class StreamingExtractor(HTMLParser):
+    """Extractor incremental de párrafos, elementos de lista y definiciones.
+    
+    Se alimenta por trozos (`feed_bytes`) con los mismos criterios que los
+    backends sobre árbol: si hay contenedor principal (main/article/div con
+    clase content|main|article) solo cuenta lo que hay dentro, y el
+    resultado son los párrafos, luego los elementos de lista y luego los
+    pares dt: dd, con los límites de `TAG_LIMITS`. Las etiquetas sin cerrar
+    se cierran como en HTML5 (un bloque cierra el <p> abierto, <dt> cierra
+    el <dt> anterior...), igual que selectolax; bs4 con `html.parser` las
+    anida, así que solo coincide con él en HTML bien cerrado.
+    
+    Deja de procesar cuando el resultado ya no puede cambiar (se cerró el
+    contenedor principal, o dentro de él se llenaron los límites o hay
+    `max_fragments` párrafos válidos) o al superar `max_bytes`, así que la
+    memoria y la CPU por página están acotadas sea cual sea su tamaño.
+    
+    Con `link_class` recoge además los `href` de los enlaces con esa clase
+    (hasta `max_links`) y no para hasta tener ambos.
+    """
+    
+    def __init__(self, max_fragments: int = 25, max_bytes: int = PAGE_MAX_BYTES,
+                 encoding: Optional[str] = None, link_class: Optional[str] = None,
+                 max_links: int = 10):
+        super().__init__(convert_charrefs=True)
+        self.max_fragments = max_fragments
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.links: List[str] = []
+        self.link_class = link_class
+        self.max_links = max_links if link_class else 0
+        self.done = False
+        self._text_done = False
+        self._decoder = codecs.getincrementaldecoder(_codec(encoding))(errors='replace')
+        self._skip_depth = 0
+        self._seq = 0  # orden de apertura (= orden del documento)
+        self._list_depth = 0  # anidamiento de ul/ol/dl
+        # [tag, partes de texto, dentro del principal, orden, nivel de lista, zonas | dt emparejados]
+        self._open: List[list] = []
+        self._pending_dts: List[list] = []  # [orden, texto, dentro del principal, nivel]
+        # Candidatos por zona (toda la página y el contenedor principal); los
+        # huecos de `TAG_LIMITS` se asignan en orden de documento y los
+        # válidos se guardan como (orden, texto) ordenados
+        self._counts = {area: {tag: 0 for tag in TAG_LIMITS} for area in ('page', 'main')}
+        self._valid = {area: {tag: [] for tag in TAG_LIMITS} for area in ('page', 'main')}
+        self._main_state = None  # None (sin ver), 'open' o 'closed'
+        self._main_tag = None
+        self._main_depth = 0
+    
+    @property
+    def fragments(self) -> List[str]:
+        """Fragmentos válidos de la zona elegida, en orden p → li → dt."""
+        valid = self._valid['main' if self._main_state else 'page']
+        return [text for _, text in valid['p'] + valid['li'] + valid['dt']][:self.max_fragments]
+    
+    def feed_bytes(self, chunk: bytes) -> bool:
+        """Procesa un trozo de la respuesta; devuelve True si ya no hace falta más."""
+        if self.done:
+            return True
+        
+        self.bytes_read += len(chunk)
+        truncated = self.bytes_read > self.max_bytes
+        if truncated:
+            chunk = chunk[:len(chunk) - (self.bytes_read - self.max_bytes)]
+        
+        self.feed(self._decoder.decode(chunk))
+        if truncated:
+            self.done = True
+        return self.done
+    
+    def finish(self) -> List[str]:
+        """Cierra el parser y devuelve los fragmentos extraídos."""
+        if not self.done:
+            self.feed(self._decoder.decode(b'', final=True))
+            self.close()
+        # Los elementos sin cerrar al final del documento (o del corte) cuentan
+        if not self._text_done:
+            self._close_open(lambda entry: True)
+        return self.fragments
+    
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        
+        if tag == 'a' and len(self.links) < self.max_links:
+            self._collect_link(dict(attrs))
+        
+        if self._text_done:
+            return
+        
+        if not self._skip_depth and tag in _CLOSES_P and any(entry[0] == 'p' for entry in self._open):
+            self._close('p')
+        
+        if tag in SKIP_TAGS:
+            # El texto de antes y el de después no se juntan
+            if not self._skip_depth:
+                self._append_text(' ')
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        
+        if self._main_state is None and tag in ('main', 'article', 'div'):
+            if _MAIN_CLASS.search(dict(attrs).get('class') or ''):
+                self._main_state = 'open'
+                self._main_tag = tag
+        if self._main_state == 'open' and tag == self._main_tag:
+            self._main_depth += 1
+        
+        # Separador entre textos de distintos nodos (como get_text(' '))
+        self._append_text(' ')
+        if tag in _LIST_TAGS:
+            self._list_depth += 1
+        elif tag in ('p', 'li', 'dt', 'dd'):
+            self._open_element(tag)
+    
+    def handle_endtag(self, tag):
+        if self.done or self._text_done:
+            return
+        
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+        
+        self._append_text(' ')
+        if tag in _LIST_TAGS:
+            # Lo que quede abierto en la lista se cierra con ella
+            depth = self._list_depth
+            self._close_open(lambda entry: entry[4] >= depth)
+            self._pending_dts = [dt for dt in self._pending_dts if dt[3] < depth]
+            self._list_depth = max(0, depth - 1)
+        elif any(entry[0] == tag for entry in self._open):
+            self._close(tag)
+        elif tag in _CLOSES_P and any(entry[0] == 'p' for entry in self._open):
+            # El cierre del bloque cierra el <p> abierto dentro de él
+            self._close('p')
+        
+        if self._main_state == 'open' and tag == self._main_tag:
+            self._main_depth -= 1
+            if self._main_depth == 0:
+                # Lo que quede abierto dentro del principal se cierra con él
+                self._close_open(lambda entry: entry[2])
+                self._main_state = 'closed'
+                self._finish_text()
+    
+    def handle_data(self, data):
+        if not self.done and not self._text_done and not self._skip_depth:
+            self._append_text(data)
+    
+    def _collect_link(self, attrs: Dict[str, Optional[str]]):
+        href = attrs.get('href')
+        if href and self.link_class in (attrs.get('class') or '').split():
+            self.links.append(href)
+            if len(self.links) >= self.max_links and self._text_done:
+                self.done = True
+    
+    def _append_text(self, data: str):
+        for entry in self._open:
+            entry[1].append(data)
+    
+    def _open_element(self, tag: str):
+        """Abre p/li/dt/dd con los cierres implícitos de HTML en su mismo nivel de lista."""
+        depth = self._list_depth
+        closes = ('dt', 'dd') if tag in ('dt', 'dd') else (tag,)
+        if self._open and self._open[-1][0] in closes and self._open[-1][4] == depth:
+            self._close(self._open[-1][0])
+        
+        in_main = self._main_state == 'open'
+        self._seq += 1
+        if tag == 'dd':
+            # Cada dt pendiente del mismo nivel se empareja con este dd
+            slots = [(seq, text, self._take_slot('dt', dt_in_main and in_main))
+                     for seq, text, dt_in_main, dt_depth in self._pending_dts if dt_depth == depth]
+            self._pending_dts = [dt for dt in self._pending_dts if dt[3] != depth]
+        elif tag == 'dt':
+            slots = None
+        else:
+            slots = self._take_slot(tag, in_main)
+        self._open.append([tag, [], in_main, self._seq, depth, slots])
+    
+    def _take_slot(self, tag: str, in_main: bool) -> List[str]:
+        """Zonas en las que el elemento aún cabe dentro de `TAG_LIMITS`."""
+        areas = []
+        for area in ('page', 'main') if in_main else ('page',):
+            if self._counts[area][tag] < TAG_LIMITS[tag]:
+                self._counts[area][tag] += 1
+                areas.append(area)
+        return areas
+    
+    def _close(self, tag: str):
+        """Cierra `tag` (y lo que quede abierto dentro) y valida su texto."""
+        while self._open:
+            entry = self._open.pop()
+            self._emit(entry)
+            if entry[0] == tag:
+                break
+    
+    def _close_open(self, predicate):
+        while self._open and predicate(self._open[-1]):
+            self._emit(self._open.pop())
+    
+    def _emit(self, entry: list):
+        tag, parts, in_main, seq, depth, slots = entry
+        text = _WHITESPACE.sub(' ', ''.join(parts)).strip()
+        
+        if tag == 'dt':
+            self._pending_dts.append([seq, text, in_main, depth])
+            return
+        
+        if tag == 'dd':
+            for dt_seq, dt_text, areas in slots:
+                self._add('dt', dt_seq, f"{dt_text}: {text}", areas)
+        else:
+            self._add(tag, seq, text, slots)
+        
+        if self._main_state == 'open' and (
+            len(self._valid['main']['p']) >= self.max_fragments
+            or (all(self._counts['main'][t] >= limit for t, limit in TAG_LIMITS.items())
+                and not any(entry[2] for entry in self._open))
+        ):
+            self._finish_text()
+    
+    def _add(self, tag: str, seq: int, text: str, areas: List[str]):
+        if areas and is_valid_fragment(text):
+            for area in areas:
+                bisect.insort(self._valid[area][tag], (seq, text))
+    
+    def _finish_text(self):
+        """El resultado ya no puede cambiar: solo quedan por buscar enlaces."""
+        self._text_done = True
+        self._open = []
+        self.done = len(self.links) >= self.max_links
+
+
+def _codec(encoding: Optional[str]) -> str:
+    """Nombre de códec válido (utf-8 si es desconocido)."""
+    try:
+        return codecs.lookup(encoding or 'utf-8').name
+    except LookupError:
+        return 'utf-8'
+
+
+def extract_links(html: str, link_class: str, limit: int = 10) -> List[str]:
+    """`href` de los enlaces con clase `link_class`, en orden de aparición."""
+    links = []
+    for anchor in _ANCHOR.finditer(html):
+        attrs = {}
+        for name, double, single, bare in _ATTRIBUTE.findall(anchor.group(0)):
+            attrs[name.lower()] = html_lib.unescape(double or single or bare)
+        
+        if attrs.get('href') and link_class in attrs.get('class', '').split():
+            links.append(attrs['href'])
+            if len(links) >= limit:
+                break
+    return links
+
+
+def strip_tags(text: str) -> str:
+    """Elimina las etiquetas HTML de un texto corto (p. ej. un snippet)."""
+    return _TAG.sub('', text)
+
+
+def extract_with_regex(html: str, max_fragments: int = 20) -> List[str]:
+    """Extracción por expresiones regulares en una sola pasada.
+    
+    Equivale a aplicar cada patrón de `HTML_PATTERNS` por separado (mismo
+    orden de resultados: todos los del primer patrón, luego el segundo...),
+    pero localiza las aperturas con una única alternancia compilada y limpia
+    etiquetas y espacios de cada coincidencia con una sola sustitución.
+    """
+    buckets: List[List[str]] = [[] for _ in _PATTERN_PARTS]
+    resume = [0] * len(_PATTERN_PARTS)
+    end = len(html)
+    
+    for match in _OPENING.finditer(html):
+        index = int(match.lastgroup[1:])
+        if match.start() < resume[index]:
+            continue  # Dentro de una coincidencia previa del mismo patrón
+        
+        closing = _CLOSING[index].search(html, match.end())
+        if closing is None:
+            resume[index] = end
+            continue
+        
+        resume[index] = closing.end()
+        text = _TAGS_AND_SPACE.sub(' ', html[match.end():closing.start()]).strip()
+        if is_valid_fragment(text):
+            buckets[index].append(text)
+            if index == 0 and len(buckets[0]) >= max_fragments:
+                break  # El primer patrón ya llena el resultado
+    
+    return [text for bucket in buckets for text in bucket][:max_fragments]
+
+
+class ParserBackend:
+    """Backend de extracción sobre el documento completo.
+    
+    Las implementaciones devuelven párrafos, elementos de lista y pares
+    dt: dd (en ese orden, con los límites de `TAG_LIMITS`), priorizando el
+    contenedor principal (main/article/div con clase content|main|article).
+    Los backends con `streaming = True` ofrecen además `extractor()` para
+    procesar la respuesta por trozos mientras se descarga.
+    """
+    
+    name = 'base'
+    streaming = False
+    
+    def extract(self, html: str, max_fragments: int = 25) -> List[str]:
+        raise NotImplementedError
+    
+    def extractor(self, max_fragments: int = 25, max_bytes: int = PAGE_MAX_BYTES,
+                  encoding: Optional[str] = None, link_class: Optional[str] = None,
+                  max_links: int = 10) -> StreamingExtractor:
+        raise NotImplementedError
+
+
+class _Collector:
+    """Acumula candidatos por etiqueta durante un único recorrido del árbol."""
+    
+    def __init__(self):
+        self.by_tag: Dict[str, List[str]] = {tag: [] for tag in TAG_LIMITS}
+    
+    def add(self, tag: str, text: str):
+        bucket = self.by_tag[tag]
+        if len(bucket) < TAG_LIMITS[tag]:
+            bucket.append(text)
+    
+    def fragments(self, max_fragments: int) -> List[str]:
+        candidates = self.by_tag['p'] + self.by_tag['li'] + self.by_tag['dt']
+        return filter_valid_fragments(candidates, limit=max_fragments)
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class SelectolaxBackend(ParserBackend):
+    """Backend sobre selectolax (lexbor o, en versiones antiguas, modest)."""
+    
+    name = 'selectolax'
+    
+    def extract(self, html: str, max_fragments: int = 25) -> List[str]:
+        tree = SelectolaxParser(html)
+        tree.strip_tags(list(SKIP_TAGS))
+        
+        search_area = tree.root
+        for node in tree.css('main, article, div'):
+            if _MAIN_CLASS.search(node.attributes.get('class') or ''):
+                search_area = node
+                break
+        if search_area is None:
+            return []
+        
+        collector = _Collector()
+        for node in search_area.css('p, li, dt'):
+            if node.tag == 'dt':
+                dd = node.next
+                while dd is not None and dd.tag != 'dd':
+                    dd = dd.next
+                if dd is not None:
+                    collector.add('dt', f"{_normalize(node.text(separator=' '))}: {_normalize(dd.text(separator=' '))}")
+            else:
+                collector.add(node.tag, _normalize(node.text(separator=' ')))
+        
+        return collector.fragments(max_fragments)
+
+
+class LxmlBackend(ParserBackend):
+    """Backend sobre lxml.html (libxml2, en C)."""
+    
+    name = 'lxml'
+    
+    def extract(self, html: str, max_fragments: int = 25) -> List[str]:
+        root = lxml.html.document_fromstring(html)
+        for element in list(root.iter(*SKIP_TAGS)):
+            # drop_tree pega la cola al texto anterior: se separa como en bs4
+            if element.tail:
+                element.tail = ' ' + element.tail
+            element.drop_tree()
+        
+        search_area = root
+        for element in root.iter('main', 'article', 'div'):
+            if _MAIN_CLASS.search(element.get('class') or ''):
+                search_area = element
+                break
+        
+        collector = _Collector()
+        for element in search_area.iter('p', 'li', 'dt'):
+            if element.tag == 'dt':
+                dd = element.getnext()
+                while dd is not None and dd.tag != 'dd':
+                    dd = dd.getnext()
+                if dd is not None:
+                    collector.add('dt', f"{_normalize(' '.join(element.itertext()))}: "
+                                        f"{_normalize(' '.join(dd.itertext()))}")
+            else:
+                collector.add(element.tag, _normalize(' '.join(element.itertext())))
+        
+        return collector.fragments(max_fragments)
+
+
+class Bs4Backend(ParserBackend):
+    """Backend sobre BeautifulSoup con `html.parser` (Python puro)."""
+    
+    name = 'bs4'
+    
+    def extract(self, html: str, max_fragments: int = 25) -> List[str]:
+        soup = BeautifulSoup(clean_html(html), 'html.parser')
+        
+        # Limpiar elementos no deseados
+        for tag in soup(list(SKIP_TAGS)):
+            tag.decompose()
+        
+        # Priorizar contenido principal
+        main_content = soup.find(['main', 'article', 'div'], class_=_MAIN_CLASS)
+        search_area = main_content if main_content else soup
+        
+        collector = _Collector()
+        for element in search_area.find_all(['p', 'li', 'dt']):
+            if element.name == 'dt':
+                dd = element.find_next_sibling('dd')
+                if dd:
+                    collector.add('dt', f"{_normalize(element.get_text(' '))}: "
+                                        f"{_normalize(dd.get_text(' '))}")
+            else:
+                collector.add(element.name, _normalize(element.get_text(' ')))
+        
+        return collector.fragments(max_fragments)
+
+
+class HTMLParserBackend(ParserBackend):
+    """Backend de la biblioteca estándar (sin dependencias), incremental."""
+    
+    name = 'htmlparser'
+    streaming = True
+    
+    def extractor(self, max_fragments=25, max_bytes=PAGE_MAX_BYTES, encoding=None,
+                  link_class=None, max_links=10):
+        return StreamingExtractor(max_fragments, max_bytes, encoding, link_class, max_links)
+    
+    def extract(self, html: str, max_fragments: int = 25) -> List[str]:
+        extractor = StreamingExtractor(max_fragments, max_bytes=float('inf'))
+        extractor.feed(html)
+        return extractor.finish()
+
+
+class RegexBackend(ParserBackend):
+    """Backend de último recurso basado en `HTML_PATTERNS`."""
+    
+    name = 'regex'
+    
+    def extract(self, html: str, max_fragments: int = 20) -> List[str]:
+        return extract_with_regex(clean_html(html), max_fragments)
+
+
+# Por orden de preferencia para 'auto': los de árbol en C, luego el
+# incremental (más rápido que bs4 y el único que corta la descarga) y bs4
+PARSER_BACKENDS = {
+    'selectolax': (SelectolaxBackend, _HAS_SELECTOLAX),
+    'lxml': (LxmlBackend, _HAS_LXML),
+    'htmlparser': (HTMLParserBackend, True),
+    'bs4': (Bs4Backend, _HAS_BS4),
+    'regex': (RegexBackend, True)
+}
+
+
+def available_backends() -> List[str]:
+    """Backends instalados, en orden de preferencia para 'auto'."""
+    return [name for name, (_, installed) in PARSER_BACKENDS.items() if installed]
+
+
+def get_parser_backend(name: str = HTML_PARSER_BACKEND) -> ParserBackend:
+    """Instancia el backend pedido o, con 'auto', el preferido instalado."""
+    if name != 'auto':
+        backend_cls, installed = PARSER_BACKENDS[name]
+        if installed:
+            return backend_cls()
+    
+    return PARSER_BACKENDS[available_backends()[0]][0]()
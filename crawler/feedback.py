@@ -1,30 +1,230 @@
-"""Módulo simple para almacenar feedback del usuario y permitir re-entrenar.
-Guarda feedback en `crawler/data/feedback.json`.
+"""Almacén de feedback del usuario para permitir re-entrenar.
+
+El feedback se guarda como JSONL de solo anexado en `crawler/data/feedback.jsonl`:
+cada entrada es una línea escrita con un único `write` sobre un descriptor
+O_APPEND, así que añadir cuesta O(1) y varios escritores (hilos o procesos)
+no se pisan. Los `fsync` se agrupan por número de entradas o por tiempo.
 """
+import atexit
 import json
 import os
-from typing import Dict, Any
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterator, Optional, Tuple
 
-FEEDBACK_PATH = os.path.join(os.path.dirname(__file__), 'data', 'feedback.json')
+from config import (
+    FEEDBACK_FILE, LEGACY_FEEDBACK_FILE, FEEDBACK_FSYNC_EVERY,
+    FEEDBACK_FSYNC_INTERVAL
+)
 
-def add_feedback(prompt: str, response: Dict[str, Any], useful: bool) -> None:
-    os.makedirs(os.path.dirname(FEEDBACK_PATH), exist_ok=True)
-    entry = {'prompt': prompt, 'response': response, 'useful': bool(useful)}
-    try:
-        if os.path.exists(FEEDBACK_PATH):
-            with open(FEEDBACK_PATH, 'r', encoding='utf-8') as f:
+FEEDBACK_PATH = str(FEEDBACK_FILE)
+
+
+def make_entry(prompt: str, response: Dict[str, Any], useful: bool) -> Dict[str, Any]:
+    """Construye una entrada de feedback con marca de tiempo."""
+    return {
+        'prompt': prompt,
+        'response': response,
+        'useful': bool(useful),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+class FeedbackStore:
+    """Registro de feedback en JSONL con anexado O(1) y fsync por lotes."""
+
+    def __init__(self, path: Path = FEEDBACK_FILE,
+                 legacy_path: Optional[Path] = LEGACY_FEEDBACK_FILE,
+                 fsync_every: int = FEEDBACK_FSYNC_EVERY,
+                 fsync_interval: float = FEEDBACK_FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.migrate_legacy()
+        atexit.register(self.close)
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    @staticmethod
+    def _encode(entry: Dict[str, Any]) -> bytes:
+        return (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _write(self, data: bytes, count: int) -> int:
+        """Escribe `data` al final y devuelve el offset en que termina."""
+        with self._lock:
+            fd = self._open()
+            # Una sola llamada write por lote: O_APPEND la hace atómica
+            # frente a otros escritores del mismo fichero.
+            os.write(fd, data)
+            self._pending += count
+            now = time.monotonic()
+            if (self._pending >= self.fsync_every
+                    or now - self._last_sync >= self.fsync_interval):
+                os.fsync(fd)
+                self._pending = 0
+                self._last_sync = now
+            return os.lseek(fd, 0, os.SEEK_CUR)
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        """Añade una entrada al final del registro; devuelve su offset final."""
+        return self._write(self._encode(entry), 1)
+
+    def add(self, prompt: str, response: Dict[str, Any], useful: bool) -> Dict[str, Any]:
+        """Crea y guarda una entrada; devuelve la entrada guardada."""
+        entry = make_entry(prompt, response, useful)
+        self.append(entry)
+        return entry
+
+    def flush(self) -> None:
+        """Fuerza el fsync de las entradas pendientes."""
+        with self._lock:
+            if self._fd is not None and self._pending:
+                os.fsync(self._fd)
+                self._pending = 0
+                self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_entries()
+
+    def iter_entries(self) -> Iterator[Dict[str, Any]]:
+        """Recorre el registro línea a línea sin cargarlo entero.
+
+        Las líneas corruptas (p. ej. una escritura truncada) se ignoran.
+        """
+        try:
+            f = open(self.path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+
+    def size(self) -> int:
+        """Tamaño actual del registro en bytes."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def scan(self, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Recorre las entradas desde `offset` devolviendo (entrada, offset_final).
+
+        Se detiene antes de una última línea incompleta para que el offset
+        devuelto siempre quede alineado al inicio de una línea.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry, offset
+
+    def is_line_start(self, offset: int) -> bool:
+        """Indica si `offset` cae al inicio de una línea del registro."""
+        if offset == 0:
+            return True
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset - 1)
+                return f.read(1) == b'\n'
+        except OSError:
+            return False
+
+    def migrate_legacy(self) -> int:
+        """Migra una sola vez el antiguo `feedback.json` (array) al registro.
+
+        El fichero se reclama con un rename atómico, de modo que si varios
+        procesos arrancan a la vez solo uno lo migra. Al terminar queda como
+        `feedback.json.migrated`. Devuelve el número de entradas migradas.
+        """
+        legacy = self.legacy_path
+        if legacy is None or not legacy.exists():
+            return 0
+        claimed = legacy.with_name(legacy.name + '.migrating')
+        try:
+            os.rename(legacy, claimed)
+        except FileNotFoundError:
+            return 0
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-        else:
+        except (OSError, ValueError):
             data = []
-    except Exception:
-        data = []
-    data.append(entry)
-    with open(FEEDBACK_PATH, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def load_feedback() -> Any:
-    try:
-        with open(FEEDBACK_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+        entries = [e for e in data if isinstance(e, dict)] if isinstance(data, list) else []
+        if entries:
+            self._write(b''.join(self._encode(e) for e in entries), len(entries))
+            self.flush()
+        os.replace(claimed, legacy.with_name(legacy.name + '.migrated'))
+        return len(entries)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+_stores: Dict[Path, FeedbackStore] = {}
+
+
+def get_feedback_store(path: Optional[Path] = None) -> FeedbackStore:
+    """Devuelve el almacén compartido del proceso (uno por fichero).
+
+    Sin `path`, el registro por defecto (que migra `feedback.json`); con él,
+    un almacén por ruta que se reutiliza en las llamadas siguientes, de modo
+    que no se abre un descriptor ni se registra un `atexit` por llamada.
+    """
+    global _default_store
+    if path is None:
+        if _default_store is None:
+            with _default_lock:
+                if _default_store is None:
+                    _default_store = FeedbackStore()
+        return _default_store
+
+    key = Path(path).resolve()
+    with _default_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = FeedbackStore(key, legacy_path=None)
+    return store
+
+
+def add_feedback(prompt: str, response: Dict[str, Any], useful: bool) -> None:
+    get_feedback_store().add(prompt, response, useful)
+
+
+def load_feedback() -> Iterator[Dict[str, Any]]:
+    """Itera el feedback guardado en streaming."""
+    return get_feedback_store().iter_entries()
@@ -0,0 +1,169 @@
+"""Salud de los motores de búsqueda: circuit breaker y timeouts adaptativos."""
+import asyncio
+import contextlib
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator
+
+from config import (
+    DEFAULT_TIMEOUT, ENGINE_EWMA_ALPHA, ENGINE_FAILURE_THRESHOLD, ENGINE_ERROR_RATE_THRESHOLD,
+    ENGINE_MIN_CALLS, ENGINE_COOLDOWN_SECONDS, ENGINE_LATENCY_WINDOW,
+    ENGINE_TIMEOUT_P95_FACTOR, ENGINE_TIMEOUT_MIN
+)
+
+
+class EngineUnavailable(Exception):
+    """El motor respondió, pero con un estado que cuenta como fallo (429, 5xx...)."""
+
+
+class EngineSkipped(EngineUnavailable):
+    """El motor no se ha llamado (circuito abierto o plazo de la búsqueda vencido)."""
+
+
+def check_engine_response(response):
+    """Lanza `EngineUnavailable` si la respuesta del motor no es un 200."""
+    if response.status_code != 200:
+        raise EngineUnavailable(f"HTTP {response.status_code}")
+
+
+class TrackedCall:
+    """Llamada en curso medida por `EngineHealth.track`."""
+    
+    __slots__ = ('counted',)
+    
+    def __init__(self):
+        self.counted = True
+    
+    def ignore(self):
+        """No cuenta la llamada (p. ej. servida desde la caché HTTP)."""
+        self.counted = False
+
+
+class EngineHealth:
+    """Estado de salud de un motor.
+    
+    Mantiene la latencia media (EWMA), la tasa de error (EWMA) y las
+    latencias recientes para el p95. El circuito se abre tras
+    `ENGINE_FAILURE_THRESHOLD` fallos seguidos o si la tasa de error supera
+    `ENGINE_ERROR_RATE_THRESHOLD`; mientras está abierto el motor se salta.
+    Pasado el enfriamiento se deja pasar una única llamada de prueba
+    (semiabierto): si va bien se cierra y si falla vuelve a abrirse.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str, cooldown: float = ENGINE_COOLDOWN_SECONDS):
+        self.name = name
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.stats = {'calls': 0, 'failures': 0, 'skipped': 0, 'opened': 0}
+        self._latencies = deque(maxlen=ENGINE_LATENCY_WINDOW)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """Indica si se puede llamar al motor ahora."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            
+            self.stats['skipped'] += 1
+            return False
+    
+    def timeout(self, default: float = DEFAULT_TIMEOUT) -> float:
+        """Timeout según el p95 reciente (el valor por defecto sin historial)."""
+        with self._lock:
+            if len(self._latencies) < ENGINE_MIN_CALLS:
+                return default
+            ordered = sorted(self._latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return min(default, max(ENGINE_TIMEOUT_MIN, p95 * ENGINE_TIMEOUT_P95_FACTOR))
+    
+    @contextlib.contextmanager
+    def track(self) -> Iterator[TrackedCall]:
+        """Mide una llamada: éxito si el bloque termina, fallo si lanza.
+        
+        No cuentan una cancelación (el llamador ya no necesita el resultado)
+        ni las llamadas marcadas con `ignore()`, como los aciertos de la
+        caché HTTP, que no dicen nada de la latencia del motor.
+        """
+        call = TrackedCall()
+        start = time.monotonic()
+        try:
+            yield call
+        except asyncio.CancelledError:
+            self._release_probe()
+            raise
+        except BaseException:
+            if call.counted:
+                self.record_failure(time.monotonic() - start)
+            else:
+                self._release_probe()
+            raise
+        if call.counted:
+            self.record_success(time.monotonic() - start)
+        else:
+            self._release_probe()
+    
+    def _release_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def _observe(self, latency: float, failed: bool):
+        alpha = ENGINE_EWMA_ALPHA
+        self.stats['calls'] += 1
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            alpha * latency + (1 - alpha) * self.latency_ewma
+        )
+        self.error_rate = alpha * failed + (1 - alpha) * self.error_rate
+        self._probe_in_flight = False
+    
+    def record_success(self, latency: float):
+        with self._lock:
+            self._observe(latency, False)
+            self._latencies.append(latency)
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self.error_rate = 0.0
+    
+    def record_failure(self, latency: float):
+        with self._lock:
+            self._observe(latency, True)
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= ENGINE_FAILURE_THRESHOLD or (
+                self.stats['calls'] >= ENGINE_MIN_CALLS
+                and self.error_rate >= ENGINE_ERROR_RATE_THRESHOLD
+            ):
+                if self.state != self.OPEN:
+                    self.stats['opened'] += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado serializable para /api/stats."""
+        timeout = self.timeout()
+        with self._lock:
+            return {
+                'state': self.state,
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'error_rate': round(self.error_rate, 3),
+                'consecutive_failures': self.consecutive_failures,
+                'timeout': round(timeout, 2),
+                **self.stats
+            }
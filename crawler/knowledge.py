@@ -0,0 +1,391 @@
+"""Índice en memoria de la base de conocimiento (estática + aprendida)."""
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple, Optional
+
+from config import (
+    KNOWLEDGE_BASE, LEARNED_KNOWLEDGE_FILE, LEARNED_MAX_TOPICS,
+    LEARNED_MAX_FACTS_PER_TOPIC, LEARNED_HALF_LIFE_DAYS, LEARNED_MIN_SCORE,
+    LEARNED_POSITIVE_WEIGHT, LEARNED_NEGATIVE_WEIGHT
+)
+
+
+_TOKEN = re.compile(r"[\wáéíóúñü]+")
+_SENTENCE_SPLIT = re.compile(r'[.!?]\s+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeniza texto en minúsculas."""
+    return _TOKEN.findall(text.lower())
+
+
+def feedback_facts(response: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Pares (tema, oración) que aporta una respuesta valorada.
+    
+    Hasta 3 oraciones de más de 30 caracteres bajo cada una de las 3
+    primeras keywords.
+    """
+    keywords = response.get('keywords', [])
+    sentences = _SENTENCE_SPLIT.split(response.get('response_text', ''))
+    valid_sentences = [s.strip() for s in sentences if len(s.strip()) > 30]
+    return [(keyword.lower(), sentence)
+            for keyword in keywords[:3] for sentence in valid_sentences[:3]]
+
+
+def feedback_delta(entry: Dict[str, Any]) -> float:
+    """Ajuste de puntuación de una entrada de feedback (útil o no)."""
+    return LEARNED_POSITIVE_WEIGHT if entry.get('useful') else -LEARNED_NEGATIVE_WEIGHT
+
+
+def apply_feedback(learned: 'LearnedKnowledge', entry: Dict[str, Any], now: float) -> bool:
+    """Refuerza o penaliza las oraciones de una entrada bajo cada keyword."""
+    delta = feedback_delta(entry)
+    changed = False
+    for topic, sentence in feedback_facts(entry.get('response') or {}):
+        changed |= learned.update(topic, sentence, delta, now)
+    return changed
+
+
+def _ngrams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class _KnowledgeSnapshot:
+    """Índices inmutables construidos a partir de una versión de la KB.
+    
+    El índice invertido token → ids de hecho (posiciones en `facts`) da las
+    frecuencias de documento. Si se pasan `stats` precalculadas (artefacto
+    de `reindex.py`) y cuadran con el número de hechos, las frecuencias se
+    toman de ahí y el índice invertido no se construye hasta que se usa.
+    """
+    
+    def __init__(self, topics: Dict[str, List[str]],
+                 stats: Optional[Dict[str, Any]] = None):
+        self.topics = topics
+        self.topic_order = {topic: i for i, topic in enumerate(topics)}
+        self.facts: List[Tuple[str, str]] = [
+            (topic, fact) for topic, facts in topics.items() for fact in facts
+        ]
+        self.total_facts = len(self.facts)
+        self.fact_set: Set[str] = {fact for _, fact in self.facts}
+        self.df: Counter = Counter()
+        self.topic_ngrams: Dict[str, Set[str]] = defaultdict(set)
+        self._postings: Optional[Dict[str, List[int]]] = None
+        self._postings_lock = threading.Lock()
+        
+        for topic in topics:
+            topic_lower = topic.lower()
+            for n in (2, 3):
+                for gram in _ngrams(topic_lower, n):
+                    self.topic_ngrams[gram].add(topic)
+        
+        if (isinstance(stats, dict) and isinstance(stats.get('df'), dict)
+                and stats.get('total_facts') == self.total_facts):
+            self.df.update(stats['df'])
+        else:
+            self.df.update({token: len(ids) for token, ids in self.postings.items()})
+    
+    @property
+    def postings(self) -> Dict[str, List[int]]:
+        """Índice invertido token → ids de hecho en orden de la KB."""
+        if self._postings is None:
+            with self._postings_lock:
+                if self._postings is None:
+                    postings = defaultdict(list)
+                    for fact_id, (_, fact) in enumerate(self.facts):
+                        for token in set(tokenize(fact)):
+                            postings[token].append(fact_id)
+                    self._postings = dict(postings)
+        return self._postings
+    
+    def facts_with_tokens(self, tokens: List[str]) -> List[Tuple[str, str]]:
+        """Pares (tema, hecho) cuyos hechos contienen todos los tokens, en orden de la KB."""
+        if not tokens:
+            return []
+        postings = sorted((self.postings.get(token, ()) for token in set(tokens)), key=len)
+        fact_ids = set(postings[0]).intersection(*postings[1:])
+        return [self.facts[i] for i in sorted(fact_ids)]
+    
+    def partial_topics(self, keyword: str) -> List[str]:
+        """Temas que contienen `keyword` como subcadena, en orden de la KB."""
+        if len(keyword) < 2:
+            candidates = self.topics.keys()
+        else:
+            n = min(len(keyword), 3)
+            grams = sorted(_ngrams(keyword, n), key=lambda g: len(self.topic_ngrams.get(g, ())))
+            candidates = set(self.topic_ngrams.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= self.topic_ngrams.get(gram, set())
+        
+        matches = [topic for topic in candidates if keyword in topic.lower()]
+        return sorted(matches, key=self.topic_order.__getitem__)
+
+
+class LearnedKnowledge:
+    """Conocimiento aprendido con puntuación de utilidad por hecho.
+    
+    Cada hecho guarda `[puntuación, última actualización]`. La puntuación
+    decae con vida media `half_life_days` y se calcula de forma perezosa.
+    El feedback positivo la sube y el negativo la baja. Hay un tope de
+    hechos por tema y de temas en total; al superarlo, o al caer por debajo
+    de `min_score`, se desaloja lo de menor valor.
+    
+    En disco se guarda como `{"__format__": 2, "meta": {...}, "topics":
+    {tema: {hecho: [puntuación, ts]}}}`. `meta.feedback_offset` indica hasta
+    dónde del registro de feedback está incorporado. Los ficheros antiguos
+    `{tema: [hechos]}` se leen con puntuación 1.
+    """
+    
+    FORMAT = 2
+    
+    def __init__(self, max_topics: int = LEARNED_MAX_TOPICS,
+                 max_facts_per_topic: int = LEARNED_MAX_FACTS_PER_TOPIC,
+                 half_life_days: float = LEARNED_HALF_LIFE_DAYS,
+                 min_score: float = LEARNED_MIN_SCORE):
+        self.max_topics = max_topics
+        self.max_facts_per_topic = max_facts_per_topic
+        self.half_life = half_life_days * 86400
+        self.min_score = min_score
+        self.topics: Dict[str, Dict[str, List[float]]] = {}
+        self.fact_count = 0
+        self.meta: Dict[str, Any] = {}
+    
+    def __len__(self) -> int:
+        return len(self.topics)
+    
+    def score(self, value: List[float], now: float) -> float:
+        """Puntuación efectiva tras aplicar el decaimiento."""
+        score, ts = value
+        if self.half_life <= 0 or now <= ts:
+            return score
+        return score * 0.5 ** ((now - ts) / self.half_life)
+    
+    def update(self, topic: str, fact: str, delta: float,
+               now: Optional[float] = None) -> bool:
+        """Ajusta la puntuación de un hecho; devuelve True si hubo cambios.
+        
+        Un `delta` negativo sobre un hecho desconocido se ignora. Si el tema
+        está lleno, el hecho nuevo solo entra desalojando a uno de menor
+        puntuación.
+        """
+        now = time.time() if now is None else now
+        facts = self.topics.get(topic)
+        
+        if facts is not None and fact in facts:
+            score = self.score(facts[fact], now) + delta
+            if score < self.min_score:
+                self._remove(topic, fact)
+            else:
+                facts[fact] = [score, now]
+            return True
+        
+        if delta < self.min_score:
+            return False
+        
+        if facts is None:
+            facts = self.topics[topic] = {}
+        elif len(facts) >= self.max_facts_per_topic:
+            worst = min(facts, key=lambda f: self.score(facts[f], now))
+            if self.score(facts[worst], now) >= delta:
+                return False
+            self._remove(topic, worst)
+            facts = self.topics.setdefault(topic, {})
+        
+        facts[fact] = [delta, now]
+        self.fact_count += 1
+        return True
+    
+    def _remove(self, topic: str, fact: str) -> None:
+        facts = self.topics[topic]
+        del facts[fact]
+        self.fact_count -= 1
+        if not facts:
+            del self.topics[topic]
+    
+    def enforce_limits(self, now: Optional[float] = None) -> int:
+        """Desaloja los temas de menor valor si se supera `max_topics`.
+        
+        Baja hasta el 90 % del tope para amortizar el recorrido. Devuelve el
+        número de temas desalojados.
+        """
+        excess = len(self.topics) - self.max_topics
+        if excess <= 0:
+            return 0
+        now = time.time() if now is None else now
+        excess += self.max_topics // 10
+        value = lambda t: max(self.score(v, now) for v in self.topics[t].values())
+        for topic in heapq.nsmallest(excess, self.topics, key=value):
+            self.fact_count -= len(self.topics.pop(topic))
+        return excess
+    
+    def prune(self, now: Optional[float] = None) -> int:
+        """Desaloja los hechos cuya puntuación decayó por debajo del mínimo."""
+        now = time.time() if now is None else now
+        removed = 0
+        for topic in list(self.topics):
+            facts = self.topics[topic]
+            for fact in [f for f, v in facts.items() if self.score(v, now) < self.min_score]:
+                self._remove(topic, fact)
+                removed += 1
+        return removed
+    
+    def to_topics(self, now: Optional[float] = None) -> Dict[str, List[str]]:
+        """Vista `{tema: [hechos]}` ordenada por puntuación descendente."""
+        now = time.time() if now is None else now
+        return {
+            topic: sorted(facts, key=lambda f: -self.score(facts[f], now))
+            for topic, facts in self.topics.items()
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            '__format__': self.FORMAT,
+            'meta': self.meta,
+            'topics': {
+                topic: {fact: [round(score, 4), int(ts)] for fact, (score, ts) in facts.items()}
+                for topic, facts in self.topics.items()
+            }
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **kwargs) -> 'LearnedKnowledge':
+        store = cls(**kwargs)
+        now = time.time()
+        if data.get('__format__') == cls.FORMAT:
+            store.meta = dict(data.get('meta') or {})
+            for topic, facts in data.get('topics', {}).items():
+                store.topics[topic] = {f: [float(s), float(ts)] for f, (s, ts) in facts.items()}
+        else:
+            # Formato antiguo: lista de hechos por tema, todos con puntuación 1
+            for topic, facts in data.items():
+                if isinstance(facts, list):
+                    store.topics[topic] = {f: [1.0, now] for f in facts[-store.max_facts_per_topic:]}
+        store.topics = {t: f for t, f in store.topics.items() if f}
+        store.fact_count = sum(len(f) for f in store.topics.values())
+        store.enforce_limits(now)
+        return store
+    
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> 'LearnedKnowledge':
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f), **kwargs)
+        except (OSError, ValueError, TypeError, AttributeError):
+            return cls(**kwargs)
+    
+    def save(self, path: Path) -> None:
+        """Escribe el almacén con un reemplazo atómico."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+class KnowledgeIndex:
+    """Base de conocimiento indexada en memoria.
+    
+    Combina `KNOWLEDGE_BASE` con el conocimiento aprendido y se recarga sola
+    cuando cambia el mtime del fichero aprendido. Mantiene un índice
+    invertido token → hechos (para buscar en el texto de los hechos y dar
+    las frecuencias de documento del ranking) y un índice de n-gramas de temas para las coincidencias
+    parciales, así que las búsquedas no recorren toda la KB.
+    """
+    
+    def __init__(self, learned_file: Path = LEARNED_KNOWLEDGE_FILE,
+                 base: Optional[Dict[str, List[str]]] = None):
+        self.learned_file = Path(learned_file)
+        self.base = KNOWLEDGE_BASE if base is None else base
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._snapshot = _KnowledgeSnapshot(dict(self.base))
+        self.refresh()
+    
+    def refresh(self) -> bool:
+        """Reconstruye los índices si el fichero aprendido ha cambiado."""
+        try:
+            mtime = os.stat(self.learned_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        
+        if mtime == self._mtime:
+            return False
+        
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            
+            learned, stats = self._load_learned() if mtime is not None else ({}, None)
+            # Las estadísticas del artefacto se calculan sobre KNOWLEDGE_BASE
+            if self.base is not KNOWLEDGE_BASE:
+                stats = None
+            self._snapshot = _KnowledgeSnapshot({**self.base, **learned}, stats)
+            self._mtime = mtime
+        return True
+    
+    def _load_learned(self) -> Tuple[Dict[str, List[str]], Optional[Dict[str, Any]]]:
+        """Carga conocimiento aprendido de feedback, mejor puntuado primero.
+        
+        Devuelve también las estadísticas de ranking si el fichero es un
+        artefacto instalado por `reindex.py`.
+        """
+        try:
+            with open(self.learned_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return LearnedKnowledge.from_dict(data).to_topics(), data.get('stats')
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}, None
+    
+    def search(self, keywords: List[str]) -> Tuple[List[str], List[str]]:
+        """Búsqueda exacta por tema, parcial sobre los nombres de tema y, si
+        ninguna encuentra nada, por token en los hechos (índice invertido)."""
+        self.refresh()
+        snapshot = self._snapshot
+        
+        fragments = []
+        sources = []
+        
+        for keyword in keywords:
+            keyword_lower = keyword.lower()
+            
+            # Búsqueda exacta
+            if keyword_lower in snapshot.topics:
+                facts = snapshot.topics[keyword_lower]
+                fragments.extend(facts)
+                sources.extend(['Base de conocimiento'] * len(facts))
+                continue
+            
+            # Búsqueda parcial
+            topics = snapshot.partial_topics(keyword_lower)
+            for topic in topics:
+                facts = snapshot.topics[topic]
+                fragments.extend(facts)
+                sources.extend([f'KB: {topic}'] * len(facts))
+            if topics:
+                continue
+            
+            # Búsqueda por token en el texto de los hechos
+            for topic, fact in snapshot.facts_with_tokens(tokenize(keyword_lower)):
+                fragments.append(fact)
+                sources.append(f'KB: {topic}')
+        
+        return fragments, sources
+    
+    def contains_fact(self, text: str) -> bool:
+        """True si `text` es exactamente uno de los hechos de la KB."""
+        return text in self._snapshot.fact_set
+    
+    def document_frequency(self, token: str) -> int:
+        """Número de hechos que contienen el token."""
+        return self._snapshot.df.get(token.lower(), 0)
+    
+    @property
+    def total_facts(self) -> int:
+        return self._snapshot.total_facts
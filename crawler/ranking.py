@@ -0,0 +1,222 @@
+"""Ranking de fragmentos: heurístico y BM25."""
+import hashlib
+import math
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import BM25_K1, BM25_B, CORPUS_MAX_DOCUMENTS, NEAR_DUPLICATE_DISTANCE
+from knowledge import KnowledgeIndex, tokenize
+from utils import fold_text
+
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except ImportError:
+    np = None
+    _HAS_NUMPY = False
+
+
+class CorpusStats:
+    """Frecuencias de documento de la KB y del corpus de fragmentos cacheados.
+    
+    Las de la KB se leen del Counter de frecuencias de `KnowledgeIndex`
+    (derivado de su índice invertido o del artefacto de `reindex.py`); las
+    de los fragmentos se acumulan incrementalmente (cada fragmento cuenta
+    una vez, y los que son hechos de la KB no se vuelven a contar).
+    """
+    
+    def __init__(self, knowledge: Optional[KnowledgeIndex] = None,
+                 max_documents: int = CORPUS_MAX_DOCUMENTS):
+        self.knowledge = knowledge
+        self.max_documents = max_documents
+        self.fragment_df: Counter = Counter()
+        self.fragment_docs = 0
+        self._seen = set()
+        self._lock = threading.Lock()
+    
+    def add_documents(self, documents: Iterable[str]):
+        """Añade fragmentos nuevos al corpus."""
+        with self._lock:
+            for doc in documents:
+                if self.fragment_docs >= self.max_documents:
+                    return
+                
+                digest = hashlib.blake2b(doc.encode('utf-8'), digest_size=8).digest()
+                if digest in self._seen or (self.knowledge and self.knowledge.contains_fact(doc)):
+                    continue
+                
+                self._seen.add(digest)
+                self.fragment_docs += 1
+                self.fragment_df.update(set(tokenize(doc)))
+    
+    @property
+    def total_documents(self) -> int:
+        kb_docs = self.knowledge.total_facts if self.knowledge else 0
+        return kb_docs + self.fragment_docs
+    
+    def document_frequency(self, token: str) -> int:
+        kb_df = self.knowledge.document_frequency(token) if self.knowledge else 0
+        return kb_df + self.fragment_df.get(token, 0)
+    
+    def idf(self, token: str) -> float:
+        """IDF de BM25 (siempre no negativo)."""
+        n = self.total_documents
+        df = self.document_frequency(token)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+
+class HeuristicRanker:
+    """Puntuación original: keywords presentes, dígitos y longitud."""
+    
+    def score(self, fragments: List[str], keywords: List[str]) -> List[float]:
+        keywords_lower = [kw.lower() for kw in keywords]
+        return [self._relevance(fragment, keywords_lower) for fragment in fragments]
+    
+    def _relevance(self, text: str, keywords: List[str]) -> float:
+        score = 0
+        text_lower = text.lower()
+        
+        for kw in keywords:
+            if kw in text_lower:
+                score += 3
+        
+        score += sum(1 for ch in text if ch.isdigit()) * 0.1
+        
+        if 100 < len(text) < 500:
+            score += 2
+        
+        return score
+
+
+class BM25Ranker:
+    """BM25 sobre los fragmentos candidatos.
+    
+    Los IDF salen de las estadísticas globales del corpus, al que los
+    candidatos se añaden antes de puntuar (`CorpusStats.add_documents`), así
+    que cada uno cuenta una sola vez en N y en df. La puntuación se calcula
+    de una vez para todos los candidatos sobre una matriz documentos ×
+    términos (NumPy si está instalado).
+    """
+    
+    def __init__(self, corpus: Optional[CorpusStats] = None,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.corpus = corpus or CorpusStats()
+        self.k1 = k1
+        self.b = b
+    
+    def score(self, fragments: List[str], keywords: List[str]) -> List[float]:
+        terms = list(dict.fromkeys(t for kw in keywords for t in tokenize(kw)))
+        if not fragments or not terms:
+            return [0.0] * len(fragments)
+        
+        term_index = {term: j for j, term in enumerate(terms)}
+        doc_tokens = [tokenize(fragment) for fragment in fragments]
+        lengths = [len(tokens) for tokens in doc_tokens]
+        avgdl = (sum(lengths) / len(lengths)) or 1.0
+        
+        # Frecuencias de término (solo términos de la consulta)
+        tf_rows = []
+        for tokens in doc_tokens:
+            row = [0] * len(terms)
+            for token in tokens:
+                j = term_index.get(token)
+                if j is not None:
+                    row[j] += 1
+            tf_rows.append(row)
+        
+        idf = [self.corpus.idf(term) for term in terms]
+        
+        if _HAS_NUMPY:
+            tf = np.asarray(tf_rows, dtype=np.float64)
+            norm = self.k1 * (1 - self.b + self.b * np.asarray(lengths, dtype=np.float64) / avgdl)
+            scores = (tf * (self.k1 + 1) / (tf + norm[:, None])) @ np.asarray(idf)
+            return scores.tolist()
+        
+        scores = []
+        for row, length in zip(tf_rows, lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / avgdl)
+            scores.append(sum(
+                (idf[j] * count * (self.k1 + 1) / (count + norm)
+                 for j, count in enumerate(row) if count),
+                0.0
+            ))
+        return scores
+
+
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64) if _HAS_NUMPY else None
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """SimHash de 64 bits sobre shingles de palabras del texto normalizado."""
+    tokens = fold_text(text).split()
+    if len(tokens) > shingle_size:
+        shingles = [' '.join(tokens[i:i + shingle_size])
+                    for i in range(len(tokens) - shingle_size + 1)]
+    else:
+        shingles = [' '.join(tokens)]
+    
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'big')
+        for s in shingles
+    ]
+    half = len(hashes) / 2
+    
+    if _HAS_NUMPY:
+        values = np.asarray(hashes, dtype=np.uint64)
+        counts = ((values[:, None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=0)
+        return sum(1 << int(i) for i in np.flatnonzero(counts > half))
+    
+    return sum(
+        1 << i for i in range(64)
+        if sum((h >> i) & 1 for h in hashes) > half
+    )
+
+
+class NearDuplicateFilter:
+    """Elimina fragmentos casi duplicados (SimHash con índice por bandas).
+    
+    Con una distancia máxima de 3 y cuatro bandas de 16 bits, dos huellas
+    cercanas comparten al menos una banda, así que cada fragmento solo se
+    compara con los candidatos de sus bandas: el coste es lineal.
+    """
+    
+    def __init__(self, max_distance: int = NEAR_DUPLICATE_DISTANCE):
+        self.max_distance = min(max_distance, 3)
+        self.stats = {'fragments': 0, 'near_duplicates_dropped': 0}
+    
+    def filter(self, fragments: List[str]) -> Tuple[List[str], int]:
+        """Conserva el primer representante de cada grupo; devuelve (kept, dropped)."""
+        if self.max_distance < 0:
+            return fragments, 0
+        
+        kept = []
+        bands: List[Dict[int, List[int]]] = [{} for _ in range(4)]
+        
+        for fragment in fragments:
+            fingerprint = simhash(fragment)
+            keys = [(fingerprint >> (16 * i)) & 0xFFFF for i in range(4)]
+            
+            duplicate = any(
+                bin(fingerprint ^ other).count('1') <= self.max_distance
+                for i, key in enumerate(keys)
+                for other in bands[i].get(key, ())
+            )
+            if duplicate:
+                continue
+            
+            kept.append(fragment)
+            for i, key in enumerate(keys):
+                bands[i].setdefault(key, []).append(fingerprint)
+        
+        dropped = len(fragments) - len(kept)
+        self.stats['fragments'] += len(fragments)
+        self.stats['near_duplicates_dropped'] += dropped
+        return kept, dropped
+
+
+def create_ranker(name: str, corpus: Optional[CorpusStats] = None):
+    """Crea el ranker configurado ('bm25' o 'heuristic')."""
+    if name == 'heuristic':
+        return HeuristicRanker()
+    return BM25Ranker(corpus)
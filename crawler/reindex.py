@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Re-indexado offline del conocimiento aprendido a partir del feedback.
+
+Recorre en streaming todo el registro de feedback. A partir de él
+reconstruye desde cero el conocimiento aprendido, con puntuación por
+hecho, y las estadísticas de ranking (frecuencias de documento). El
+resultado es un artefacto versionado en `data/index/`.
+
+Las entradas se reaplican en orden del registro con la misma
+`LearnedKnowledge.update` que el aprendizaje en línea (con la hora de cada
+entrada), así que el resultado coincide con el estado en línea: el
+feedback negativo sobre hechos desconocidos se ignora, los hechos que
+bajan de `min_score` se desalojan y el tope por tema se aplica en orden.
+Cada proceso lee del fichero su propio tramo de bytes del registro,
+decodifica las líneas y extrae los hechos; aquí solo se reparten los
+tramos (alineados a inicio de línea) y se reaplica el resultado en orden.
+La única diferencia con el aprendizaje en línea es que el tope global de
+temas se aplica tras cada tramo y no tras cada lote del worker en línea.
+
+Instalar el artefacto reemplaza de forma atómica `learned_knowledge.json`.
+El crawler en marcha lo adopta sin reiniciar: `KnowledgeIndex` vigila el
+fichero y toma de él las frecuencias de documento que usa `CorpusStats`
+para el ranking. `LearningSystem` también lo vigila y reaplica el
+feedback posterior a `meta.feedback_offset`.
+
+Uso:
+    python reindex.py [--workers N] [--chunk-bytes N] [--chunk-size N] [--no-install]
+    python reindex.py --list
+    python reindex.py --activate VERSION
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    INDEX_DIR, LEARNED_KNOWLEDGE_FILE, KNOWLEDGE_BASE, REINDEX_CHUNK_BYTES,
+    REINDEX_CHUNK_SIZE, REINDEX_KEEP_VERSIONS
+)
+from feedback import FeedbackStore
+from knowledge import LearnedKnowledge, feedback_delta, feedback_facts, tokenize
+
+
+_ARTIFACT = re.compile(r'^learned-v(\d+)\.json$')
+
+
+def _entry_time(entry: Dict[str, Any], default: float) -> float:
+    try:
+        return datetime.fromisoformat(entry['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def _prepare_range(args: Tuple[str, int, int, float]
+                   ) -> List[Tuple[float, float, List[Tuple[str, str]]]]:
+    """(hora, delta, hechos) de cada entrada del tramo [start, stop) del registro.
+    
+    Como `FeedbackStore.scan`, descarta las líneas inválidas y una última
+    línea incompleta.
+    """
+    path, start, stop, now = args
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(stop - start).split(b'\n')
+    
+    prepared = []
+    for line in lines[:-1]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict):
+            prepared.append((_entry_time(entry, now), feedback_delta(entry),
+                             feedback_facts(entry.get('response') or {})))
+    return prepared
+
+
+def _count_tokens(facts: List[str]) -> Counter:
+    """Frecuencia de documento de un bloque de hechos."""
+    df = Counter()
+    for fact in facts:
+        df.update(set(tokenize(fact)))
+    return df
+
+
+def iter_ranges(store: FeedbackStore, end: int, size: int) -> Iterator[Tuple[int, int]]:
+    """Tramos [inicio, fin) de unos `size` bytes del registro hasta el offset `end`.
+    
+    Cada corte se lleva al inicio de la línea siguiente sin decodificar nada.
+    """
+    try:
+        f = open(store.path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        start = 0
+        while start < end:
+            f.seek(min(start + max(size, 1), end) - 1)
+            f.readline()
+            stop = min(f.tell(), end)
+            yield start, stop
+            start = stop
+
+
+def build_knowledge(pool, store: FeedbackStore, end: int, workers: int,
+                    chunk_bytes: int, now: float) -> Tuple[LearnedKnowledge, int]:
+    """Reconstruye el conocimiento aprendido; devuelve (almacén, entradas leídas).
+    
+    Los procesos leen, decodifican y preparan los tramos del registro en
+    paralelo y aquí solo se reaplican en orden con `LearnedKnowledge.update`,
+    como el aprendizaje en línea.
+    """
+    learned = LearnedKnowledge()
+    entries = 0
+    path = str(store.path)
+    
+    def replay(prepared):
+        nonlocal entries
+        entries += len(prepared)
+        for ts, delta, facts in prepared:
+            for topic, fact in facts:
+                learned.update(topic, fact, delta, ts)
+        learned.enforce_limits(now)
+    
+    # Como mucho 2 tramos en vuelo por proceso: la memoria no crece con el historial
+    pending = deque()
+    for start, stop in iter_ranges(store, end, chunk_bytes):
+        pending.append(pool.apply_async(_prepare_range, ((path, start, stop, now),)))
+        if len(pending) >= workers * 2:
+            replay(pending.popleft().get())
+    while pending:
+        replay(pending.popleft().get())
+    
+    return learned, entries
+
+
+def build_stats(pool, learned: LearnedKnowledge, chunk_size: int) -> Dict[str, Any]:
+    """Frecuencias de documento sobre la KB combinada (estática + aprendida)."""
+    topics = {**KNOWLEDGE_BASE, **learned.to_topics()}
+    facts = [fact for topic_facts in topics.values() for fact in topic_facts]
+    chunks = [facts[i:i + chunk_size] for i in range(0, len(facts), chunk_size)]
+    df = Counter()
+    for partial in pool.imap_unordered(_count_tokens, chunks):
+        df.update(partial)
+    return {'total_facts': len(facts), 'df': dict(df.most_common())}
+
+
+def list_versions(index_dir: Path = INDEX_DIR) -> List[Tuple[int, Path]]:
+    """Artefactos existentes ordenados por versión."""
+    if not index_dir.is_dir():
+        return []
+    versions = []
+    for path in index_dir.iterdir():
+        match = _ARTIFACT.match(path.name)
+        if match:
+            versions.append((int(match.group(1)), path))
+    return sorted(versions)
+
+
+def _write_atomic(path: Path, data: Dict[str, Any]) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def write_artifact(learned: LearnedKnowledge, stats: Dict[str, Any],
+                   index_dir: Path = INDEX_DIR) -> Path:
+    """Escribe el artefacto con la siguiente versión y poda los antiguos."""
+    index_dir.mkdir(parents=True, exist_ok=True)
+    existing = list_versions(index_dir)
+    version = existing[-1][0] + 1 if existing else 1
+    learned.meta['version'] = version
+    path = index_dir / f"learned-v{version:06d}.json"
+    _write_atomic(path, dict(learned.to_dict(), stats=stats))
+    
+    for _, old in existing[:max(0, len(existing) + 1 - REINDEX_KEEP_VERSIONS)]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def install(artifact: Path, target: Path = LEARNED_KNOWLEDGE_FILE) -> None:
+    """Sustituye de forma atómica el conocimiento aprendido por el artefacto."""
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(artifact, tmp)
+    os.replace(tmp, target)
+
+
+def reindex(workers: Optional[int] = None, chunk_size: int = REINDEX_CHUNK_SIZE,
+            do_install: bool = True, chunk_bytes: int = REINDEX_CHUNK_BYTES) -> Path:
+    workers = workers or os.cpu_count() or 1
+    store = FeedbackStore()
+    end = store.size()
+    now = time.time()
+    start = time.perf_counter()
+    
+    with multiprocessing.Pool(workers) as pool:
+        learned, entries = build_knowledge(pool, store, end, workers, chunk_bytes, now)
+        stats = build_stats(pool, learned, chunk_size)
+    
+    learned.meta.update({
+        'built_at': datetime.fromtimestamp(now).isoformat(),
+        'feedback_offset': end,
+        'feedback_entries': entries,
+    })
+    path = write_artifact(learned, stats)
+    elapsed = time.perf_counter() - start
+    
+    print(f"✓ {entries} entradas de feedback procesadas con {workers} procesos en {elapsed:.2f}s")
+    print(f"  • Temas: {len(learned)}  • Hechos: {learned.fact_count}  • Tokens: {len(stats['df'])}")
+    print(f"  • Artefacto: {path}")
+    
+    if do_install:
+        install(path)
+        print(f"  • Instalado en {LEARNED_KNOWLEDGE_FILE}")
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--workers', type=int, default=None,
+                        help='procesos (por defecto, núcleos disponibles)')
+    parser.add_argument('--chunk-bytes', type=int, default=REINDEX_CHUNK_BYTES,
+                        help='bytes del registro de feedback por tarea')
+    parser.add_argument('--chunk-size', type=int, default=REINDEX_CHUNK_SIZE,
+                        help='hechos por tarea al calcular las estadísticas')
+    parser.add_argument('--no-install', action='store_true',
+                        help='solo escribe el artefacto, sin instalarlo')
+    parser.add_argument('--list', action='store_true', help='lista los artefactos')
+    parser.add_argument('--activate', type=int, metavar='VERSION',
+                        help='instala un artefacto existente')
+    args = parser.parse_args(argv)
+    
+    if args.list:
+        for version, path in list_versions():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f).get('meta', {})
+            except (OSError, ValueError):
+                meta = {}
+            print(f"v{version}: {meta.get('built_at', '?')}  "
+                  f"{meta.get('feedback_entries', '?')} entradas  {path.name}")
+        return 0
+    
+    if args.activate is not None:
+        versions = dict(list_versions())
+        if args.activate not in versions:
+            print(f"✗ No existe la versión {args.activate}", file=sys.stderr)
+            return 1
+        install(versions[args.activate])
+        print(f"✓ Versión {args.activate} instalada en {LEARNED_KNOWLEDGE_FILE}")
+        return 0
+    
+    reindex(args.workers, args.chunk_size, not args.no_install, args.chunk_bytes)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
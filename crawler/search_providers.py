@@ -0,0 +1,213 @@
+"""Registro de proveedores de búsqueda configurado desde `SEARCH_ENGINES`."""
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from config import (
+    SEARCH_ENGINES, INTENT_ROUTING, SEARCH_MAX_PROVIDERS, PROVIDER_MIN_SAMPLES,
+    PROVIDER_MIN_CONTRIBUTION, PROVIDER_PROBE_EVERY, PROVIDER_STATS_WINDOW, DEFAULT_TIMEOUT
+)
+
+# Intención de TextProcessor cuando no se reconoce ninguna
+DEFAULT_INTENT = 'consulta_general'
+
+
+class SearchProvider:
+    """Proveedor de búsqueda web.
+    
+    Cada entrada de `SEARCH_ENGINES` crea una instancia del tipo indicado en
+    `provider` (o el del propio nombre). Las subclases implementan `search` y
+    `asearch` sobre el transporte, la salud y la extracción del fetcher; si
+    el motor se salta (circuito abierto) o falla, lanzan una excepción en
+    vez de devolver una lista vacía.
+    
+    - `weight`: preferencia base del proveedor.
+    - `cost`: coste relativo por consulta (cuotas, ancho de banda...).
+    - `latency_hint`: latencia esperada en segundos mientras no hay medidas.
+    - `capabilities`: etiquetas que usa `INTENT_ROUTING` ('web', 'news'...);
+      por defecto las del tipo (`default_capabilities`).
+    """
+    
+    default_capabilities = ['web']
+    
+    def __init__(self, name: str, url: str, weight: float = 1.0, cost: float = 1.0,
+                 latency_hint: float = DEFAULT_TIMEOUT / 2, capabilities: Optional[List[str]] = None):
+        self.name = name
+        self.url = url
+        self.weight = weight
+        self.cost = cost
+        self.latency_hint = latency_hint
+        self.capabilities = list(capabilities or self.default_capabilities)
+    
+    def search(self, fetcher, query: str, timeout: float = DEFAULT_TIMEOUT) -> Tuple[List[str], List[str]]:
+        raise NotImplementedError
+    
+    async def asearch(self, fetcher, query: str,
+                      timeout: float = DEFAULT_TIMEOUT) -> Tuple[List[str], List[str]]:
+        raise NotImplementedError
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'type': type(self).__name__,
+            'weight': self.weight,
+            'cost': self.cost,
+            'latency_hint': self.latency_hint,
+            'capabilities': self.capabilities
+        }
+
+
+PROVIDER_TYPES: Dict[str, Type[SearchProvider]] = {}
+
+
+def register_provider(kind: str):
+    """Decorador que registra un tipo de proveedor para `SEARCH_ENGINES`."""
+    def decorator(cls: Type[SearchProvider]) -> Type[SearchProvider]:
+        PROVIDER_TYPES[kind] = cls
+        return cls
+    return decorator
+
+
+@register_provider('duckduckgo')
+class DuckDuckGoProvider(SearchProvider):
+    """Resultados HTML de DuckDuckGo (y visita de los primeros enlaces)."""
+    
+    def search(self, fetcher, query, timeout=DEFAULT_TIMEOUT):
+        return fetcher._search_duckduckgo(query, timeout, engine=self.name)
+    
+    async def asearch(self, fetcher, query, timeout=DEFAULT_TIMEOUT):
+        return await fetcher._asearch_duckduckgo(query, timeout, engine=self.name)
+
+
+@register_provider('wikipedia')
+class WikipediaProvider(SearchProvider):
+    """API de búsqueda de MediaWiki."""
+    
+    default_capabilities = ['encyclopedia']
+    
+    def search(self, fetcher, query, timeout=DEFAULT_TIMEOUT):
+        return fetcher._search_wikipedia(query, timeout, engine=self.name)
+    
+    async def asearch(self, fetcher, query, timeout=DEFAULT_TIMEOUT):
+        return await fetcher._asearch_wikipedia(query, timeout, engine=self.name)
+
+
+def create_provider(name: str, spec: Any) -> SearchProvider:
+    """Instancia un proveedor a partir de su entrada de configuración.
+    
+    `spec` puede ser solo la plantilla de URL (el tipo se deduce del nombre)
+    o un diccionario con `url`, `provider` y las pistas de coste.
+    """
+    if isinstance(spec, str):
+        spec = {'url': spec}
+    
+    spec = dict(spec)
+    kind = spec.pop('provider', name)
+    if kind not in PROVIDER_TYPES:
+        raise ValueError(f"Tipo de proveedor desconocido para '{name}': {kind}")
+    return PROVIDER_TYPES[kind](name, **spec)
+
+
+class ProviderRegistry:
+    """Proveedores configurados y su elección por intención.
+    
+    La puntuación de un proveedor para una intención es
+    `weight * afinidad / cost`, donde la afinidad es el mayor multiplicador
+    de `INTENT_ROUTING[intent]` entre sus capacidades (1 por defecto), y se
+    ordena después por latencia (medida por `health` o la pista). Además se
+    lleva la cuenta de cuántas veces aporta fragmentos cada proveedor por
+    intención: si tras `PROVIDER_MIN_SAMPLES` consultas aporta en menos de
+    `PROVIDER_MIN_CONTRIBUTION` de ellas, deja de consultarse para esa
+    intención (siempre queda al menos uno). Solo cuentan las consultas en
+    que el motor respondió. Para que un proveedor descartado pueda volver,
+    cada `PROVIDER_PROBE_EVERY` consultas de la intención se añade uno de
+    prueba, y los contadores se reducen a la mitad al llegar a
+    `PROVIDER_STATS_WINDOW`.
+    """
+    
+    def __init__(self, engines: Optional[Dict[str, Any]] = None,
+                 max_providers: int = SEARCH_MAX_PROVIDERS):
+        self.providers: Dict[str, SearchProvider] = {
+            name: create_provider(name, spec) for name, spec in (engines or SEARCH_ENGINES).items()
+        }
+        self.max_providers = max_providers
+        self._contributions: Dict[Tuple[str, str], List[int]] = {}  # -> [consultas, con fragmentos]
+        self._routed: Dict[str, int] = {}  # consultas enrutadas por intención
+        self._probe_turn: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def affinity(self, provider: SearchProvider, intent: Optional[str]) -> float:
+        routing = INTENT_ROUTING.get(intent or DEFAULT_INTENT, {})
+        return max((routing.get(c, 1.0) for c in provider.capabilities), default=1.0)
+    
+    def contribution_rate(self, name: str, intent: Optional[str]) -> Optional[float]:
+        """Fracción de consultas con fragmentos (None sin muestras suficientes)."""
+        with self._lock:
+            queries, useful = self._contributions.get((name, intent or DEFAULT_INTENT), (0, 0))
+        return useful / queries if queries >= PROVIDER_MIN_SAMPLES else None
+    
+    def route(self, intent: Optional[str] = None,
+              health: Optional[Dict[str, Any]] = None) -> List[SearchProvider]:
+        """Proveedores para una intención, del más al menos adecuado."""
+        health = health or {}
+        
+        def latency(provider: SearchProvider) -> float:
+            engine = health.get(provider.name)
+            measured = engine.latency_ewma if engine is not None else None
+            return measured if measured is not None else provider.latency_hint
+        
+        candidates = []
+        for provider in self.providers.values():
+            score = provider.weight * self.affinity(provider, intent) / max(provider.cost, 1e-6)
+            if score > 0:
+                candidates.append((-score, latency(provider), provider))
+        candidates.sort(key=lambda item: (item[0], item[1]))
+        ordered = [provider for _, _, provider in candidates]
+        
+        useful = []
+        pruned = []
+        for provider in ordered:
+            rate = self.contribution_rate(provider.name, intent)
+            if rate is None or rate >= PROVIDER_MIN_CONTRIBUTION:
+                useful.append(provider)
+            else:
+                pruned.append(provider)
+        if not useful:
+            useful, pruned = ordered[:1], ordered[1:]
+        routed = useful[:self.max_providers]
+        
+        if pruned:
+            key = intent or DEFAULT_INTENT
+            with self._lock:
+                count = self._routed[key] = self._routed.get(key, 0) + 1
+                probe = None
+                if count % PROVIDER_PROBE_EVERY == 0:
+                    turn = self._probe_turn.get(key, 0)
+                    self._probe_turn[key] = turn + 1
+                    probe = pruned[turn % len(pruned)]
+            if probe is not None:
+                routed.append(probe)
+        return routed
+    
+    def record(self, name: str, intent: Optional[str], fragments: int):
+        """Anota si un proveedor aportó fragmentos a una consulta."""
+        with self._lock:
+            counts = self._contributions.setdefault((name, intent or DEFAULT_INTENT), [0, 0])
+            counts[0] += 1
+            counts[1] += fragments > 0
+            if counts[0] >= PROVIDER_STATS_WINDOW:
+                counts[0] //= 2
+                counts[1] //= 2
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Descripción de cada proveedor y su aportación por intención."""
+        with self._lock:
+            contributions = {key: list(value) for key, value in self._contributions.items()}
+        
+        stats = {}
+        for name, provider in self.providers.items():
+            stats[name] = provider.describe()
+            stats[name]['contribution'] = {
+                intent: {'queries': queries, 'useful': useful}
+                for (provider_name, intent), (queries, useful) in contributions.items()
+                if provider_name == name
+            }
+        return stats
@@ -0,0 +1,131 @@
+"""Fixtures comunes: servidor HTTP local que imita a los motores de búsqueda."""
+
+import json
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import core_enhanced  # noqa: E402
+import feedback  # noqa: E402
+from core_enhanced import EnhancedContentFetcher, EnhancedCrawler, FakeAIProvider  # noqa: E402
+from knowledge import KnowledgeIndex  # noqa: E402
+from transport import HttpTransport  # noqa: E402
+from utils import HttpCache  # noqa: E402
+
+# Términos ausentes de la base de conocimiento: todo lo encontrado viene de la red
+QUERY = 'zorblax cuántico'
+KEYWORDS = ['zorblax', 'cuántico']
+SLOW_PAGE_SECONDS = 3
+
+
+def _page(n: str) -> str:
+    return (
+        "<html><body><nav><li>Inicio del portal de zorblax y enlaces varios</li></nav>"
+        f"<main><p>El zorblax cuántico {n} es un dispositivo ficticio usado en pruebas.</p>"
+        f"<p>Segundo párrafo {n} sobre el funcionamiento interno del zorblax.</p></main>"
+        "</body></html>"
+    )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """DuckDuckGo (HTML con enlaces de resultado), páginas (`/slow/` tarda,
+    `/nostore/` no se puede guardar) y API de Wikipedia."""
+    
+    def log_message(self, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append(self.path)
+        
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        path = urllib.parse.urlparse(self.path).path
+        if path == '/ddg':
+            target = urllib.parse.quote(f"{base}/page/1")
+            body = (
+                "<html><body>"
+                "<a class='result__a' href='https://duckduckgo.com/y.js?ad=1'>anuncio</a>"
+                f"<a class='result__a' href='//duckduckgo.com/l/?uddg={target}&amp;rut=x'>r1</a>"
+                f"<a class='result__a' href='{base}/page/2'>r2</a>"
+                "<p>Resultado de DuckDuckGo: el zorblax cuántico aparece en muchas pruebas.</p>"
+                "</body></html>"
+            ).encode()
+            content_type = 'text/html; charset=utf-8'
+        elif path.startswith('/slow/'):
+            time.sleep(SLOW_PAGE_SECONDS)
+            body = _page(path.rsplit('/', 1)[-1]).encode()
+            content_type = 'text/html; charset=utf-8'
+        elif path.startswith(('/page/', '/nostore/')):
+            body = _page(path.rsplit('/', 1)[-1]).encode()
+            content_type = 'text/html; charset=utf-8'
+        elif path == '/wiki':
+            body = json.dumps({'query': {'search': [{
+                'title': 'Zorblax',
+                'snippet': 'El <span class="searchmatch">zorblax</span> es un artefacto de ficción muy citado.'
+            }]}}).encode()
+            content_type = 'application/json'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store' if path.startswith('/nostore/') else 'max-age=600')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.hits = []
+    server.lock = threading.Lock()
+    server.base = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(stub_server, tmp_path):
+    """Fetcher con los motores apuntando al servidor local y cachés en `tmp_path`."""
+    engines = {
+        'duckduckgo': {
+            'url': stub_server.base + '/ddg?q={query}', 'provider': 'duckduckgo',
+            'weight': 1.0, 'cost': 1.0, 'latency_hint': 1.0, 'capabilities': ['web']
+        },
+        'wikipedia': {
+            'url': stub_server.base + '/wiki?srsearch={query}', 'provider': 'wikipedia',
+            'weight': 1.0, 'cost': 0.5, 'latency_hint': 0.5, 'capabilities': ['encyclopedia']
+        }
+    }
+    transport = HttpTransport(cache=HttpCache(tmp_path / 'http.db'))
+    fetcher = EnhancedContentFetcher(use_cache=False, search_engines=engines, transport=transport)
+    fetcher.knowledge = KnowledgeIndex(learned_file=tmp_path / 'learned_knowledge.json')
+    yield fetcher
+    fetcher.executor.shutdown(wait=True)
+    fetcher.follow_executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def crawler(fetcher, tmp_path, monkeypatch):
+    """Crawler sobre `fetcher` con `FakeAIProvider` y el aprendizaje en `tmp_path`."""
+    monkeypatch.setattr(core_enhanced, 'LEARNED_KNOWLEDGE_FILE', tmp_path / 'learned_knowledge.json')
+    monkeypatch.setattr(core_enhanced, 'LEARNING_STATS_FILE', tmp_path / 'learning_stats.json')
+    monkeypatch.setattr(feedback, '_default_store',
+                        feedback.FeedbackStore(tmp_path / 'feedback.jsonl', legacy_path=None))
+    crawler = EnhancedCrawler(fetcher=fetcher, ai_provider=FakeAIProvider(delay=0.01))
+    yield crawler
+    crawler.learning.close()
@@ -0,0 +1,55 @@
+"""Aciertos y fallos de `utils.AnswerCache`."""
+
+import pytest
+
+from utils import AnswerCache
+
+CONTEXT = ['Python es un lenguaje de programación interpretado.']
+
+
+def _key(prompt, context=CONTEXT, model='m1', max_tokens=1000):
+    return AnswerCache.make_key(prompt, context, 'fake', model, max_tokens)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(tmp_path)
+
+
+def test_hit_for_same_question(cache):
+    cache.set(_key('¿Qué es Python?'), 'respuesta')
+    
+    assert cache.get(_key('¿Qué es Python?')) == ('respuesta', False)
+    # Mayúsculas, acentos, puntuación y espacios no cambian la pregunta
+    assert cache.get(_key('  que es PYTHON ')) == ('respuesta', False)
+    assert cache.stats == {'hits': 2, 'stale_hits': 0, 'misses': 0}
+
+
+@pytest.mark.parametrize('prompt', ['¿Por qué Python?', '¿Python qué es?', '¿Qué no es Python?'])
+def test_miss_for_other_question(cache, prompt):
+    cache.set(_key('¿Qué es Python?'), 'respuesta')
+    
+    assert cache.get(_key(prompt)) is None
+
+
+def test_word_order_matters(cache):
+    cache.set(_key('¿Es Python lento?'), 'respuesta')
+    
+    assert cache.get(_key('¿Python es lento?')) is None
+
+
+def test_miss_for_other_context_model_or_budget(cache):
+    cache.set(_key('¿Qué es Python?'), 'respuesta')
+    
+    assert cache.get(_key('¿Qué es Python?', context=CONTEXT + ['Otro hecho.'])) is None
+    assert cache.get(_key('¿Qué es Python?', model='m2')) is None
+    assert cache.get(_key('¿Qué es Python?', max_tokens=500)) is None
+    assert cache.stats['misses'] == 3
+
+
+def test_stale_hit_after_ttl(tmp_path):
+    cache = AnswerCache(tmp_path, ttl_hours=0, stale_hours=1)
+    cache.set(_key('¿Qué es Python?'), 'respuesta')
+    
+    assert cache.get(_key('¿Qué es Python?')) == ('respuesta', True)
+    assert cache.get_stats()['stale_hits'] == 1
@@ -0,0 +1,71 @@
+"""Endpoint SSE `/api/crawler/stream` con `AI_PROVIDER=fake` y streaming de OpenAI."""
+
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import core_enhanced
+from conftest import QUERY
+from core_enhanced import AIProvider, FakeAIProvider
+
+
+@pytest.fixture
+def client(crawler, monkeypatch):
+    """Cliente de pruebas de Flask; la app usa el crawler del servidor local."""
+    def make_crawler(**kwargs):
+        assert isinstance(kwargs['ai_provider'], FakeAIProvider)
+        return crawler
+    
+    monkeypatch.setenv('AI_PROVIDER', 'fake')
+    monkeypatch.setattr(core_enhanced, 'EnhancedCrawler', make_crawler)
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    import app
+    return app.app.test_client()
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_endpoint(client, stub_server):
+    response = client.post('/api/crawler/stream', json={'prompt': f"¿Qué es el {QUERY}?"})
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names[0] == 'analysis' and names[-1] == 'done'
+    assert set(names[1:-1]) == {'delta'}
+    
+    analysis, done = events[0][1], events[-1][1]
+    assert any(s.startswith(stub_server.base) for s in analysis['sources'])
+    text = ''.join(payload['text'] for name, payload in events if name == 'delta')
+    assert 'zorblax' in text
+    assert done['response']['response_text'] == text
+    assert done['response']['ai_provider'] == 'fake'
+
+
+def test_stream_endpoint_requires_prompt(client):
+    response = client.post('/api/crawler/stream', json={'prompt': '  '})
+    
+    assert response.status_code == 400
+
+
+def test_openai_stream_uses_v1_client():
+    def create(**kwargs):
+        assert kwargs['stream'] is True
+        deltas = ['Hola', None, ' mundo']
+        return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=d))])
+                     for d in deltas] + [SimpleNamespace(choices=[])])
+    
+    provider = AIProvider()
+    provider.provider, provider.model = 'openai', 'gpt-test'
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    
+    assert list(provider.stream('¿Qué es Python?', ['Python es un lenguaje.'])) == ['Hola', ' mundo']
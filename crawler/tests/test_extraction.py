@@ -0,0 +1,81 @@
+"""Extracción incremental (`StreamingExtractor`) frente a los backends sobre árbol."""
+
+import pytest
+
+from extraction import Bs4Backend, StreamingExtractor, available_backends, get_parser_backend
+
+PAGE = (
+    "<html><head><style>p { color: red }</style>"
+    "<script>var texto = '<p>Esto no es un párrafo de la página real</p>';</script></head>"
+    "<body><nav><ul><li>Inicio del portal con enlaces de navegación varios</li></ul></nav>"
+    "<header><p>Cabecera de la página con un texto suficientemente largo</p></header>"
+    "<p>Párrafo fuera del contenedor principal que no debe aparecer nunca</p>"
+    "<div class='main-content'>"
+    "<p>El zorblax cuántico es un <b>dispositivo</b> ficticio usado en pruebas.</p>"
+    "<ul><li>Primer elemento de la lista<nav>Menú</nav>con texto descriptivo"
+    "<ul><li>Elemento anidado dentro del primero con texto propio</li></ul></li>"
+    "<li>Segundo elemento de la lista con texto descriptivo</li></ul>"
+    "<dl><dt>Zorblax</dt><dt>Zorblax cuántico</dt>"
+    "<dd>Dispositivo ficticio para las pruebas del crawler</dd></dl>"
+    "<p>Otro párrafo del contenido principal con <a href='/x'>un enlace</a> útil.</p>"
+    "<aside><p>Publicidad lateral que también se descarta por completo</p></aside>"
+    "</div><footer><p>Pie de página con el aviso legal y los créditos</p></footer></body></html>"
+)
+
+
+def _stream(html: str, max_fragments: int = 25, chunk_size: int = 7):
+    """Fragmentos y bytes leídos alimentando `html` en trozos de `chunk_size`."""
+    data = html.encode('utf-8')
+    extractor = StreamingExtractor(max_fragments, max_bytes=len(data) + 1, encoding='utf-8')
+    for start in range(0, len(data), chunk_size):
+        if extractor.feed_bytes(data[start:start + chunk_size]):
+            break
+    return extractor.finish(), extractor.bytes_read
+
+
+def test_streaming_matches_bs4_in_small_chunks():
+    pytest.importorskip('bs4')
+    
+    fragments, _ = _stream(PAGE)
+    
+    assert fragments == Bs4Backend().extract(PAGE)
+    assert not any(word in ' '.join(fragments)
+                   for word in ('var texto', 'Inicio', 'Cabecera', 'fuera', 'Publicidad', 'Pie'))
+
+
+def test_streaming_applies_implicit_closes_like_html5_parsers():
+    # bs4 con html.parser anida <p> y <dt> sin cerrar; selectolax (lexbor)
+    # los cierra como un navegador, igual que el extractor incremental
+    pytest.importorskip('selectolax')
+    from extraction import SelectolaxBackend
+    html = ("<div class='content'><p>Primer párrafo sin cierre con texto suficiente."
+            "<p>Segundo párrafo sin cierre con texto suficiente."
+            "<div><p>Párrafo que se cierra con su bloque y nada más.</div>Texto suelto tras el bloque."
+            "<dl><dt>Zorblax<dt>Zorblax cuántico<dd>Dispositivo ficticio para las pruebas</dl></div>")
+    
+    assert _stream(html)[0] == SelectolaxBackend().extract(html)
+
+
+def test_streaming_stops_early_with_the_same_fragments():
+    pytest.importorskip('bs4')
+    paragraphs = ''.join(f"<p>Párrafo {i} del contenido principal con texto suficiente.</p>"
+                         for i in range(200))
+    html = f"<html><body><main class='content'>{paragraphs}</main><p>Después del principal.</p></body></html>"
+    
+    fragments, bytes_read = _stream(html, max_fragments=5)
+    
+    assert fragments == Bs4Backend().extract(html, max_fragments=5)
+    assert len(fragments) == 5
+    assert bytes_read < len(html.encode('utf-8')) // 10
+
+
+@pytest.mark.parametrize('name', [name for name in available_backends() if name != 'regex'])
+def test_tree_backends_agree_on_the_same_page(name):
+    # El texto de los hijos en línea se separa con espacio en todos los backends
+    html = ("<div class='content'><p>El <b>zorblax</b>cuántico es un dispositivo ficticio de prueba.</p>"
+            "<p>Texto antes del script<script>var x = 1;</script><nav>Menú</nav>y texto después.</p></div>")
+    reference = get_parser_backend('htmlparser')
+    backend = get_parser_backend(name)
+    
+    assert backend.extract(PAGE) == reference.extract(PAGE)
+    assert backend.extract(html) == reference.extract(html)
@@ -0,0 +1,16 @@
+"""Registro de feedback (`feedback.FeedbackStore`) y `utils.save_feedback`."""
+
+import feedback
+from utils import save_feedback
+
+
+def test_save_feedback_reuses_one_store_per_file(tmp_path):
+    path = tmp_path / 'feedback.jsonl'
+    for i in range(20):
+        save_feedback(f"pregunta {i}", {'response_text': 'r'}, i % 2 == 0, feedback_file=path)
+    
+    store = feedback.get_feedback_store(path)
+    assert store is feedback.get_feedback_store(tmp_path / '.' / 'feedback.jsonl')
+    entries = list(store.iter_entries())
+    assert [e['prompt'] for e in entries] == [f"pregunta {i}" for i in range(20)]
+    assert sum(e['useful'] for e in entries) == 10
@@ -0,0 +1,214 @@
+"""Búsqueda síncrona y asíncrona contra el servidor local de `conftest`."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from config import FOLLOW_MAX_PER_HOST
+from conftest import KEYWORDS, QUERY, SLOW_PAGE_SECONDS
+from extraction import _HAS_BS4, get_parser_backend
+from health import EngineSkipped
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _assert_results(server, fragments, sources):
+    assert 'Resultado de DuckDuckGo: el zorblax cuántico aparece en muchas pruebas.' in fragments
+    assert 'El zorblax es un artefacto de ficción muy citado.' in fragments
+    assert 'Wikipedia: Zorblax' in sources
+    # Seguimiento de resultados: ambas páginas, sin el anuncio, atribuidas a su URL
+    for n in ('1', '2'):
+        url = f"{server.base}/page/{n}"
+        page = [f for f, s in zip(fragments, sources) if s == url]
+        assert page[0] == f"El zorblax cuántico {n} es un dispositivo ficticio usado en pruebas."
+    assert not any('Inicio del portal' in f for f in fragments)
+
+
+def test_search_sync(fetcher, stub_server):
+    fragments, sources = fetcher.search(QUERY, KEYWORDS, max_results=20)
+    
+    _assert_results(stub_server, fragments, sources)
+    assert len(fragments) == len(sources)
+
+
+def test_search_async(fetcher, stub_server):
+    fragments, sources = _run(fetcher.asearch(QUERY, KEYWORDS, max_results=20))
+    
+    _assert_results(stub_server, fragments, sources)
+
+
+@pytest.mark.parametrize('backend', ['htmlparser', 'bs4'])
+def test_follow_results_with_backend(fetcher, stub_server, backend):
+    if backend == 'bs4':
+        pytest.importorskip('bs4')
+    fetcher.parser_backend = get_parser_backend(backend)
+    
+    fragments, sources = fetcher.search(QUERY, KEYWORDS, max_results=20)
+    
+    _assert_results(stub_server, fragments, sources)
+    pages = sorted(p for p in stub_server.hits if p.startswith('/page/'))
+    assert pages == ['/page/1', '/page/2']
+
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_http_cache_hit(fetcher, stub_server, use_async):
+    search = (lambda: _run(fetcher.asearch(QUERY, KEYWORDS, max_results=20))) if use_async \
+        else (lambda: fetcher.search(QUERY, KEYWORDS, max_results=20))
+    
+    first = search()
+    hits = len(stub_server.hits)
+    calls = {name: h.stats['calls'] for name, h in fetcher.engine_health.items()}
+    latencies = {name: list(h._latencies) for name, h in fetcher.engine_health.items()}
+    
+    second = search()
+    
+    # Todo se sirve desde la caché HTTP, sin red y sin contar como latencia del motor
+    assert second == first
+    assert len(stub_server.hits) == hits
+    assert {name: h.stats['calls'] for name, h in fetcher.engine_health.items()} == calls
+    assert {name: list(h._latencies) for name, h in fetcher.engine_health.items()} == latencies
+    
+    with fetcher.transport.fetch(f"{stub_server.base}/page/1", 5) as response:
+        assert response.from_cache
+        assert response.status_code == 200
+
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_unstorable_responses_stream_live(fetcher, stub_server, use_async):
+    url = f"{stub_server.base}/nostore/1"
+    
+    async def afetch():
+        async with fetcher.transport.afetch(fetcher._get_async_client(), url, 5) as response:
+            return response._content is None, (await fetcher._afetch_page(response, url))[0]
+    
+    if use_async:
+        live, fragments = _run(afetch())
+    else:
+        with fetcher.transport.fetch(url, 5) as response:
+            live, fragments = response._content is None, fetcher._fetch_page(response, url)[0]
+    
+    # El cuerpo no se acumula para una caché que no lo va a guardar
+    assert live
+    assert fragments[0] == "El zorblax cuántico 1 es un dispositivo ficticio usado en pruebas."
+    assert fetcher.transport.cache.stats['misses'] == 1
+    assert fetcher.transport.cache.stats['stored'] == 0
+
+
+def test_crawler_arun_with_fake_provider(crawler, stub_server):
+    result = _run(crawler.arun(f"¿Qué es el {QUERY}?"))
+    
+    response = result['response']
+    assert 'zorblax' in response['response_text']
+    assert any(s.startswith(stub_server.base) for s in response['sources'])
+
+
+def test_arun_coalesces_only_the_same_question(crawler):
+    async def ask(*prompts):
+        return await asyncio.gather(*(crawler.arun(p) for p in prompts))
+    
+    # Mismo conjunto de palabras clave, preguntas distintas: no se comparten
+    what, why = _run(ask('¿Qué es Python?', '¿Por qué Python?'))
+    assert crawler.inflight.stats == {'executions': 2, 'coalesced': 0}
+    assert what['response']['query'] == '¿Qué es Python?'
+    assert why['response']['query'] == '¿Por qué Python?'
+    assert what['response']['intent'] != why['response']['intent']
+    
+    # Solo cambian mayúsculas, acentos y puntuación: una única ejecución
+    first, second = _run(ask('¿Qué es Python?', 'que es python'))
+    assert crawler.inflight.stats == {'executions': 3, 'coalesced': 1}
+    assert second['prompt'] == 'que es python'
+    assert second['response']['response_text'] == first['response']['response_text']
+
+
+def test_arun_keeps_cpu_work_off_the_event_loop(crawler, monkeypatch):
+    loop_threads = {}
+    
+    def record(name, func):
+        def wrapper(*args, **kwargs):
+            loop_threads[name] = threading.current_thread()
+            return func(*args, **kwargs)
+        return wrapper
+    
+    for target, name in ((crawler.fetcher, '_search_knowledge_base'), (crawler.fetcher, '_extract_page'),
+                         (crawler, '_rank_fragments')):
+        monkeypatch.setattr(target, name, record(name, getattr(target, name)))
+    crawler.fetcher.parser_backend = get_parser_backend('bs4' if _HAS_BS4 else 'regex')
+    
+    _run(crawler.arun(f"¿Qué es el {QUERY}?"))
+    
+    assert set(loop_threads) == {'_search_knowledge_base', '_extract_page', '_rank_fragments'}
+    assert threading.main_thread() not in loop_threads.values()
+
+
+def test_cancelling_follow_through_cancels_page_fetches(fetcher, stub_server):
+    urls = [f"{stub_server.base}/slow/{n}" for n in (1, 2, 3)]
+    
+    async def cancel_midway():
+        follow = asyncio.ensure_future(fetcher._afollow_results(urls, deadline=30))
+        # Dos descargas en curso y la tercera esperando turno en el host
+        while sum(p.startswith('/slow/') for p in stub_server.hits) < FOLLOW_MAX_PER_HOST:
+            await asyncio.sleep(0.01)
+        follow.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follow
+        # Ninguna descarga sigue viva tras la cancelación
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    
+    start = time.monotonic()
+    assert _run(cancel_midway()) == []
+    assert time.monotonic() - start < SLOW_PAGE_SECONDS
+
+
+def test_host_slots_belong_to_the_running_loop(fetcher, stub_server):
+    url = f"{stub_server.base}/page/1"
+    
+    async def slot():
+        return fetcher._ahost_slot(url), fetcher._get_async_client()
+    
+    first_slot, first_client = _run(slot())
+    second_slot, second_client = _run(slot())
+    
+    assert second_client is not first_client
+    assert second_slot is not first_slot
+
+
+@pytest.mark.parametrize('use_async', [False, True])
+def test_follow_results_fit_in_the_engine_timeout(fetcher, stub_server, monkeypatch, use_async):
+    deadlines = []
+    
+    def follow(urls, deadline):
+        deadlines.append(deadline)
+        return [], []
+    
+    async def afollow(urls, deadline):
+        return follow(urls, deadline)
+    
+    monkeypatch.setattr(fetcher, '_follow_results', follow)
+    monkeypatch.setattr(fetcher, '_afollow_results', afollow)
+    if use_async:
+        _run(fetcher._asearch_duckduckgo(QUERY, timeout=1))
+    else:
+        fetcher._search_duckduckgo(QUERY, timeout=1)
+    
+    # La visita de resultados solo dispone de lo que le queda a la llamada
+    assert len(deadlines) == 1 and 0 < deadlines[0] <= 1
+
+
+def test_engine_calls_do_not_outlive_the_search_deadline(fetcher, stub_server):
+    wikipedia = fetcher.providers.providers['wikipedia']
+    
+    # Sale de la cola con el plazo vencido: no llega a la red
+    with pytest.raises(EngineSkipped):
+        fetcher._engine_call(wikipedia, QUERY, time.monotonic() - 1)
+    assert stub_server.hits == []
+    
+    # Un motor lento libera su hilo poco después del plazo
+    fetcher.search_engines['wikipedia'] = stub_server.base + '/slow/wiki?srsearch={query}'
+    start = time.monotonic()
+    fetcher._parallel_web_search(QUERY, max_results=20, deadline=1)
+    fetcher.executor.shutdown(wait=True)
+    assert time.monotonic() - start < SLOW_PAGE_SECONDS
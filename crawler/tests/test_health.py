@@ -0,0 +1,59 @@
+"""Transiciones del circuit breaker de `EngineHealth`."""
+
+import pytest
+
+from config import ENGINE_FAILURE_THRESHOLD
+from health import EngineHealth
+
+
+def _fail(health, times=1):
+    for _ in range(times):
+        with pytest.raises(RuntimeError), health.track():
+            raise RuntimeError('motor caído')
+
+
+def _cool_down(health):
+    health.opened_at -= health.cooldown
+
+
+def test_circuit_opens_probes_once_and_closes():
+    health = EngineHealth('motor', cooldown=60)
+    
+    # Cerrado: deja pasar hasta el umbral de fallos seguidos
+    _fail(health, ENGINE_FAILURE_THRESHOLD - 1)
+    assert health.state == EngineHealth.CLOSED and health.allow()
+    _fail(health)
+    assert health.state == EngineHealth.OPEN
+    assert not health.allow() and health.stats['skipped'] == 1
+    
+    # Semiabierto tras el enfriamiento: una sola llamada de prueba
+    _cool_down(health)
+    assert health.allow() and health.state == EngineHealth.HALF_OPEN
+    assert not health.allow()
+    
+    # La prueba falla: vuelve a abrirse sin esperar al umbral
+    _fail(health)
+    assert health.state == EngineHealth.OPEN and health.stats['opened'] == 2
+    assert not health.allow()
+    
+    # La prueba va bien: se cierra y olvida la tasa de error
+    _cool_down(health)
+    assert health.allow()
+    with health.track():
+        pass
+    assert health.state == EngineHealth.CLOSED
+    assert health.error_rate == 0.0 and health.consecutive_failures == 0
+    assert health.allow() and health.allow()
+
+
+def test_ignored_probe_keeps_the_circuit_half_open():
+    health = EngineHealth('motor', cooldown=60)
+    _fail(health, ENGINE_FAILURE_THRESHOLD)
+    _cool_down(health)
+    
+    # Un acierto de la caché HTTP no dice nada del motor: libera la prueba
+    assert health.allow()
+    with health.track() as call:
+        call.ignore()
+    assert health.state == EngineHealth.HALF_OPEN
+    assert health.allow()
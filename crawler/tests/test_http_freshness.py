@@ -0,0 +1,29 @@
+"""Caducidad de las respuestas de la caché HTTP (`utils.http_freshness`)."""
+
+from email.utils import formatdate
+
+from config import HTTP_CACHE_HEURISTIC_TTL_SECONDS
+from utils import http_freshness
+
+NOW = 1_700_000_000.0
+
+
+def test_explicit_freshness():
+    assert http_freshness({'cache-control': 'max-age=60', 'age': '10'}, NOW) == NOW + 50
+    assert http_freshness({'cache-control': 'no-store'}, NOW) is None
+    assert http_freshness({'cache-control': 'no-cache'}, NOW) == NOW
+
+
+def test_no_heuristic_without_last_modified():
+    assert http_freshness({}, NOW) == NOW
+    assert http_freshness({'etag': '"v1"'}, NOW) == NOW
+
+
+def test_heuristic_from_last_modified():
+    date = formatdate(NOW, usegmt=True)
+    recent = formatdate(NOW - 600, usegmt=True)
+    old = formatdate(NOW - 86400 * 30, usegmt=True)
+    
+    assert http_freshness({'date': date, 'last-modified': recent}, NOW) == NOW + 60
+    assert http_freshness({'date': date, 'last-modified': old}, NOW) == \
+        NOW + HTTP_CACHE_HEURISTIC_TTL_SECONDS
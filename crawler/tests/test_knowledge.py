@@ -0,0 +1,52 @@
+"""Búsquedas de `KnowledgeIndex` y desalojo en `LearnedKnowledge`."""
+
+from knowledge import KnowledgeIndex, LearnedKnowledge
+
+BASE = {
+    'gatos': ['Los gatos duermen mucho.', 'Los gatos cazan ratones.'],
+    'perros': ['Los perros ladran a los gatos.', 'Los perros cazan palos.']
+}
+
+
+def test_token_lookup_when_no_topic_matches(tmp_path):
+    knowledge = KnowledgeIndex(learned_file=tmp_path / 'learned_knowledge.json', base=BASE)
+    
+    # Tema exacto: solo sus hechos, sin mirar el texto de los demás
+    assert knowledge.search(['gatos']) == (BASE['gatos'], ['Base de conocimiento'] * 2)
+    # Ningún tema contiene 'cazan': se buscan los hechos con ese token
+    assert knowledge.search(['cazan']) == (
+        ['Los gatos cazan ratones.', 'Los perros cazan palos.'], ['KB: gatos', 'KB: perros']
+    )
+    # Varios tokens en una palabra clave: hechos que los contienen todos
+    assert knowledge.search(['ladran-gatos']) == (['Los perros ladran a los gatos.'], ['KB: perros'])
+    assert knowledge.search(['caballos']) == ([], [])
+
+
+def test_learned_knowledge_evicts_low_value_facts_and_topics():
+    day = 86400
+    learned = LearnedKnowledge(max_topics=10, max_facts_per_topic=2, half_life_days=1, min_score=0.5)
+    
+    # Tope por tema: un hecho nuevo solo entra desalojando a uno peor
+    learned.update('t', 'a', 1.0, now=0)
+    learned.update('t', 'b', 2.0, now=0)
+    assert not learned.update('t', 'c', 0.8, now=0)
+    assert learned.update('t', 'c', 1.5, now=0)
+    assert set(learned.topics['t']) == {'b', 'c'}
+    
+    # Negativo: se ignora sobre un hecho desconocido y desaloja al bajar del mínimo
+    assert not learned.update('t', 'z', -1.0, now=0)
+    learned.update('t', 'c', -1.2, now=0)
+    assert set(learned.topics['t']) == {'b'} and learned.fact_count == 1
+    
+    # Tope de temas: se baja al 90 % quitando los de menor valor
+    learned = LearnedKnowledge(max_topics=10, half_life_days=1, min_score=0.5)
+    for n in range(11):
+        learned.update(f"tema{n}", 'hecho', 1.0 + n, now=0)
+    assert learned.enforce_limits(now=0) == 2
+    assert set(learned.topics) == {f"tema{n}" for n in range(2, 11)}
+    
+    # Decaimiento: tras cuatro vidas medias solo quedan los de 8.0 o más
+    assert learned.prune(now=4 * day) == 5
+    assert set(learned.topics) == {f"tema{n}" for n in range(7, 11)}
+    assert learned.fact_count == 4
+    assert learned.score(learned.topics['tema10']['hecho'], now=day) == 5.5
@@ -0,0 +1,28 @@
+"""Persistencia de `LearningSystem` con varios hilos a la vez."""
+
+import json
+import threading
+
+
+def test_concurrent_persist_stats_keep_one_valid_file(crawler, capsys):
+    learning = crawler.learning
+    barrier = threading.Barrier(8)
+    
+    def persist():
+        barrier.wait()
+        for i in range(50):
+            with learning._stats_lock:
+                learning._stats['total_feedback'] += 1
+                learning._stats_dirty = True
+            learning.persist_stats()
+    
+    threads = [threading.Thread(target=persist) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    # Ningún volcado pierde su fichero temporal ni deja una copia antigua
+    assert 'Error guardando' not in capsys.readouterr().out
+    with open(learning.stats_file, encoding='utf-8') as f:
+        assert json.load(f)['total_feedback'] == 8 * 50
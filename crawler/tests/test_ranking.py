@@ -0,0 +1,38 @@
+"""IDF de BM25 frente a un N y un df calculados a mano."""
+
+import math
+
+from knowledge import KnowledgeIndex
+from ranking import BM25Ranker, CorpusStats
+
+BASE = {
+    'gatos': ['Los gatos duermen mucho.', 'Los gatos cazan ratones.'],
+    'perros': ['Los perros ladran.']
+}
+
+
+def test_candidates_count_once_in_n_and_df(tmp_path):
+    knowledge = KnowledgeIndex(learned_file=tmp_path / 'learned_knowledge.json', base=BASE)
+    corpus = CorpusStats(knowledge)
+    ranker = BM25Ranker(corpus)
+    # Un hecho de la KB, un fragmento nuevo y ese mismo fragmento repetido
+    candidates = ['Los gatos duermen mucho.', 'Mis gatos juegan.', 'Mis gatos juegan.']
+    
+    corpus.add_documents(candidates)
+    scores = ranker.score(candidates, ['gatos'])
+    
+    # N = 3 hechos + 1 fragmento nuevo; df('gatos') = 2 hechos + 1 fragmento
+    n, df = 4, 3
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    assert corpus.total_documents == n
+    assert corpus.document_frequency('gatos') == df
+    assert corpus.idf('gatos') == idf
+    
+    lengths = [4, 3, 3]
+    avgdl = sum(lengths) / len(lengths)
+    expected = [
+        idf * (ranker.k1 + 1) / (1 + ranker.k1 * (1 - ranker.b + ranker.b * length / avgdl))
+        for length in lengths
+    ]
+    assert len(scores) == len(expected)
+    assert all(math.isclose(a, b) for a, b in zip(scores, expected))
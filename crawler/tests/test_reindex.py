@@ -0,0 +1,73 @@
+"""Re-indexado offline (`reindex.build_knowledge`) frente al aprendizaje en línea."""
+
+import json
+import math
+import time
+from multiprocessing.dummy import Pool
+
+from feedback import FeedbackStore
+from reindex import build_knowledge, iter_ranges
+
+
+def _response(n: int, topic: str) -> dict:
+    sentences = [f"El {topic} número {n}.{i} aparece en muchas pruebas del crawler" for i in range(3)]
+    return {'keywords': [topic], 'response_text': '. '.join(sentences)}
+
+
+def test_rebuild_matches_online_replay(crawler):
+    learning = crawler.learning
+    # 21 hechos reforzados dos veces sobre un tope de 20 por tema
+    feedback = [(n, 'zorblax', True) for n in range(7) for _ in range(2)]
+    # No útil y luego útil: sumando daría 0; en línea el negativo se ignora
+    feedback += [(7, 'gato', False), (7, 'gato', True)]
+    # Útil y luego no útil: cae por debajo de `min_score` y se desaloja
+    feedback += [(8, 'perro', True), (8, 'perro', False), (9, 'pez', False)]
+    for n, topic, useful in feedback:
+        learning.add_feedback(f"pregunta {n}", _response(n, topic), useful)
+    assert learning.drain(timeout=10)
+    online = learning._learned
+    
+    store = learning.feedback_store
+    with Pool(2) as pool:
+        rebuilt, entries = build_knowledge(pool, store, store.size(), workers=2,
+                                           chunk_bytes=300, now=time.time())
+    
+    assert entries == len(feedback)
+    assert rebuilt.fact_count == online.fact_count
+    assert rebuilt.topics.keys() == online.topics.keys() == {'zorblax', 'gato'}
+    for topic, facts in online.topics.items():
+        assert rebuilt.topics[topic].keys() == facts.keys()
+        for fact, (score, _) in facts.items():
+            assert math.isclose(rebuilt.topics[topic][fact][0], score, rel_tol=1e-6)
+    
+    assert len(rebuilt.topics['zorblax']) == rebuilt.max_facts_per_topic
+    assert 'El zorblax número 6.2 aparece en muchas pruebas del crawler' not in rebuilt.topics['zorblax']
+    for fact, (score, _) in rebuilt.topics['gato'].items():
+        assert math.isclose(score, 1.0, rel_tol=1e-6)
+
+
+def test_workers_read_their_own_byte_ranges(tmp_path, monkeypatch):
+    store = FeedbackStore(tmp_path / 'feedback.jsonl', legacy_path=None)
+    for n in range(30):
+        store.add(f"pregunta {n}", _response(n, f"tema{n % 10}"), True)
+    store.close()
+    # Una línea inválida y otra a medio escribir
+    with open(store.path, 'ab') as f:
+        f.write(b'no es json\n' + json.dumps({'prompt': 'p', 'response': _response(99, 'x')}).encode()[:40])
+    
+    ranges = list(iter_ranges(store, store.size(), 500))
+    assert len(ranges) > 3 and ranges[0][0] == 0 and ranges[-1][1] == store.size()
+    assert all(stop == start for (_, stop), (start, _) in zip(ranges, ranges[1:]))
+    assert all(store.is_line_start(start) for start, _ in ranges)
+    
+    # El proceso principal no decodifica el registro: solo reparte tramos
+    def scan(*args):
+        raise AssertionError('scan en el proceso principal')
+    monkeypatch.setattr(FeedbackStore, 'scan', scan)
+    with Pool(2) as pool:
+        rebuilt, entries = build_knowledge(pool, store, store.size(), workers=2,
+                                           chunk_bytes=500, now=time.time())
+    
+    assert entries == 30
+    assert rebuilt.topics.keys() == {f"tema{n}" for n in range(10)}
+    assert rebuilt.fact_count == 30 * 3
@@ -0,0 +1,54 @@
+"""Enrutado por intención de `ProviderRegistry`."""
+
+from config import PROVIDER_MIN_SAMPLES, PROVIDER_PROBE_EVERY
+from health import EngineHealth
+from search_providers import ProviderRegistry
+
+ENGINES = {
+    'web': {'url': 'http://web/?q={query}', 'provider': 'duckduckgo',
+            'latency_hint': 1.0, 'capabilities': ['web']},
+    'enciclopedia': {'url': 'http://wiki/?q={query}', 'provider': 'wikipedia',
+                     'latency_hint': 2.0, 'capabilities': ['encyclopedia']},
+    'noticias': {'url': 'http://news/?q={query}', 'provider': 'duckduckgo',
+                 'latency_hint': 0.5, 'capabilities': ['news']}
+}
+
+
+def _names(providers):
+    return [provider.name for provider in providers]
+
+
+def test_route_orders_by_intent_affinity_and_latency():
+    registry = ProviderRegistry(ENGINES)
+    
+    assert _names(registry.route('actualidad')) == ['noticias', 'web', 'enciclopedia']
+    assert _names(registry.route('explicación')) == ['enciclopedia', 'web']
+    assert _names(registry.route('procedimiento')) == ['web', 'enciclopedia']
+    
+    # Empate de puntuación: primero el más rápido, medido o por la pista
+    assert _names(registry.route(None)) == ['web', 'enciclopedia']
+    slow_web = EngineHealth('web')
+    slow_web.record_success(5.0)
+    assert _names(registry.route(None, {'web': slow_web})) == ['enciclopedia', 'web']
+    
+    assert _names(ProviderRegistry(ENGINES, max_providers=1).route('actualidad')) == ['noticias']
+
+
+def test_route_drops_providers_that_never_contribute_but_probes_them():
+    registry = ProviderRegistry(ENGINES)
+    for _ in range(PROVIDER_MIN_SAMPLES):
+        registry.record('web', 'explicación', 0)
+        registry.record('enciclopedia', 'explicación', 3)
+    
+    routes = [_names(registry.route('explicación')) for _ in range(PROVIDER_PROBE_EVERY)]
+    
+    # Descartado solo para esa intención, con una consulta de prueba de vez en cuando
+    assert routes[:-1] == [['enciclopedia']] * (PROVIDER_PROBE_EVERY - 1)
+    assert routes[-1] == ['enciclopedia', 'web']
+    assert _names(registry.route('procedimiento')) == ['web', 'enciclopedia']
+    
+    # Si ninguno aporta queda al menos el mejor situado
+    for _ in range(PROVIDER_MIN_SAMPLES):
+        registry.record('enciclopedia', 'causas', 0)
+        registry.record('web', 'causas', 0)
+    assert _names(registry.route('causas')) == ['enciclopedia']
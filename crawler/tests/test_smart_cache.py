@@ -0,0 +1,34 @@
+"""Desalojo por tamaño de `utils.SmartCache`."""
+
+import pytest
+
+from utils import SmartCache
+
+
+def _cache(tmp_path, policy):
+    return SmartCache(tmp_path, max_entries=10, eviction_policy=policy,
+                      key_normalizer=lambda query: query, near_duplicate_threshold=0,
+                      evict_check_every=1, legacy_index=None)
+
+
+def _stored(cache):
+    return {row[0] for row in cache._connect().execute('SELECT query FROM cache')}
+
+
+@pytest.mark.parametrize('policy, read, evicted', [
+    # LRU: sale lo que lleva más tiempo sin leerse
+    ('lru', range(3), {'q3', 'q4'}),
+    # LFU: sale lo menos leído, y a igualdad de lecturas lo más antiguo
+    ('lfu', range(8), {'q8', 'q9'}),
+])
+def test_eviction_down_to_ninety_percent(tmp_path, policy, read, evicted):
+    cache = _cache(tmp_path, policy)
+    for n in range(10):
+        cache.set(f"q{n}", {'n': n})
+    for n in read:
+        assert cache.get(f"q{n}") == {'n': n}
+    assert len(_stored(cache)) == 10
+    
+    cache.set('q10', {'n': 10})
+    
+    assert _stored(cache) == {f"q{n}" for n in range(11)} - evicted
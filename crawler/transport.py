@@ -0,0 +1,367 @@
+"""Capa de transporte HTTP compartida (pools por host, keep-alive y reintentos)."""
+import asyncio
+import contextlib
+import importlib.util
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional
+
+from config import (
+    USER_AGENT, HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, HTTP_HOST_POOL_SIZES,
+    HTTP_POOL_BLOCK, HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP2,
+    HTTP_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_RETRY_STATUSES, HTTP_CACHE_ENABLED,
+    PAGE_MAX_BYTES, PAGE_CHUNK_SIZE
+)
+from utils import HttpCache, http_freshness
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    _HAS_REQUESTS = True
+except ImportError:
+    requests = None
+    _HAS_REQUESTS = False
+
+try:
+    import httpx
+    _HAS_HTTPX = True
+except ImportError:
+    httpx = None
+    _HAS_HTTPX = False
+
+# Necesario para http2=True en httpx (solo se comprueba que esté instalado)
+_HAS_H2 = importlib.util.find_spec('h2') is not None
+
+
+if _HAS_HTTPX:
+    class RetryingAsyncTransport(httpx.AsyncBaseTransport):
+        """Transporte httpx con reintentos y backoff exponencial.
+        
+        Reintenta errores de conexión y los códigos de `HTTP_RETRY_STATUSES`
+        en métodos idempotentes (los transportes de httpx solo reintentan la
+        conexión inicial). Como el adaptador síncrono, no reintenta timeouts
+        de lectura ni espera lo que pida `Retry-After`.
+        """
+        
+        def __init__(self, transport: 'httpx.AsyncHTTPTransport', retries: int = HTTP_RETRIES,
+                     backoff_factor: float = HTTP_BACKOFF_FACTOR):
+            self.transport = transport
+            self.retries = retries
+            self.backoff_factor = backoff_factor
+        
+        async def handle_async_request(self, request):
+            attempt = 0
+            while True:
+                retryable = request.method in ('GET', 'HEAD') and attempt < self.retries
+                try:
+                    response = await self.transport.handle_async_request(request)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    if not retryable:
+                        raise
+                else:
+                    if not retryable or response.status_code not in HTTP_RETRY_STATUSES:
+                        return response
+                    await response.aclose()
+                
+                attempt += 1
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+        
+        async def aclose(self):
+            await self.transport.aclose()
+
+
+class HttpResponse:
+    """Respuesta común a requests, httpx y la caché HTTP.
+    
+    El cuerpo está en memoria (`content`) o se lee en directo de la conexión
+    (`stream`, solo dentro del `with` de `HttpTransport.fetch`).
+    """
+    
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str],
+                 content: Optional[bytes] = None, stream: Optional[Iterable[bytes]] = None,
+                 from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = {k.lower(): v for k, v in headers.items()}
+        self.from_cache = from_cache
+        self._content = content
+        self._stream = stream
+    
+    @property
+    def encoding(self) -> Optional[str]:
+        """Charset de Content-Type (None si no lo declara)."""
+        for param in self.headers.get('content-type', '').split(';')[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'charset' and value:
+                return value.strip('"')
+        return None
+    
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = b''.join(self._stream)
+        return self._content
+    
+    async def aread(self) -> bytes:
+        """Lee el cuerpo completo de una respuesta async en directo."""
+        if self._content is None:
+            self._content = b''.join([chunk async for chunk in self._stream])
+        return self._content
+    
+    def json(self) -> Any:
+        return json.loads(self.content)
+    
+    def iter_content(self, chunk_size: int = PAGE_CHUNK_SIZE) -> Iterator[bytes]:
+        if self._content is None:
+            yield from self._stream
+            return
+        for start in range(0, len(self._content), chunk_size):
+            yield self._content[start:start + chunk_size]
+    
+    async def aiter_bytes(self, chunk_size: int = PAGE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        if self._content is None:
+            async for chunk in self._stream:
+                yield chunk
+            return
+        for start in range(0, len(self._content), chunk_size):
+            yield self._content[start:start + chunk_size]
+
+
+def _conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers = {}
+    if entry:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def _lower_headers(headers) -> Dict[str, str]:
+    return {k.lower(): v for k, v in headers.items()}
+
+
+def _read_bounded(chunks: Iterable[bytes], max_bytes: int):
+    """(cuerpo hasta `max_bytes`, True si se leyó entero)."""
+    body = bytearray()
+    for chunk in chunks:
+        body.extend(chunk)
+        if len(body) >= max_bytes:
+            return bytes(body[:max_bytes]), False
+    return bytes(body), True
+
+
+class HttpTransport:
+    """Transporte HTTP compartido por todos los hilos y corrutinas del fetcher.
+    
+    - Síncrono (requests): una `Session` por hilo (cabeceras y cookies no son
+      seguras entre hilos) montada sobre adaptadores compartidos, de modo que
+      los pools de conexiones de urllib3, que sí lo son, se reutilizan.
+      Cada host de `host_pool_sizes` tiene su propio adaptador y tamaño.
+    - Asíncrono (httpx): cliente con keep-alive, HTTP/2 si `h2` está
+      instalado y un transporte por host con su propio límite.
+    """
+    
+    def __init__(self, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 host_pool_sizes: Optional[Dict[str, int]] = None,
+                 retries: int = HTTP_RETRIES, backoff_factor: float = HTTP_BACKOFF_FACTOR,
+                 pool_block: bool = HTTP_POOL_BLOCK, http2: bool = HTTP2,
+                 cache: Optional[HttpCache] = None, use_cache: bool = HTTP_CACHE_ENABLED):
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(HTTP_HOST_POOL_SIZES if host_pool_sizes is None else host_pool_sizes)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.http2 = http2 and _HAS_H2
+        self.cache = cache or (HttpCache() if use_cache else None)
+        self._local = threading.local()
+        self._async_transports: Dict[str, Any] = {}
+        self._adapters: Dict[str, Any] = {}
+        
+        if _HAS_REQUESTS:
+            self._adapters['*'] = self._make_adapter(pool_maxsize, pool_block)
+            for host, size in self.host_pool_sizes.items():
+                self._adapters[host] = self._make_adapter(size, pool_block)
+    
+    def _make_adapter(self, maxsize: int, pool_block: bool) -> 'HTTPAdapter':
+        retry = Retry(
+            total=self.retries, read=0, backoff_factor=self.backoff_factor,
+            status_forcelist=HTTP_RETRY_STATUSES, allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=False, raise_on_status=False
+        )
+        return HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=maxsize,
+                           pool_block=pool_block, max_retries=retry)
+    
+    @property
+    def session(self) -> Optional['requests.Session']:
+        """Sesión del hilo actual (creada al primer uso)."""
+        if not _HAS_REQUESTS:
+            return None
+        
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({'User-Agent': USER_AGENT})
+            for host, adapter in self._adapters.items():
+                if host == '*':
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                else:
+                    session.mount(f'http://{host}', adapter)
+                    session.mount(f'https://{host}', adapter)
+            self._local.session = session
+        return session
+    
+    def async_client(self) -> 'httpx.AsyncClient':
+        """Nuevo cliente async (uno por bucle de eventos) con la misma política."""
+        keepalive = HTTP_KEEPALIVE_EXPIRY
+        default = httpx.AsyncHTTPTransport(
+            http2=self.http2,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                max_keepalive_connections=self.pool_maxsize,
+                                keepalive_expiry=keepalive)
+        )
+        transports = {'*': default}
+        for host, size in self.host_pool_sizes.items():
+            transports[host] = httpx.AsyncHTTPTransport(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                                    keepalive_expiry=keepalive)
+            )
+        self._async_transports = transports
+        
+        retrying = {
+            host: RetryingAsyncTransport(t, self.retries, self.backoff_factor)
+            for host, t in transports.items()
+        }
+        return httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT}, follow_redirects=True,
+            transport=retrying.pop('*'),
+            mounts={f'all://{host}': t for host, t in retrying.items()}
+        )
+    
+    def _cached(self, url: str, max_bytes: int) -> Optional[Dict[str, Any]]:
+        """Entrada de caché utilizable para una lectura de hasta `max_bytes`."""
+        if not self.cache:
+            return None
+        entry = self.cache.get(url)
+        if entry and (entry['complete'] or len(entry['body']) >= max_bytes):
+            return entry
+        return None
+    
+    def _from_entry(self, url: str, entry: Dict[str, Any], max_bytes: int,
+                    revalidated_headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+        """Sirve una entrada de caché (fresca o revalidada con 304)."""
+        expires = None
+        if revalidated_headers is not None:
+            headers = {k.lower(): v for k, v in revalidated_headers.items()}
+            if entry['last_modified']:
+                headers.setdefault('last-modified', entry['last_modified'])
+            expires = http_freshness(headers)
+        body = entry['body'][:max_bytes]
+        self.cache.record_hit(url, len(body), revalidated_headers is not None, expires)
+        return HttpResponse(url, entry['status'], entry['headers'], content=body, from_cache=True)
+    
+    def _store(self, url: str, status: int, headers, body: bytes, complete: bool) -> HttpResponse:
+        response = HttpResponse(url, status, dict(headers), content=body)
+        self.cache.set(url, status, response.headers, body, complete)
+        return response
+    
+    @contextlib.contextmanager
+    def fetch(self, url: str, timeout: float, max_bytes: int = PAGE_MAX_BYTES) -> Iterator[HttpResponse]:
+        """GET condicional a través de la caché HTTP.
+        
+        Una entrada fresca se sirve sin red; una caducada con ETag o
+        Last-Modified se revalida (304 reutiliza el cuerpo guardado). Si la
+        respuesta es almacenable (según sus cabeceras), el cuerpo se lee
+        hasta `max_bytes` para poder guardarlo; si no (no-store, sin
+        validadores ni frescura) o no hay caché, se lee en directo de la
+        conexión y el extractor puede dejar de descargar en cuanto le basta.
+        """
+        entry = self._cached(url, max_bytes)
+        if entry and entry['expires'] > time.time():
+            yield self._from_entry(url, entry, max_bytes)
+            return
+        
+        with self.session.get(url, timeout=timeout, stream=True,
+                              headers=_conditional_headers(entry)) as response:
+            if entry and response.status_code == 304:
+                yield self._from_entry(url, entry, max_bytes, response.headers)
+            elif self.cache and self.cache.storable(response.status_code,
+                                                    _lower_headers(response.headers)):
+                body, complete = _read_bounded(response.iter_content(PAGE_CHUNK_SIZE), max_bytes)
+                yield self._store(url, response.status_code, response.headers, body, complete)
+            else:
+                if self.cache:
+                    self.cache.record_miss()
+                yield HttpResponse(url, response.status_code, dict(response.headers),
+                                   stream=response.iter_content(PAGE_CHUNK_SIZE))
+    
+    @contextlib.asynccontextmanager
+    async def afetch(self, client: 'httpx.AsyncClient', url: str, timeout: float,
+                     max_bytes: int = PAGE_MAX_BYTES) -> AsyncIterator[HttpResponse]:
+        """Versión async de `fetch` sobre un cliente de `async_client`."""
+        entry = await asyncio.to_thread(self._cached, url, max_bytes) if self.cache else None
+        if entry and entry['expires'] > time.time():
+            yield await asyncio.to_thread(self._from_entry, url, entry, max_bytes)
+            return
+        
+        async with client.stream('GET', url, timeout=timeout,
+                                 headers=_conditional_headers(entry)) as response:
+            if entry and response.status_code == 304:
+                yield await asyncio.to_thread(self._from_entry, url, entry, max_bytes,
+                                              dict(response.headers))
+            elif self.cache and self.cache.storable(response.status_code,
+                                                    _lower_headers(response.headers)):
+                body = bytearray()
+                complete = True
+                async for chunk in response.aiter_bytes(PAGE_CHUNK_SIZE):
+                    body.extend(chunk)
+                    if len(body) >= max_bytes:
+                        complete = False
+                        break
+                yield await asyncio.to_thread(self._store, url, response.status_code,
+                                              response.headers, bytes(body[:max_bytes]), complete)
+            else:
+                if self.cache:
+                    self.cache.record_miss()
+                yield HttpResponse(url, response.status_code, dict(response.headers),
+                                   stream=response.aiter_bytes(PAGE_CHUNK_SIZE))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Ocupación de los pools por host.
+        
+        `in_use / maxsize` cerca de 1 indica saturación; `opened` muy por
+        encima de `maxsize` indica que se están abriendo y tirando conexiones.
+        """
+        stats = {'http2': self.http2, 'sync': {}, 'async': {},
+                 'http_cache': self.cache.get_stats() if self.cache else None}
+        
+        for adapter in self._adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None or pool.pool is None:
+                    continue
+                maxsize = pool.pool.maxsize
+                in_use = maxsize - pool.pool.qsize()
+                stats['sync'][f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                    'maxsize': maxsize,
+                    'in_use': in_use,
+                    'saturation': round(in_use / maxsize, 2) if maxsize else 0.0,
+                    'opened': pool.num_connections,
+                    'requests': pool.num_requests
+                }
+        
+        for host, transport in self._async_transports.items():
+            try:
+                connections = transport._pool.connections
+            except AttributeError:
+                continue
+            stats['async'][host] = {
+                'connections': len(connections),
+                'idle': sum(1 for c in connections if c.is_idle())
+            }
+        
+        return stats
@@ -1,116 +1,917 @@
 """Utilidades auxiliares para el Crawler."""
+import asyncio
+import bisect
+import concurrent.futures
+import email.utils
+import gzip
 import json
 import hashlib
 import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
-from config import CACHE_DIR, CACHE_TTL_HOURS, NOISE_PATTERNS
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple
+from config import (
+    CACHE_DIR, CACHE_TTL_HOURS, CACHE_DB_FILE, CACHE_MAX_ENTRIES,
+    CACHE_EVICTION_CHECK_EVERY, CACHE_LEGACY_INDEX, CACHE_EVICTION_POLICY, CACHE_KEY_NORMALIZATION, CACHE_NEAR_DUPLICATE_THRESHOLD,
+    STOPWORDS, MEMORY_CACHE_TTL_SECONDS, MEMORY_CACHE_MAX_BYTES,
+    NEGATIVE_CACHE_TTL_SECONDS, ANSWER_CACHE_DB_FILE, ANSWER_CACHE_TTL_HOURS,
+    ANSWER_CACHE_STALE_HOURS, ANSWER_CACHE_MAX_ENTRIES, NOISE_PATTERNS,
+    HTTP_CACHE_DB_FILE, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_HEURISTIC_TTL_SECONDS
+)
+
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except ImportError:
+    np = None
+    _HAS_NUMPY = False
+
+try:
+    import zstandard
+    _HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    _HAS_ZSTD = False
+
+
+_WORD = re.compile(r'\w+[+#]*')  # conserva 'c++', 'c#', 'f#'...
+_SCRIPT_STYLE = re.compile(r'<(script|style)[^>]*>.*?</\1>', re.DOTALL | re.IGNORECASE)
+_KEYWORD_TOKEN = re.compile(r"\b[\wáéíóúñü]+\b")
+_NOISE_PATTERNS = tuple(NOISE_PATTERNS)
+
+# Tabla str.isalpha() del plano multilingüe básico para contar letras por lotes
+_BMP_ALPHA = (np.array([chr(i).isalpha() for i in range(0x10000)], dtype=np.bool_)
+              if _HAS_NUMPY else None)
+
+
+def fold_text(text: str) -> str:
+    """Normaliza mayúsculas, acentos y espacios."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(_WORD.findall(folded))
+
+
+# Las negaciones cambian el sentido de la consulta: nunca se descartan
+_NEGATIONS = {'no', 'ni', 'sin', 'nunca', 'jamas', 'tampoco', 'nada', 'ningun', 'ninguna'}
+_FOLDED_STOPWORDS = {fold_text(w) for w in STOPWORDS} - _NEGATIONS
+
+
+def query_keywords(query: str) -> List[str]:
+    """Conjunto canónico (ordenado) de palabras clave de una consulta.
+    
+    Solo se quitan las stopwords; se conservan números, tokens cortos
+    ('c', 'c#', 'go') y negaciones, que distinguen consultas distintas.
+    """
+    tokens = fold_text(query).split()
+    return sorted({t for t in tokens if t not in _FOLDED_STOPWORDS})
+
+
+def keyword_key(query: str) -> str:
+    """Forma canónica basada en el conjunto de palabras clave."""
+    return ' '.join(query_keywords(query)) or fold_text(query)
+
+
+# Normalizadores de clave de caché disponibles
+KEY_NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    'raw': lambda query: query,
+    'text': fold_text,
+    'keywords': keyword_key
+}
+
+
+MINHASH_BANDS = 4
+MINHASH_ROWS = 2
+
+
+def minhash_bands(tokens: List[str]) -> Tuple[int, ...]:
+    """Firmas LSH (MinHash por bandas) de un conjunto de tokens.
+    
+    Dos conjuntos con similitud de Jaccard J comparten al menos una banda
+    con probabilidad 1 - (1 - J^ROWS)^BANDS (≈0.98 para J=0.8).
+    """
+    signature = [
+        min(int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8,
+                                           salt=seed.to_bytes(2, 'big')).digest(), 'big')
+            for t in tokens)
+        for seed in range(MINHASH_BANDS * MINHASH_ROWS)
+    ]
+    
+    bands = []
+    for b in range(MINHASH_BANDS):
+        rows = signature[b * MINHASH_ROWS:(b + 1) * MINHASH_ROWS]
+        digest = hashlib.blake2b(repr(rows).encode('ascii'), digest_size=7).digest()
+        bands.append(int.from_bytes(digest, 'big'))
+    return tuple(bands)
+
+
+def jaccard(a: set, b: set) -> float:
+    """Similitud de Jaccard entre dos conjuntos."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
 
 
 class SmartCache:
-    """Sistema de caché inteligente con expiración."""
+    """Sistema de caché inteligente con expiración.
+    
+    Respaldado por SQLite en modo WAL: búsquedas por clave primaria, acceso
+    seguro desde varios hilos y procesos, expiración en bloque y un tamaño
+    máximo con desalojo LRU o LFU, comprobado cada `evict_check_every`
+    escrituras para no contar la tabla en cada `set`.
     
-    def __init__(self, cache_dir: Path = CACHE_DIR, ttl_hours: int = CACHE_TTL_HOURS):
+    Las claves se calculan sobre la consulta normalizada (`key_normalizer`).
+    Con `near_duplicate_threshold` > 0, un fallo exacto se resuelve con la
+    entrada cuyo conjunto de palabras clave tenga una similitud de Jaccard
+    mayor o igual; los candidatos salen de un índice MinHash por bandas, por
+    lo que no se recorre toda la tabla.
+    """
+    
+    def __init__(self, cache_dir: Path = CACHE_DIR, ttl_hours: int = CACHE_TTL_HOURS,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 eviction_policy: str = CACHE_EVICTION_POLICY,
+                 key_normalizer: Optional[Callable[[str], str]] = None,
+                 near_duplicate_threshold: float = CACHE_NEAR_DUPLICATE_THRESHOLD,
+                 db_name: str = CACHE_DB_FILE.name,
+                 evict_check_every: int = CACHE_EVICTION_CHECK_EVERY,
+                 legacy_index: Optional[Path] = CACHE_LEGACY_INDEX):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.ttl = timedelta(hours=ttl_hours)
-        self.index_file = self.cache_dir / 'index.json'
-        self.index = self._load_index()
+        self.max_entries = max_entries
+        self.eviction_policy = eviction_policy
+        self.key_normalizer = key_normalizer or KEY_NORMALIZERS[CACHE_KEY_NORMALIZATION]
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.db_file = self.cache_dir / db_name
+        self.evict_check_every = max(1, evict_check_every)
+        self.legacy_index = Path(legacy_index) if legacy_index else None
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'normalized_hits': 0,
+            'near_duplicate_hits': 0
+        }
+        self._local = threading.local()
+        # La primera escritura comprueba el tamaño (la tabla puede venir llena)
+        self._writes = self.evict_check_every - 1
+        self._writes_lock = threading.Lock()
+        self._init_db()
+        self.migrate_legacy()
     
-    def _load_index(self) -> Dict[str, Any]:
-        """Carga índice de caché."""
-        if self.index_file.exists():
-            try:
-                with open(self.index_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return {}
-        return {}
-    
-    def _save_index(self):
-        """Guarda índice de caché."""
+    def _connect(self) -> sqlite3.Connection:
+        """Conexión SQLite propia de cada hilo."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def _init_db(self):
+        """Crea el esquema de la caché si no existe."""
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                keywords TEXT,
+                band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER
+            )
+        """)
+        
+        # Bases de datos creadas antes de las columnas MinHash
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(cache)')}
+        if 'keywords' not in columns:
+            conn.execute('ALTER TABLE cache ADD COLUMN keywords TEXT')
+            for i in range(4):
+                conn.execute(f'ALTER TABLE cache ADD COLUMN band{i} INTEGER')
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_created ON cache (created)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_hits ON cache (hits, accessed)')
+        for i in range(4):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_cache_band{i} ON cache (band{i})')
+    
+    def migrate_legacy(self) -> int:
+        """Migra una sola vez la antigua caché JSON (`index.json` + un fichero por clave).
+        
+        El índice se reclama con un rename atómico, como en
+        `FeedbackStore.migrate_legacy`. Se importan las entradas vigentes y
+        se borran los ficheros JSON. Devuelve el número de entradas migradas.
+        """
+        legacy = self.legacy_index
+        if legacy is None or not legacy.exists():
+            return 0
+        claimed = legacy.with_name(legacy.name + '.migrating')
         try:
-            with open(self.index_file, 'w', encoding='utf-8') as f:
-                json.dump(self.index, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+            legacy.rename(claimed)
+        except FileNotFoundError:
+            return 0
+        try:
+            with open(claimed, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        
+        migrated = 0
+        cutoff = self._cutoff()
+        conn = self._connect()
+        for key, meta in (index.items() if isinstance(index, dict) else ()):
+            entry_file = legacy.with_name(f"{key}.json")
+            try:
+                created = datetime.fromisoformat(meta['timestamp']).timestamp()
+                if created >= cutoff:
+                    with open(entry_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    self._insert(conn, meta['query'], data, created, replace=False)
+                    migrated += 1
+            except (OSError, ValueError, KeyError, TypeError, sqlite3.Error):
+                pass
+            entry_file.unlink(missing_ok=True)
+        
+        claimed.unlink(missing_ok=True)
+        return migrated
     
     def _get_cache_key(self, query: str) -> str:
-        """Genera clave única para query."""
-        return hashlib.md5(query.encode('utf-8')).hexdigest()
+        """Genera clave única para la query normalizada."""
+        return hashlib.md5(self.key_normalizer(query).encode('utf-8')).hexdigest()
+    
+    def _cutoff(self) -> float:
+        """Marca de tiempo a partir de la cual una entrada ha expirado."""
+        return (datetime.now() - self.ttl).timestamp()
     
     def get(self, query: str) -> Optional[Dict[str, Any]]:
         """Obtiene resultado cacheado si existe y no ha expirado."""
+        found = self.lookup(query)
+        return found[1] if found else None
+    
+    def lookup(self, query: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Como `get`, pero devuelve también la consulta original cacheada."""
         cache_key = self._get_cache_key(query)
         
-        if cache_key not in self.index:
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT key, query, data, created FROM cache WHERE key = ?', (cache_key,)
+            ).fetchone()
+            
+            near_duplicate = False
+            if row is None and self.near_duplicate_threshold:
+                row = self._find_near_duplicate(conn, query)
+                near_duplicate = row is not None
+            
+            if row is None or row[3] < self._cutoff():
+                if row is not None:
+                    conn.execute('DELETE FROM cache WHERE key = ?', (row[0],))
+                self.stats['misses'] += 1
+                return None
+            
+            key, cached_query, data, _ = row
+            conn.execute(
+                'UPDATE cache SET accessed = ?, hits = hits + 1 WHERE key = ?',
+                (datetime.now().timestamp(), key)
+            )
+            
+            self.stats['hits'] += 1
+            if near_duplicate:
+                self.stats['near_duplicate_hits'] += 1
+            elif cached_query != query:
+                self.stats['normalized_hits'] += 1
+            
+            return cached_query, json.loads(data)
+        except Exception:
             return None
-        
-        entry = self.index[cache_key]
-        cached_time = datetime.fromisoformat(entry['timestamp'])
-        
-        if datetime.now() - cached_time > self.ttl:
-            self.remove(query)
+    
+    def _find_near_duplicate(self, conn: sqlite3.Connection, query: str) -> Optional[tuple]:
+        """Busca la entrada más parecida por encima del umbral de Jaccard."""
+        keywords = query_keywords(query)
+        if not keywords:
             return None
         
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return None
+        target = set(keywords)
+        candidates = conn.execute(
+            'SELECT key, query, data, created, keywords FROM cache '
+            'WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?',
+            minhash_bands(keywords)
+        ).fetchall()
         
-        return None
+        best = None
+        best_score = self.near_duplicate_threshold
+        for key, cached_query, data, created, cached_keywords in candidates:
+            score = jaccard(target, set((cached_keywords or '').split()))
+            if score >= best_score:
+                best, best_score = (key, cached_query, data, created), score
+        
+        return best
     
     def set(self, query: str, data: Dict[str, Any]):
         """Guarda resultado en caché."""
-        cache_key = self._get_cache_key(query)
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            conn = self._connect()
+            self._insert(conn, query, data, datetime.now().timestamp())
             
-            self.index[cache_key] = {
-                'query': query,
-                'timestamp': datetime.now().isoformat(),
-                'file': str(cache_file)
-            }
-            self._save_index()
+            with self._writes_lock:
+                self._writes += 1
+                check = self._writes >= self.evict_check_every
+                if check:
+                    self._writes = 0
+            if check:
+                self._evict_if_needed(conn)
         except Exception:
             pass
     
+    def _insert(self, conn: sqlite3.Connection, query: str, data: Dict[str, Any],
+                created: float, replace: bool = True):
+        """Inserta (o sustituye) una entrada creada en `created`."""
+        keywords = query_keywords(query)
+        bands = minhash_bands(keywords) if keywords else (None,) * MINHASH_BANDS
+        conn.execute(
+            f'INSERT OR {"REPLACE" if replace else "IGNORE"} INTO cache '
+            '(key, query, data, created, accessed, hits, keywords, band0, band1, band2, band3) '
+            'VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?)',
+            (self._get_cache_key(query), query, json.dumps(data, ensure_ascii=False),
+             created, created, ' '.join(keywords), *bands)
+        )
+    
+    def iter_data(self) -> Iterable[Dict[str, Any]]:
+        """Recorre los datos de todas las entradas vigentes."""
+        try:
+            cursor = self._connect().execute(
+                'SELECT data FROM cache WHERE created >= ?', (self._cutoff(),)
+            )
+            for (data,) in cursor:
+                yield json.loads(data)
+        except Exception:
+            return
+    
     def remove(self, query: str):
         """Elimina entrada de caché."""
         cache_key = self._get_cache_key(query)
         
-        if cache_key in self.index:
-            cache_file = self.cache_dir / f"{cache_key}.json"
-            if cache_file.exists():
-                cache_file.unlink()
+        try:
+            self._connect().execute('DELETE FROM cache WHERE key = ?', (cache_key,))
+        except Exception:
+            pass
+    
+    def clear_expired(self) -> int:
+        """Limpia entradas expiradas en una sola operación."""
+        try:
+            cursor = self._connect().execute(
+                'DELETE FROM cache WHERE created < ?', (self._cutoff(),)
+            )
+            return cursor.rowcount
+        except Exception:
+            return 0
+    
+    def _evict_if_needed(self, conn: sqlite3.Connection):
+        """Desaloja en bloque hasta el 90% del máximo cuando se supera.
+        
+        Entre comprobaciones la tabla puede pasarse del máximo en, como
+        mucho, `evict_check_every` entradas por proceso.
+        """
+        if not self.max_entries:
+            return
+        
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        
+        # Primero lo expirado; después según la política configurada
+        count -= self.clear_expired()
+        excess = count - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        
+        order = 'hits ASC, accessed ASC' if self.eviction_policy == 'lfu' else 'accessed ASC'
+        conn.execute(
+            f'DELETE FROM cache WHERE key IN '
+            f'(SELECT key FROM cache ORDER BY {order} LIMIT ?)',
+            (excess,)
+        )
+
+
+class MemoryCache:
+    """Caché LRU en memoria con TTL y presupuesto de bytes."""
+    
+    def __init__(self, ttl_seconds: float = MEMORY_CACHE_TTL_SECONDS,
+                 max_bytes: int = MEMORY_CACHE_MAX_BYTES):
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Obtiene una entrada viva y la marca como usada recientemente."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            
+            data, expires, nbytes = entry
+            if time.monotonic() > expires:
+                self._pop(key)
+                return None
+            
+            self._entries.move_to_end(key)
+            return data
+    
+    def set(self, key: str, data: Any, nbytes: int, 
+            ttl_seconds: Optional[float] = None):
+        """Guarda una entrada, desalojando las menos usadas si no cabe."""
+        if nbytes > self.max_bytes:
+            return
+        
+        ttl = self.ttl if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (data, time.monotonic() + ttl, nbytes)
+            self.size += nbytes
             
-            del self.index[cache_key]
-            self._save_index()
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
     
-    def clear_expired(self):
+    def remove(self, key: str):
+        """Elimina una entrada."""
+        with self._lock:
+            self._pop(key)
+    
+    def clear_expired(self) -> int:
         """Limpia entradas expiradas."""
-        expired_keys = []
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, (_, expires, _) in self._entries.items() if now > expires]
+            for key in expired:
+                self._pop(key)
+        return len(expired)
+    
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+
+class TieredCache:
+    """Caché de dos niveles: LRU en memoria delante de `SmartCache`.
+    
+    Las escrituras van a ambos niveles (write-through). Los resultados
+    negativos (solo contenido de respaldo) se guardan únicamente en memoria
+    durante `negative_ttl_seconds`; con 0 no se cachean.
+    """
+    
+    def __init__(self, disk: Optional[SmartCache] = None,
+                 memory: Optional[MemoryCache] = None,
+                 negative_ttl_seconds: float = NEGATIVE_CACHE_TTL_SECONDS):
+        self.disk = disk if disk is not None else SmartCache()
+        self.memory = memory if memory is not None else MemoryCache()
+        self.negative_ttl = negative_ttl_seconds
+        self.stats = {
+            'memory_hits': 0,
+            'memory_misses': 0,
+            'disk_hits': 0,
+            'disk_misses': 0,
+            'negative_hits': 0,
+            'normalized_hits': 0
+        }
+    
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        """Busca en memoria y, si falla, en disco (promocionando el resultado)."""
+        key = self.disk._get_cache_key(query)
+        
+        entry = self.memory.get(key)
+        if entry is not None:
+            cached_query, data = entry
+            self.stats['memory_hits'] += 1
+            if cached_query != query:
+                self.stats['normalized_hits'] += 1
+            if data.get('negative'):
+                self.stats['negative_hits'] += 1
+            return data
+        self.stats['memory_misses'] += 1
+        
+        found = self.disk.lookup(query)
+        if found is None:
+            self.stats['disk_misses'] += 1
+            return None
+        
+        self.stats['disk_hits'] += 1
+        self.memory.set(key, found, _json_size(found[1]))
+        return found[1]
+    
+    def set(self, query: str, data: Dict[str, Any], negative: bool = False):
+        """Guarda en ambos niveles; las entradas negativas solo en memoria."""
+        key = self.disk._get_cache_key(query)
+        
+        if negative:
+            if self.negative_ttl > 0:
+                data = {**data, 'negative': True}
+                self.memory.set(key, (query, data), _json_size(data),
+                                ttl_seconds=self.negative_ttl)
+            return
+        
+        self.memory.set(key, (query, data), _json_size(data))
+        self.disk.set(query, data)
+    
+    def remove(self, query: str):
+        """Elimina la entrada de ambos niveles."""
+        self.memory.remove(self.disk._get_cache_key(query))
+        self.disk.remove(query)
+    
+    def clear_expired(self) -> int:
+        """Limpia entradas expiradas de ambos niveles."""
+        return self.memory.clear_expired() + self.disk.clear_expired()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos y fallos por nivel."""
+        stats = dict(self.stats)
+        lookups = stats['memory_hits'] + stats['memory_misses']
+        hits = stats['memory_hits'] + stats['disk_hits']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        
+        # Aciertos que solo se producen gracias a la normalización de claves
+        stats['normalized_hits'] += self.disk.stats['normalized_hits']
+        stats['near_duplicate_hits'] = self.disk.stats['near_duplicate_hits']
+        gained = stats['normalized_hits'] + stats['near_duplicate_hits']
+        stats['normalization_hit_rate_gain'] = round(gained / lookups, 3) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory._entries)
+        stats['memory_bytes'] = self.memory.size
+        return stats
+
+
+class AnswerCache:
+    """Caché de respuestas generadas por la IA con stale-while-revalidate.
+    
+    Una respuesta es fresca durante `ttl_hours`; durante las `stale_hours`
+    siguientes se sigue sirviendo marcada como obsoleta para que el llamador
+    la regenere en segundo plano.
+    """
+    
+    def __init__(self, cache_dir: Path = CACHE_DIR, ttl_hours: float = ANSWER_CACHE_TTL_HOURS,
+                 stale_hours: float = ANSWER_CACHE_STALE_HOURS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.store = SmartCache(
+            cache_dir, ttl_hours=ttl_hours + stale_hours, max_entries=max_entries,
+            key_normalizer=KEY_NORMALIZERS['raw'], near_duplicate_threshold=0,
+            db_name=ANSWER_CACHE_DB_FILE.name, legacy_index=None
+        )
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+    
+    @staticmethod
+    def make_key(prompt: str, context: List[str], provider: str, model: str,
+                 max_tokens: int) -> str:
+        """Clave: (prompt normalizado, hash del contexto, proveedor, modelo, max_tokens).
+        
+        El prompt solo se pliega ('text': mayúsculas, acentos, puntuación y
+        espacios); el orden y las stopwords se conservan porque la IA responde
+        a la pregunta literal ("¿Qué es Python?" y "¿Por qué Python?" difieren).
+        """
+        context_hash = hashlib.sha256('\n'.join(context).encode('utf-8')).hexdigest()
+        normalized = KEY_NORMALIZERS['text'](prompt)
+        return '|'.join([normalized, context_hash, provider or '', model or '', str(max_tokens)])
+    
+    def get(self, key: str) -> Optional[Tuple[str, bool]]:
+        """Devuelve (respuesta, obsoleta) o None si no hay entrada utilizable."""
+        data = self.store.get(key)
+        if not data:
+            self.stats['misses'] += 1
+            return None
+        
+        stale = datetime.now() - datetime.fromisoformat(data['generated']) > self.ttl
+        self.stats['stale_hits' if stale else 'hits'] += 1
+        return data['answer'], stale
+    
+    def set(self, key: str, answer: str):
+        """Guarda una respuesta recién generada."""
+        self.store.set(key, {'answer': answer, 'generated': datetime.now().isoformat()})
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos (frescos y obsoletos) y fallos."""
+        stats = dict(self.stats)
+        lookups = sum(stats.values())
+        hits = stats['hits'] + stats['stale_hits']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in value.split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') or None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def http_freshness(headers: Dict[str, str], now: Optional[float] = None) -> Optional[float]:
+    """Instante de caducidad según Cache-Control/Expires (None: no almacenable).
+    
+    `headers` con claves en minúsculas. `no-cache` devuelve `now` (se guarda
+    pero hay que revalidar siempre). Sin indicaciones explícitas la frescura
+    heurística solo se aplica con Last-Modified: el 10% del tiempo desde la
+    última modificación, con tope `HTTP_CACHE_HEURISTIC_TTL_SECONDS`; sin
+    Last-Modified la respuesta nace caducada.
+    """
+    now = time.time() if now is None else now
+    directives = _parse_cache_control(headers.get('cache-control', ''))
+    
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return now
+    
+    max_age = directives.get('max-age')
+    if max_age is not None:
+        try:
+            return now + max(0, int(max_age) - int(headers.get('age') or 0))
+        except ValueError:
+            return now
+    
+    expires = _http_date(headers.get('expires'))
+    if 'expires' in headers:
+        date = _http_date(headers.get('date')) or now
+        return now + max(0.0, expires - date) if expires else now
+    
+    last_modified = _http_date(headers.get('last-modified'))
+    if last_modified is None:
+        return now
+    date = _http_date(headers.get('date')) or now
+    return now + min(HTTP_CACHE_HEURISTIC_TTL_SECONDS, max(0.0, date - last_modified) * 0.1)
+
+
+class HttpCache:
+    """Caché de respuestas HTTP en disco con revalidación condicional.
+    
+    Guarda el cuerpo comprimido (zstd si está instalado, gzip si no) junto a
+    ETag, Last-Modified y la caducidad calculada a partir de Cache-Control o
+    Expires. Con SQLite en modo WAL, igual que `SmartCache`, y un tope de
+    bytes comprimidos con desalojo LRU.
+    """
+    
+    def __init__(self, db_file: Path = HTTP_CACHE_DB_FILE, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'bytes_saved': 0}
+        self._local = threading.local()
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Conexión SQLite propia de cada hilo."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL,
+                complete INTEGER NOT NULL,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                body BLOB NOT NULL
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)')
+    
+    @staticmethod
+    def _compress(body: bytes) -> Tuple[str, bytes]:
+        if _HAS_ZSTD:
+            return 'zstd', zstandard.ZstdCompressor(level=3).compress(body)
+        return 'gzip', gzip.compress(body, compresslevel=6)
+    
+    @staticmethod
+    def _decompress(codec: str, blob: bytes) -> bytes:
+        if codec == 'zstd':
+            return zstandard.ZstdDecompressor().decompress(blob)
+        return gzip.decompress(blob)
+    
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Entrada guardada (fresca o no) con el cuerpo descomprimido."""
+        row = self._connect().execute(
+            'SELECT status, headers, etag, last_modified, expires, complete, codec, body '
+            'FROM responses WHERE url = ?', (url,)
+        ).fetchone()
+        if not row:
+            return None
+        
+        status, headers, etag, last_modified, expires, complete, codec, blob = row
+        if codec == 'zstd' and not _HAS_ZSTD:
+            return None
+        
+        return {
+            'status': status, 'headers': json.loads(headers), 'etag': etag,
+            'last_modified': last_modified, 'expires': expires, 'complete': bool(complete),
+            'body': self._decompress(codec, blob)
+        }
+    
+    def record_hit(self, url: str, size: int, revalidated: bool = False,
+                   expires: Optional[float] = None):
+        """Anota un acierto (y la nueva caducidad tras un 304)."""
+        conn = self._connect()
+        if expires is not None:
+            conn.execute('UPDATE responses SET accessed = ?, expires = ? WHERE url = ?',
+                         (time.time(), expires, url))
+        else:
+            conn.execute('UPDATE responses SET accessed = ? WHERE url = ?', (time.time(), url))
+        self.stats['revalidated' if revalidated else 'hits'] += 1
+        self.stats['bytes_saved'] += size
+    
+    @staticmethod
+    def _expiry(status: int, headers: Dict[str, str]) -> Optional[float]:
+        """Caducidad con la que se guardaría la respuesta (None: no almacenable)."""
+        expires = http_freshness(headers)
+        if status != 200 or expires is None:
+            return None
+        if expires <= time.time() and not (headers.get('etag') or headers.get('last-modified')):
+            return None
+        return expires
+    
+    def storable(self, status: int, headers: Dict[str, str]) -> bool:
+        """Si `set` guardaría una respuesta así (cabeceras en minúsculas).
+        
+        Se decide antes de leer el cuerpo: las no almacenables se pueden
+        leer en directo en vez de acumularlas para nada.
+        """
+        return self._expiry(status, headers) is not None
+    
+    def record_miss(self):
+        """Anota un fallo sin guardar nada (respuesta no almacenable)."""
+        self.stats['misses'] += 1
+    
+    def set(self, url: str, status: int, headers: Dict[str, str], body: bytes,
+            complete: bool) -> bool:
+        """Guarda una respuesta si es almacenable; devuelve si se guardó."""
+        self.record_miss()
+        expires = self._expiry(status, headers)
+        if expires is None:
+            return False
+        etag = headers.get('etag')
+        last_modified = headers.get('last-modified')
         
-        for cache_key, entry in self.index.items():
-            cached_time = datetime.fromisoformat(entry['timestamp'])
-            if datetime.now() - cached_time > self.ttl:
-                expired_keys.append(cache_key)
+        codec, blob = self._compress(body)
+        if len(blob) > self.max_bytes:
+            return False
         
-        for key in expired_keys:
-            cache_file = self.cache_dir / f"{key}.json"
-            if cache_file.exists():
-                cache_file.unlink()
-            del self.index[key]
+        # El cuerpo ya llega descodificado (sin Content-Encoding)
+        stored_headers = {'content-type': headers.get('content-type', '')}
+        self._connect().execute(
+            'INSERT OR REPLACE INTO responses '
+            '(url, status, headers, etag, last_modified, expires, accessed, complete, codec, size, body) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (url, status, json.dumps(stored_headers), etag, last_modified, expires, time.time(),
+             int(complete), codec, len(blob), blob)
+        )
+        self.stats['stored'] += 1
+        self._evict_if_needed()
+        return True
+    
+    def _evict_if_needed(self):
+        """Desaloja las entradas menos usadas hasta quedar al 90% del tope."""
+        conn = self._connect()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for url, size in conn.execute('SELECT url, size FROM responses ORDER BY accessed'):
+            victims.append((url,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany('DELETE FROM responses WHERE url = ?', victims)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores y ocupación en disco."""
+        stats = dict(self.stats)
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()
+        stats.update(entries=entries, size_bytes=size, codec='zstd' if _HAS_ZSTD else 'gzip')
+        return stats
+
+
+def cache_key_for(query: str) -> str:
+    """Forma normalizada de una consulta según CACHE_KEY_NORMALIZATION."""
+    return KEY_NORMALIZERS[CACHE_KEY_NORMALIZATION](query)
+
+
+class SingleFlight:
+    """Deduplica ejecuciones concurrentes con la misma clave (single-flight).
+    
+    Solo la primera llamada ejecuta el trabajo; las que llegan mientras está
+    en curso esperan y reciben el mismo resultado (o la misma excepción).
+    `do` sirve para hilos y `ado` para corrutinas.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.stats = {'executions': 0, 'coalesced': 0}
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Ejecuta `fn` una sola vez por clave entre hilos concurrentes."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = concurrent.futures.Future()
+                self.stats['executions'] += 1
+            else:
+                self.stats['coalesced'] += 1
         
-        if expired_keys:
-            self._save_index()
+        if not leader:
+            return call.result()
+        
+        try:
+            result = fn()
+            call.set_result(result)
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    async def ado(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Ejecuta la corrutina de `factory` una sola vez por clave.
+        
+        El trabajo corre en su propia tarea, de modo que cancelar a uno de los
+        llamadores no lo cancela para los demás.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        
+        task = self._tasks.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[flight_key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(flight_key, None))
+            self.stats['executions'] += 1
+        else:
+            self.stats['coalesced'] += 1
+        
+        return await asyncio.shield(task)
+
+
+def _json_size(data: Dict[str, Any]) -> int:
+    """Tamaño aproximado en bytes de una entrada serializada."""
+    return len(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    """Bucle de eventos compartido por todo el proceso (hilo en segundo plano)."""
+    global _shared_loop
+    
+    with _shared_loop_lock:
+        if _shared_loop is None or _shared_loop.is_closed():
+            _shared_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_shared_loop.run_forever, name='crawler-loop', daemon=True
+            ).start()
+    
+    return _shared_loop
+
+
+def run_sync(coro):
+    """Ejecuta una corrutina en el bucle compartido y espera su resultado."""
+    return asyncio.run_coroutine_threadsafe(coro, get_shared_loop()).result()
 
 
 def clean_html(html: str) -> str:
@@ -118,11 +919,8 @@ def clean_html(html: str) -> str:
     if not html:
         return ""
     
-    # Eliminar scripts y estilos
-    html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-    
-    return html
+    # Eliminar scripts y estilos (una sola pasada)
+    return _SCRIPT_STYLE.sub('', html)
 
 
 def is_valid_fragment(text: str) -> bool:
@@ -133,22 +931,82 @@ def is_valid_fragment(text: str) -> bool:
     if len(text) > 1000:
         return False
     
-    text_lower = text.lower()
-    for noise in NOISE_PATTERNS:
-        if noise in text_lower:
-            return False
+    if any(map(text.lower().__contains__, _NOISE_PATTERNS)):
+        return False
     
     # Verificar proporción de caracteres alfabéticos
-    alpha_count = sum(1 for c in text if c.isalpha())
-    if alpha_count < len(text) * 0.5:
-        return False
+    return sum(map(str.isalpha, text)) >= len(text) * 0.5
+
+
+def _batch_alpha_counts(joined: str, offsets: List[int], lengths: List[int]) -> List[int]:
+    """Letras de cada fragmento de `joined` con una consulta vectorizada."""
+    codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    is_alpha = np.zeros(len(codes), dtype=np.int64)
+    bmp = codes < 0x10000
+    is_alpha[bmp] = _BMP_ALPHA[codes[bmp]]
+    for index in np.flatnonzero(~bmp):
+        is_alpha[index] = chr(codes[index]).isalpha()
     
-    return True
+    cumulative = np.concatenate(([0], np.cumsum(is_alpha)))
+    starts = np.asarray(offsets)
+    return (cumulative[starts + np.asarray(lengths)] - cumulative[starts]).tolist()
+
+
+def filter_valid_fragments(texts: Iterable[str], limit: Optional[int] = None) -> List[str]:
+    """Versión por lotes de `is_valid_fragment` (conserva el orden).
+    
+    Une los candidatos de longitud válida en un único texto: cada palabra de
+    ruido se busca una vez sobre todo el lote y, con NumPy, las letras se
+    cuentan con una sola consulta a una tabla en lugar de carácter a carácter.
+    """
+    candidates = [t for t in texts if t and 40 <= len(t) <= 1000]
+    if not candidates:
+        return []
+    
+    lengths = [len(t) for t in candidates]
+    offsets = []
+    position = 0
+    for length in lengths:
+        offsets.append(position)
+        position += length + 1
+    
+    # Los patrones de ruido no contienen saltos de línea: ninguna coincidencia
+    # puede cruzar el límite entre dos candidatos.
+    joined = '\n'.join(candidates)
+    lowered = joined.lower()
+    if len(lowered) != len(joined):
+        # lower() cambió longitudes (p. ej. 'İ'): los desplazamientos no sirven
+        valid = [t for t in candidates if is_valid_fragment(t)]
+        return valid[:limit] if limit is not None else valid
+    
+    noisy = set()
+    for noise in _NOISE_PATTERNS:
+        found = lowered.find(noise)
+        while found != -1:
+            index = bisect.bisect_right(offsets, found) - 1
+            noisy.add(index)
+            if index + 1 >= len(offsets):
+                break
+            found = lowered.find(noise, offsets[index + 1])
+    
+    if _HAS_NUMPY:
+        alpha_counts = _batch_alpha_counts(joined, offsets, lengths)
+    else:
+        alpha_counts = [sum(map(str.isalpha, t)) for t in candidates]
+    
+    valid = []
+    for index, text in enumerate(candidates):
+        if index in noisy or alpha_counts[index] < lengths[index] * 0.5:
+            continue
+        valid.append(text)
+        if limit is not None and len(valid) >= limit:
+            break
+    return valid
 
 
 def extract_keywords(text: str, stopwords: set) -> list:
     """Extrae palabras clave del texto."""
-    tokens = re.findall(r"\b[\wáéíóúñü]+\b", text.lower())
+    tokens = _KEYWORD_TOKEN.findall(text.lower())
     keywords = [t for t in tokens if t not in stopwords and len(t) >= 3]
     return keywords
 
@@ -174,29 +1032,7 @@ def calculate_confidence(facts: list, keywords: list) -> float:
 
 def save_feedback(prompt: str, response: Dict[str, Any], useful: bool, 
                   feedback_file: Path = None):
-    """Guarda feedback del usuario."""
-    if feedback_file is None:
-        feedback_file = Path(__file__).parent / 'data' / 'feedback.json'
-    
-    feedback_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    entry = {
-        'prompt': prompt,
-        'response': response,
-        'useful': bool(useful),
-        'timestamp': datetime.now().isoformat()
-    }
-    
-    try:
-        if feedback_file.exists():
-            with open(feedback_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = []
-    except Exception:
-        data = []
-    
-    data.append(entry)
+    """Guarda feedback del usuario en el registro de solo anexado."""
+    from feedback import get_feedback_store
     
-    with open(feedback_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    get_feedback_store(feedback_file).add(prompt, response, useful)
\ No newline at end of file